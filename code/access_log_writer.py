@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Access Log Writer
+Buffered, thread-safe JSON-lines writer for honeypot accesses. Records from
+any number of threads go through a queue to one writer thread, which keeps the
+file open and group-commits batches by size or latency. An optional sink (the
+SQLite access store) receives each committed batch on the same thread
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+
+_STOP = object()
+
+class AccessLogWriter:
+    """Append JSON records to a log file from many threads with group commit
+
+    A batch is written once ``batch_size`` records are waiting or the oldest
+    waiting record is ``max_latency`` seconds old; a batch holding a durable
+    record or a flush is committed at once. ``write(..., durable=True)``
+    blocks until the record's batch has been fsynced. ``close`` flushes and
+    fsyncs everything still queued.
+
+    ``sink``, if given, has ``add(records)`` and ``close()``; both are called
+    on the writer thread, so it can hold thread-bound resources such as a
+    sqlite3 connection.
+    """
+
+    def __init__(self, path, batch_size=500, max_latency=0.05, sink=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.sink = sink
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+        self.error = None
+
+    def start(self):
+        """Open the log file and start the writer thread"""
+        with self.lock:
+            if self.thread is not None:
+                return self
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(self.path, 'a')
+            self.thread = threading.Thread(target=self._run, name='access-log-writer', daemon=True)
+            self.thread.start()
+        return self
+
+    def write(self, record, durable=False):
+        """Queue a record; with durable=True wait until it is on disk"""
+        if self.closed:
+            raise ValueError("write to closed AccessLogWriter")
+        if self.thread is None:
+            self.start()
+        if not durable:
+            self.queue.put((record, None))
+            return
+        done = threading.Event()
+        done.error = None
+        self.queue.put((record, done))
+        done.wait()
+        if done.error is not None:
+            raise done.error
+
+    def flush(self):
+        """Block until every record queued so far is written and fsynced"""
+        done = threading.Event()
+        done.error = None
+        # Queued under the lock so the marker can't land behind close()'s stop;
+        # after close() everything is already written and no thread would answer
+        with self.lock:
+            if self.thread is None or self.closed:
+                return
+            self.queue.put((None, done))
+        done.wait()
+
+    def close(self):
+        """Write and fsync everything still queued, then stop the writer thread"""
+        with self.lock:
+            if self.closed or self.thread is None:
+                self.closed = True
+                return
+            self.closed = True
+        self.queue.put((_STOP, None))
+        self.thread.join()
+        self.file.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            record, done = self.queue.get()
+            batch = [(record, done)]
+            stopping = record is _STOP
+            # Gather more records until the batch is full, the latency budget is spent
+            # or someone is waiting on it (a durable write or a flush)
+            deadline = time.monotonic() + self.max_latency
+            while not stopping and done is None and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                stopping = item[0] is _STOP
+                done = item[1]
+            if stopping:
+                # Nothing new is accepted once closed, so take whatever is left
+                while True:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+            self._commit(batch, fsync=stopping or any(done is not None for _, done in batch))
+        if self.sink is not None:
+            self.sink.close()
+
+    def _commit(self, batch, fsync):
+        """Write one batch of records with a single write call, then hand it to the sink"""
+        records = [record for record, _ in batch if record is not None and record is not _STOP]
+        error = None
+        try:
+            if records:
+                self.file.write(''.join(json.dumps(record) + '\n' for record in records))
+            self.file.flush()
+            if fsync:
+                os.fsync(self.file.fileno())
+        except Exception as e:
+            error = e
+            print(f"Error writing access log {self.path}: {e}")
+        # Only the latest batch's outcome; a transient error doesn't break later writes
+        self.error = error
+        if error is None and records and self.sink is not None:
+            try:
+                self.sink.add(records)
+            except Exception as e:
+                print(f"Error adding accesses to {type(self.sink).__name__}: {e}")
+        for _, done in batch:
+            if done is not None:
+                done.error = error
+                done.set()
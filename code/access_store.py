@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Honeypot Access Store
+Indexed SQLite store (WAL mode) for honeypot accesses, with interned user
+agents and range queries by time, IP/CIDR, URL prefix and user agent
+"""
+
+import os
+import json
+import socket
+import struct
+import sqlite3
+import ipaddress
+from datetime import datetime
+
+# Rows per transaction when bulk ingesting
+INGEST_BATCH_SIZE = 20000
+
+IPV4 = struct.Struct('!I')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_agents (
+    id INTEGER PRIMARY KEY,
+    user_agent TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS accesses (
+    id INTEGER PRIMARY KEY,
+    timestamp_ms INTEGER NOT NULL,
+    ip TEXT NOT NULL,
+    ip_num INTEGER,
+    url TEXT NOT NULL,
+    ua_id INTEGER NOT NULL REFERENCES user_agents(id)
+);
+CREATE INDEX IF NOT EXISTS idx_accesses_timestamp ON accesses(timestamp_ms);
+CREATE INDEX IF NOT EXISTS idx_accesses_ip ON accesses(ip_num, timestamp_ms);
+CREATE INDEX IF NOT EXISTS idx_accesses_url ON accesses(url, timestamp_ms);
+CREATE INDEX IF NOT EXISTS idx_accesses_ua ON accesses(ua_id, timestamp_ms);
+CREATE TABLE IF NOT EXISTS ingest_state (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    device INTEGER,
+    inode INTEGER
+);
+"""
+
+def timestamp_to_ms(timestamp):
+    """Convert an ISO timestamp to epoch milliseconds"""
+    return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+def ms_to_timestamp(timestamp_ms):
+    """Convert epoch milliseconds back to an ISO timestamp"""
+    return datetime.fromtimestamp(timestamp_ms / 1000).isoformat()
+
+def ipv4_to_int(ip):
+    """Pack an IPv4 address as an integer, or None for anything else"""
+    # inet_aton is much cheaper than ipaddress but also accepts short forms like '10.1'
+    if ip.count('.') != 3:
+        return None
+    try:
+        return IPV4.unpack(socket.inet_aton(ip))[0]
+    except OSError:
+        return None
+
+def prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+class AccessStore:
+    """SQLite-backed store of honeypot accesses"""
+
+    def __init__(self, db_path='logs/honeypot_access.db'):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA temp_store=MEMORY')
+        self.connection.execute('PRAGMA cache_size=-65536')
+        self.connection.executescript(SCHEMA)
+        self.user_agent_ids = {}
+
+    def close(self):
+        self.connection.close()
+
+    def _user_agent_id(self, user_agent):
+        """Intern a user agent string, returning its id"""
+        ua_id = self.user_agent_ids.get(user_agent)
+        if ua_id is None:
+            self.connection.execute('INSERT OR IGNORE INTO user_agents (user_agent) VALUES (?)', (user_agent,))
+            ua_id = self.connection.execute('SELECT id FROM user_agents WHERE user_agent = ?', (user_agent,)).fetchone()[0]
+            self.user_agent_ids[user_agent] = ua_id
+        return ua_id
+
+    def _row(self, access):
+        ip = access['ip_address']
+        return (timestamp_to_ms(access['timestamp']), ip, ipv4_to_int(ip), access['url'], self._user_agent_id(access['user_agent']))
+
+    def add_accesses(self, accesses):
+        """Insert access records in batched transactions, returning the number inserted"""
+        inserted = 0
+        batch = []
+        with self.connection:
+            for access in accesses:
+                try:
+                    batch.append(self._row(access))
+                except ValueError:
+                    continue
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    self._insert(batch)
+                    inserted += len(batch)
+                    batch = []
+            self._insert(batch)
+            inserted += len(batch)
+        return inserted
+
+    def add_access(self, access):
+        """Insert a single access record in its own transaction"""
+        return self.add_accesses([access])
+
+    def _insert(self, rows):
+        self.connection.executemany(
+            'INSERT INTO accesses (timestamp_ms, ip, ip_num, url, ua_id) VALUES (?, ?, ?, ?, ?)', rows)
+
+    def ingest_log(self, log_path):
+        """Load lines appended to a JSON-lines access log since the last ingest"""
+        from honeypot_monitor import LogLineReader, parse_accesses
+
+        stat = os.stat(log_path)
+        state = self.connection.execute(
+            'SELECT offset, device, inode FROM ingest_state WHERE path = ?', (log_path,)).fetchone()
+        offset = 0
+        if state is not None:
+            saved_offset, device, inode = state
+            # Start over if the log was rotated away or truncated
+            if (device, inode) == (stat.st_dev, stat.st_ino) and saved_offset <= stat.st_size:
+                offset = saved_offset
+
+        reader = LogLineReader(log_path, offset)
+        inserted = 0
+        batch = []
+        for access in parse_accesses(reader):
+            batch.append(access)
+            if len(batch) >= INGEST_BATCH_SIZE:
+                inserted += self._ingest_batch(batch, log_path, reader.offset, stat)
+                batch = []
+        inserted += self._ingest_batch(batch, log_path, reader.offset, stat)
+        return inserted
+
+    def _ingest_batch(self, accesses, log_path, offset, stat):
+        """Insert a batch and advance the ingest offset in the same transaction"""
+        with self.connection:
+            rows = []
+            for access in accesses:
+                try:
+                    rows.append(self._row(access))
+                except ValueError:
+                    continue
+            self._insert(rows)
+            self.connection.execute(
+                'INSERT OR REPLACE INTO ingest_state (path, offset, device, inode) VALUES (?, ?, ?, ?)',
+                (log_path, offset, stat.st_dev, stat.st_ino))
+        return len(rows)
+
+    def query(self, since=None, until=None, network=None, url_prefix=None, user_agent=None,
+              user_agent_ids=None, limit=100, count_only=False):
+        """Query accesses; every filter is optional and filters are combined with AND
+
+        ``network`` is an IPv4 address or CIDR block (e.g. '203.0.113.0/24') or
+        any other exact address string; ``user_agent`` matches a substring of
+        the user agent.
+        """
+        clauses = []
+        params = []
+
+        if since is not None:
+            clauses.append('a.timestamp_ms >= ?')
+            params.append(timestamp_to_ms(since))
+        if until is not None:
+            clauses.append('a.timestamp_ms < ?')
+            params.append(timestamp_to_ms(until))
+        if network is not None:
+            try:
+                block = ipaddress.ip_network(network, strict=False)
+            except ValueError:
+                block = None
+            if block is not None and block.version == 4:
+                clauses.append('a.ip_num BETWEEN ? AND ?')
+                params.extend([int(block.network_address), int(block.broadcast_address)])
+            else:
+                clauses.append('a.ip = ?')
+                params.append(network)
+        if url_prefix:
+            # Range on the url index instead of LIKE, which can't use it
+            clauses.append('a.url >= ? AND a.url < ?')
+            params.extend([url_prefix, prefix_upper_bound(url_prefix)])
+        if user_agent is not None:
+            # The user agent table is small, so resolve matching ids first
+            matching = [row[0] for row in self.connection.execute(
+                "SELECT id FROM user_agents WHERE instr(user_agent, ?) > 0", (user_agent,))]
+            user_agent_ids = matching if user_agent_ids is None else sorted(set(matching) & set(user_agent_ids))
+        if user_agent_ids is not None:
+            if not user_agent_ids:
+                return 0 if count_only else []
+            clauses.append(f"a.ua_id IN ({','.join('?' * len(user_agent_ids))})")
+            params.extend(user_agent_ids)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        if count_only:
+            return self.connection.execute(f'SELECT COUNT(*) FROM accesses a {where}', params).fetchone()[0]
+
+        rows = self.connection.execute(
+            f'SELECT a.timestamp_ms, a.url, u.user_agent, a.ip FROM accesses a '
+            f'JOIN user_agents u ON u.id = a.ua_id {where} ORDER BY a.timestamp_ms LIMIT ?',
+            params + [limit])
+        return [
+            {'timestamp': ms_to_timestamp(timestamp_ms), 'url': url, 'user_agent': user_agent, 'ip_address': ip}
+            for timestamp_ms, url, user_agent, ip in rows
+        ]
+
+    def user_agent_ids_for_crawler(self, name, classifier=None):
+        """Ids of stored user agents that classify as the named crawler (or crawler type)"""
+        from crawler_classifier import get_default_classifier
+
+        classifier = classifier or get_default_classifier()
+        ids = []
+        for ua_id, user_agent in self.connection.execute('SELECT id, user_agent FROM user_agents'):
+            signature = classifier.classify(user_agent)
+            if signature is not None and name.lower() in (signature['name'].lower(), signature['type'], signature['category']):
+                ids.append(ua_id)
+        return ids
+
+def rotation_time(new_url, rotations_log='logs/honeypot_rotations.log'):
+    """Timestamp of the rotation that produced new_url, from the rotation log"""
+    if not os.path.exists(rotations_log):
+        return None
+    with open(rotations_log, 'r') as f:
+        for line in f:
+            try:
+                rotation = json.loads(line)
+            except:
+                continue
+            if rotation.get('new_url') == new_url:
+                return rotation['timestamp']
+    return None
@@ -8,16 +8,39 @@ Designed to be run as a cron job
 import os
 import sys
 import time
-import subprocess
 import json
 from datetime import datetime
 from honeypot_url_rotator import HoneypotURLRotator
+from git_pipeline import GitPipeline, GitError
+from push_queue import PushQueue
+from site_builder import SiteBuilder
+from timing_metrics import MetricsRecorder, DEFAULT_METRICS_FILE, run_main
+
+COMMIT_LOGS_FILE = 'logs/commit-logs.csv'
+
+def write_if_changed(path, content):
+    """Write content to path unless it already holds exactly that; returns True if written"""
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            if f.read() == content:
+                return False
+    with open(path, 'w') as f:
+        f.write(content)
+    return True
 
 class AutoHoneypotRotator:
-    def __init__(self):
+    def __init__(self, metrics_file=DEFAULT_METRICS_FILE, remote='origin', branch='main', squash_after=0):
         self.rotator = HoneypotURLRotator()
+        self.rotated = []
         self.log_file = 'logs/auto_rotation.log'
         self.git_log_file = 'logs/git_operations.log'
+        # Sitemap and hub pages are rendered from code/site_manifest.json
+        self.site = SiteBuilder()
+        # Per-step and per-git-command timings, written after every cycle
+        self.metrics = MetricsRecorder(metrics_file)
+        self.git = GitPipeline('.', remote, branch, self.metrics)
+        # Commits not yet on the remote; pushed together with backoff
+        self.push_queue = PushQueue(squash_after=squash_after)
         
     def log_operation(self, message, log_type='info'):
         """Log operation with timestamp"""
@@ -35,88 +58,38 @@ class AutoHoneypotRotator:
         # Also print to console for cron job visibility
         print(f"[{timestamp}] {message}")
     
-    def run_git_command(self, command, description):
-        """Run git command and log the result"""
+    def run_git_operation(self, description, action):
+        """Run a git pipeline operation and log the result; returns (ok, result)"""
         try:
-            result = subprocess.run(command, shell=True, capture_output=True, text=True, cwd=os.getcwd())
-            
-            if result.returncode == 0:
-                self.log_operation(f"Git {description} successful: {result.stdout.strip()}")
-                return True
-            else:
-                self.log_operation(f"Git {description} failed: {result.stderr.strip()}", 'error')
-                return False
+            result = action()
+            self.log_operation(f"Git {description} successful: {result or 'nothing to do'}")
+            return True, result
+        except GitError as e:
+            self.log_operation(f"Git {description} failed: {e.stderr}", 'error')
         except Exception as e:
             self.log_operation(f"Git {description} exception: {str(e)}", 'error')
-            return False
+        return False, None
     
     def update_sitemap_and_hub_pages(self):
-        """Update sitemap.xml and hub pages with new URL mappings"""
+        """Render sitemap.xml and hub page honeypot links from the site manifest, returning the files changed"""
+        changed = []
         try:
-            current_urls = self.rotator.get_current_urls()
-            
-            # Update sitemap.xml
-            if os.path.exists('sitemap.xml'):
-                with open('sitemap.xml', 'r') as f:
-                    sitemap_content = f.read()
-                
-                # Replace old URLs with new ones and update dates
-                current_date = datetime.now().strftime('%Y-%m-%d')
-                for original, current in current_urls.items():
-                    if original in ['a-6hp.html', 'a-7sm.html']:
-                        new_url = f"https://ai-crawler.org/{current}"
-                        
-                        # Find and replace any existing honeypot URLs in sitemap
-                        # This handles both original and rotated URLs dynamically
-                        import re
-                        if original == 'a-6hp.html':
-                            # Replace any a-6hp-* URL with the new one
-                            pattern = r'https://ai-crawler\.org/a-6hp-[^"]*\.html'
-                            sitemap_content = re.sub(pattern, new_url, sitemap_content)
-                        elif original == 'a-7sm.html':
-                            # Replace any a-7sm-* URL with the new one
-                            pattern = r'https://ai-crawler\.org/a-7sm-[^"]*\.html'
-                            sitemap_content = re.sub(pattern, new_url, sitemap_content)
-                
-                # Update lastmod dates for all pages
-                sitemap_content = sitemap_content.replace('<lastmod>2024-12-15</lastmod>', f'<lastmod>{current_date}</lastmod>')
-                
-                with open('sitemap.xml', 'w') as f:
-                    f.write(sitemap_content)
-                
-                self.log_operation("Updated sitemap.xml with new URL mappings")
-            
-            # Update hub pages
-            hub_pages = ['hp-1.html', 'hp-2.html']
-            for hub_page in hub_pages:
-                if os.path.exists(hub_page):
-                    with open(hub_page, 'r') as f:
-                        hub_content = f.read()
-                    
-                    # Update a-6hp.html references (only this one is in hub pages)
-                    if 'a-6hp.html' in current_urls:
-                        old_url = 'a-6hp.html'
-                        new_url = current_urls['a-6hp.html']
-                        hub_content = hub_content.replace(old_url, new_url)
-                    
-                    with open(hub_page, 'w') as f:
-                        f.write(hub_content)
-                    
-                    self.log_operation(f"Updated {hub_page} with new URL mappings")
-                    
+            current_urls, rotated_on = self.site.link_targets(self.rotator.url_history_file)
+            changed = self.site.build(current_urls, rotated_on)
+            for path in changed:
+                self.log_operation(f"Updated {path} with new URL mappings")
         except Exception as e:
             self.log_operation(f"Error updating sitemap and hub pages: {str(e)}", 'error')
+        return changed
     
-    def update_commit_logs(self):
-        """Update commit-logs.csv with the latest rotation"""
+    def update_commit_logs(self, commit):
+        """Append the rotation commit to commit-logs.csv"""
         try:
-            # Get the latest commit ID
-            result = subprocess.run(['git', 'log', '--oneline', '-1'], capture_output=True, text=True)
-            if result.returncode == 0:
-                commit_id = result.stdout.strip().split()[0]
+            if commit:
+                commit_id = commit[:7]
                 
                 # Read current commit-logs.csv
-                csv_file = 'logs/commit-logs.csv'
+                csv_file = COMMIT_LOGS_FILE
                 if os.path.exists(csv_file):
                     with open(csv_file, 'r') as f:
                         lines = f.readlines()
@@ -125,13 +98,11 @@ class AutoHoneypotRotator:
                     timestamp_ms = int(time.time() * 1000)
                     datetime_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                     
-                    # Get current URL mappings
-                    current_urls = self.rotator.get_current_urls()
+                    # Pages rotated in this cycle
                     pages_changed = {}
                     
-                    for original, current in current_urls.items():
-                        if original in ['a-6hp.html', 'a-7sm.html']:
-                            pages_changed[original] = [f"URL rotated to {current}"]
+                    for original, _, current in self.rotated:
+                        pages_changed[original] = [f"URL rotated to {current}"]
                     
                     if pages_changed:
                         pages_json = json.dumps(pages_changed).replace('"', '""')
@@ -146,55 +117,105 @@ class AutoHoneypotRotator:
         except Exception as e:
             self.log_operation(f"Error updating commit logs: {str(e)}", 'error')
     
-    def perform_rotation_cycle(self):
-        """Perform one complete rotation cycle"""
-        self.log_operation("Starting automated honeypot rotation cycle")
-        
-        # Step 1: Rotate URLs
+    def run_step(self, name, action):
+        """Run one cycle step inside a timing span; a False result fails the step"""
+        with self.metrics.span('rotation_step', step=name) as span:
+            span.ok = action() is not False
+        return span.ok
+    
+    def rotate_step(self, changed):
+        if self.site.signed:
+            # Signed links are only valid when rendered per request, which static hosting can't do
+            self.log_operation("Signed URLs are served by honeypot_server.py only; "
+                               "disable signed_urls in the site manifest to rotate static pages", 'error')
+            return False
         try:
-            self.rotator.rotate_urls()
+            # Only the pages whose own interval has elapsed are rotated
+            self.rotated = self.rotator.rotate_due()
+            for _, old_name, new_name in self.rotated:
+                changed.extend([old_name, new_name])
+            changed.append(self.rotator.url_history_file)
             self.log_operation("URL rotation completed successfully")
         except Exception as e:
             self.log_operation(f"URL rotation failed: {str(e)}", 'error')
             return False
+    
+    def perform_rotation_cycle(self):
+        """Perform one complete rotation cycle, recording step timings to the metrics file"""
+        try:
+            with self.metrics.span('rotation_cycle') as span:
+                span.ok = self.run_cycle_steps()
+            return span.ok
+        finally:
+            self.metrics.write()
+    
+    def run_cycle_steps(self):
+        self.log_operation("Starting automated honeypot rotation cycle")
+        changed = []
         
-        # Step 2: Add all changes to git
-        if not self.run_git_command('git add .', 'add'):
-            return False
-        
-        # Step 3: Commit changes
-        commit_message = f"Auto-rotate honeypot URLs - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        if not self.run_git_command(f'git commit -m "{commit_message}"', 'commit'):
-            return False
-        
-        # Step 4: Push to mainline
-        if not self.run_git_command('git push origin main', 'push'):
+        # Step 1: Rotate URLs
+        if not self.run_step('rotate', lambda: self.rotate_step(changed)):
             return False
         
-        # Step 5: Update sitemap and hub pages
-        self.update_sitemap_and_hub_pages()
-        
-        # Step 6: Update commit logs
-        self.update_commit_logs()
+        # Step 2: Update sitemap and hub pages
+        self.run_step('update_sitemap_and_hub_pages', lambda: changed.extend(self.update_sitemap_and_hub_pages()))
         
-        # Step 7: Commit the updated logs
-        if not self.run_git_command('git add logs/commit-logs.csv', 'add logs'):
+        # Step 3: One commit for exactly the changed paths. commit-logs.csv can't
+        # name the commit it is part of, so it carries the previous cycle's row
+        commit_message = f"Auto-rotate honeypot URLs - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        committed = {}
+        def commit():
+            ok, committed['id'] = self.run_git_operation(
+                'commit', lambda: self.git.commit_paths(changed + [COMMIT_LOGS_FILE], commit_message))
+            if committed['id']:
+                self.push_queue.enqueue(committed['id'], commit_message)
+            return ok
+        if not self.run_step('git_commit', commit):
             return False
         
-        log_commit_message = f"Update commit logs with rotation - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        if not self.run_git_command(f'git commit -m "{log_commit_message}"', 'commit logs'):
-            return False
+        # Step 4: Record the commit in commit-logs.csv (included in the next cycle's commit)
+        self.run_step('update_commit_logs', lambda: self.update_commit_logs(committed['id']))
         
-        if not self.run_git_command('git push origin main', 'push logs'):
+        # Step 5: Push everything queued in one push, unless backing off after a failure
+        if not self.run_step('git_push', self.push_step):
             return False
         
         self.log_operation("Automated rotation cycle completed successfully")
         return True
     
+    def push_step(self, force=False):
+        """Flush the push queue; only a failed push attempt fails the step"""
+        status = self.push_queue.flush(self.git, force=force, on_squash=self.rewrite_commit_ids)
+        if status == 'failed':
+            self.log_operation(f"Git push failed, will retry: {self.push_queue.describe()}", 'error')
+            return False
+        if status == 'deferred':
+            self.log_operation(f"Git push deferred: {self.push_queue.describe()}")
+        elif status == 'pushed':
+            self.log_operation(f"Git push successful to {self.git.remote} {self.git.branch}")
+        return True
+    
+    def rewrite_commit_ids(self, old_commits, new_commit):
+        """Point commit-logs.csv rows for squashed commits at the squash commit"""
+        if not os.path.exists(COMMIT_LOGS_FILE):
+            return
+        old_ids = {commit[:7] for commit in old_commits}
+        with open(COMMIT_LOGS_FILE, 'r') as f:
+            lines = f.readlines()
+        for i, line in enumerate(lines):
+            fields = line.split(',', 3)
+            if len(fields) == 4 and fields[2] in old_ids:
+                fields[2] = new_commit[:7]
+                lines[i] = ','.join(fields)
+        write_if_changed(COMMIT_LOGS_FILE, ''.join(lines))
+        self.log_operation(f"Squashed {len(old_commits)} queued commits into {new_commit[:7]}")
+    
     def run_continuous(self, interval_minutes=30):
         """Run continuous rotation every N minutes"""
         self.log_operation(f"Starting continuous automated rotation every {interval_minutes} minutes")
         
+        interval = interval_minutes * 60
+        next_run = time.time()
         while True:
             try:
                 success = self.perform_rotation_cycle()
@@ -203,8 +224,9 @@ class AutoHoneypotRotator:
                 else:
                     self.log_operation("Rotation cycle failed, will retry in next cycle", 'error')
                 
-                # Wait for next cycle
-                time.sleep(interval_minutes * 60)
+                # Keep a fixed schedule: sleep to the next slot, not a full interval after this cycle
+                next_run = max(next_run + interval, time.time())
+                time.sleep(max(0, next_run - time.time()))
                 
             except KeyboardInterrupt:
                 self.log_operation("Automated rotation stopped by user")
@@ -217,14 +239,29 @@ class AutoHoneypotRotator:
         """Run a single rotation cycle"""
         return self.perform_rotation_cycle()
 
+def pop_option(name, default=None):
+    """Remove a --name VALUE pair from the command line and return VALUE"""
+    if name not in sys.argv:
+        return default
+    position = sys.argv.index(name)
+    value = sys.argv[position + 1]
+    del sys.argv[position:position + 2]
+    return value
+
 def main():
-    rotator = AutoHoneypotRotator()
+    rotator = AutoHoneypotRotator(pop_option('--metrics-file', DEFAULT_METRICS_FILE),
+                                  remote=pop_option('--remote', 'origin'),
+                                  branch=pop_option('--branch', 'main'),
+                                  squash_after=int(pop_option('--squash-after', 0)))
     
     if len(sys.argv) > 1:
         if sys.argv[1] == 'single':
             print("Running single rotation cycle...")
             success = rotator.run_single_cycle()
             sys.exit(0 if success else 1)
+        elif sys.argv[1] == 'push':
+            print("Pushing queued commits...")
+            sys.exit(0 if rotator.push_step(force=True) else 1)
         elif sys.argv[1] == 'continuous':
             interval = 30  # Default 30 minutes
             if len(sys.argv) > 2:
@@ -234,13 +271,20 @@ def main():
                     print("Invalid interval, using default 30 minutes")
             rotator.run_continuous(interval)
         else:
-            print("Usage: python auto_honeypot_rotator.py [single|continuous [interval_minutes]]")
+            print("Usage: python auto_honeypot_rotator.py [single|push|continuous [interval_minutes]] [--remote NAME|URL] [--branch NAME]")
+            print("                                    [--squash-after N]")
+            print("                                    [--metrics-file PATH] [--profile]")
             print("  single: Run one rotation cycle")
+            print("  push: Push queued commits now, ignoring the retry backoff")
             print("  continuous [interval]: Run continuous rotation (default 30 minutes)")
+            print("  --remote/--branch: Where each cycle's single commit is pushed (default origin main)")
+            print("  --squash-after N: Squash queued commits into one once N are waiting to be pushed")
+            print("  --metrics-file: Step timings as Prometheus text (.prom) or JSON lines (default logs/rotation_metrics.prom)")
+            print("  --profile: Write a cProfile dump to logs/profiles/")
     else:
         print("Running single rotation cycle...")
         success = rotator.run_single_cycle()
         sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    run_main(main) 
\ No newline at end of file
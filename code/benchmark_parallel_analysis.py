@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark for parallel access log analysis
+Generates a synthetic honeypot access log and reports lines per second
+when analyzed with 1, 2, 4 and 8 worker processes
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from parallel_analysis import analyze_files
+
+USER_AGENTS = [
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; GPTBot/1.2; +https://openai.com/gptbot)',
+    'Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36',
+    'curl/8.4.0',
+    'python-requests/2.31.0'
+]
+
+def generate_log(path, lines):
+    """Write a synthetic JSON-lines access log"""
+    start = datetime(2025, 1, 1)
+    with open(path, 'w') as f:
+        for i in range(lines):
+            f.write(json.dumps({
+                'timestamp': (start + timedelta(milliseconds=i * 250)).isoformat(),
+                'url': random.choice(['/a-6hp-hlzcrq.html', '/a-7sm-44cbfm.html']),
+                'user_agent': random.choice(USER_AGENTS),
+                'ip_address': f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}",
+                'type': 'honeypot_access'
+            }) + '\n')
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    worker_counts = [1, 2, 4, 8]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'honeypot_access.log')
+        print(f"Generating {lines} synthetic access lines...")
+        generate_log(path, lines)
+        print(f"Log size: {os.path.getsize(path) / 1024 / 1024:.1f} MB, CPUs available: {os.cpu_count()}")
+
+        print(f"\n{'workers':>8} {'seconds':>10} {'lines/s':>12} {'speedup':>8}")
+        baseline = None
+        for workers in worker_counts:
+            started = time.perf_counter()
+            aggregator = analyze_files([path], workers)
+            elapsed = time.perf_counter() - started
+            assert aggregator.total_accesses == lines
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>10.2f} {lines / elapsed:>12,.0f} {baseline / elapsed:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Binary Access Log Segments
+Compact append-only format for honeypot accesses: fixed-width records plus a
+string dictionary, a converter to and from the JSON-lines access log, and an
+mmap-based reader that aggregates with NumPy instead of per-record objects
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import socket
+import struct
+from collections import defaultdict
+from datetime import datetime
+
+from rotation_index import AGE_BUCKETS, AGE_EDGES, GENERATION_BUCKETS, GENERATION_EDGES, StalenessHistograms
+from signed_urls import SIGNED_NAME
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'HPAL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHH8x')
+
+# timestamp_ms, ip, url id, user agent id. ip is the packed IPv4 address, or a
+# string id when IP_IS_STRING is set in the user agent id (IPv6 and others)
+RECORD = struct.Struct('<qIII')
+IP_IS_STRING = 0x80000000
+IPV4 = struct.Struct('!I')
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ('timestamp_ms', '<i8'),
+        ('ip', '<u4'),
+        ('url_id', '<u4'),
+        ('ua_id', '<u4')
+    ])
+    OCTETS = np.array([str(octet) for octet in range(256)])
+    # isoformat leaves out the fraction for whole seconds
+    FRACTIONS = np.array([''] + [f'.{millisecond:03d}000' for millisecond in range(1, 1000)])
+
+def strings_path(segment_path):
+    """Path of the string dictionary that belongs to a segment"""
+    return segment_path + '.strings'
+
+def load_strings(segment_path):
+    """Load the string dictionary as a list indexed by id"""
+    path = strings_path(segment_path)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.endswith('\n')]
+
+def pack_ipv4(ip):
+    """Pack a dotted IPv4 address as an int, or None for anything else"""
+    if ip.count('.') != 3:
+        return None
+    try:
+        return IPV4.unpack(socket.inet_aton(ip))[0]
+    except OSError:
+        return None
+
+def unpack_ipv4(value):
+    return socket.inet_ntoa(IPV4.pack(value))
+
+class SegmentWriter:
+    """Append access records to a binary segment and its string dictionary"""
+
+    def __init__(self, segment_path):
+        self.segment_path = segment_path
+        self.strings = load_strings(segment_path)
+        self.string_ids = {string: string_id for string_id, string in enumerate(self.strings)}
+
+        new_segment = not os.path.exists(segment_path) or os.path.getsize(segment_path) < HEADER.size
+        self.segment = open(segment_path, 'ab')
+        if new_segment:
+            self.segment.truncate(0)
+            self.segment.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size))
+        else:
+            # Drop a torn trailing record left by a crash
+            size = os.path.getsize(segment_path)
+            whole = HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+            if whole != size:
+                self.segment.truncate(whole)
+        self.strings_file = open(strings_path(segment_path), 'a')
+        self.pending_records = []
+
+    def _string_id(self, string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.string_ids[string] = string_id
+            self.strings_file.write(json.dumps(string) + '\n')
+        return string_id
+
+    def append(self, access):
+        """Append one access record (the JSON-lines dict layout)"""
+        ip = access['ip_address']
+        ipv4 = pack_ipv4(ip)
+        self.pending_records.append(RECORD.pack(
+            int(datetime.fromisoformat(access['timestamp']).timestamp() * 1000),
+            ipv4 if ipv4 is not None else self._string_id(ip),
+            self._string_id(access['url']),
+            self._string_id(access['user_agent']) | (0 if ipv4 is not None else IP_IS_STRING)
+        ))
+        if len(self.pending_records) >= 4096:
+            self.flush()
+
+    def flush(self):
+        # Strings go to disk before the records that reference them
+        self.strings_file.flush()
+        self.segment.write(b''.join(self.pending_records))
+        self.segment.flush()
+        self.pending_records = []
+
+    def close(self):
+        self.flush()
+        self.strings_file.close()
+        self.segment.close()
+
+class SegmentReader:
+    """Memory-mapped reader exposing a segment as a NumPy structured array"""
+
+    def __init__(self, segment_path):
+        if np is None:
+            raise ImportError("SegmentReader needs NumPy: pip install numpy")
+        self.segment_path = segment_path
+        self.strings = load_strings(segment_path)
+        self.file = open(segment_path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        magic, version, record_size = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD.size:
+            raise ValueError(f"{segment_path} is not a version {FORMAT_VERSION} access segment")
+
+        count = (size - HEADER.size) // RECORD.size
+        if count:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.records = np.frombuffer(self.map, dtype=RECORD_DTYPE, count=count, offset=HEADER.size)
+        else:
+            self.map = None
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def close(self):
+        # Drop the array view before closing the map it points into
+        self.records = None
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return len(self.records)
+
+    def ip_keys(self):
+        """One int64 key per record: the IPv4 value, or 2**32 + string id for other addresses"""
+        records = self.records
+        ip = records['ip'].astype(np.int64)
+        return np.where(records['ua_id'] & IP_IS_STRING, (1 << 32) + ip, ip)
+
+    def ip_string(self, key):
+        key = int(key)
+        return unpack_ipv4(key) if key < (1 << 32) else self.strings[key - (1 << 32)]
+
+    def ip_strings(self, keys):
+        """ip_string for an array of keys, with IPv4 addresses formatted in bulk"""
+        names = np.empty(len(keys), dtype=object)
+        ipv4 = keys < (1 << 32)
+        values = keys[ipv4]
+        dotted = OCTETS[(values >> 24) & 255]
+        for shift in (16, 8, 0):
+            dotted = np.char.add(np.char.add(dotted, '.'), OCTETS[(values >> shift) & 255])
+        names[ipv4] = dotted
+        names[~ipv4] = [self.strings[key - (1 << 32)] for key in keys[~ipv4].tolist()]
+        return names.tolist()
+
+    def user_agent_ids(self):
+        """User agent ids with the IP_IS_STRING flag masked off"""
+        return self.records['ua_id'] & ~np.uint32(IP_IS_STRING)
+
+    def counts_by_string(self, ids):
+        """Counts per string id, keyed by the decoded string"""
+        counts = np.bincount(ids, minlength=len(self.strings))
+        return {self.strings[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+    def build_analysis(self, rate_rules=None, classifier=None, rotation_index=None, signer=None):
+        """Build the same report structure as AccessAggregator.build_analysis
+
+        Rate rules are evaluated over fixed (tumbling) windows aligned to
+        multiples of window_seconds rather than sliding windows. Hits are
+        attributed to rotation generations with rotation_index (and signer,
+        for signed URLs) as attribute_rotations does; segments don't keep
+        the served page, so hits on an original name go by that name.
+        """
+        from honeypot_monitor import DEFAULT_RATE_RULES, TOP_N, top_items
+        from crawler_classifier import get_default_classifier
+
+        classifier = classifier or get_default_classifier()
+        rate_rules = rate_rules if rate_rules is not None else DEFAULT_RATE_RULES
+        records = self.records
+        timestamps = records['timestamp_ms']
+
+        # Dense index per distinct IP, so every later grouping is a 1-D integer unique
+        ip_values, ip_index, ip_counts = np.unique(self.ip_keys(), return_inverse=True, return_counts=True)
+        ip_index = ip_index.reshape(-1).astype(np.int64)
+        ip_names = self.ip_strings(ip_values)
+
+        ua_ids = self.user_agent_ids()
+        access_by_url = self.counts_by_string(records['url_id'])
+        access_by_ip = dict(zip(ip_names, ip_counts.tolist()))
+        access_by_user_agent = self.counts_by_string(ua_ids)
+
+        analysis = {
+            'approximate': False,
+            'total_accesses': len(records),
+            'unique_ips': len(access_by_ip),
+            'unique_user_agents': len(access_by_user_agent),
+            'access_by_url': access_by_url,
+            'access_by_ip': access_by_ip,
+            'access_by_user_agent': access_by_user_agent,
+            'access_by_crawler': {},
+            'top_urls': top_items(access_by_url, TOP_N),
+            'top_ips': _top_counts(ip_names, ip_counts, TOP_N),
+            'top_user_agents': top_items(access_by_user_agent, TOP_N),
+            'rotation_staleness': StalenessHistograms().report(),
+            'suspicious_activity': []
+        }
+        if not len(records):
+            return analysis
+
+        for rule in rate_rules:
+            window = timestamps // (rule['window_seconds'] * 1000)
+            window = window - window.min()
+            groups, first, last, counts = _group_stats(ip_index * (int(window.max()) + 1) + window, timestamps)
+            over = np.flatnonzero(counts > rule['threshold'])
+            if not len(over):
+                continue
+            # Report each IP once, with its busiest window
+            over = over[np.argsort(-counts[over], kind='stable')]
+            over_ips, first_over = np.unique(groups[over] // (int(window.max()) + 1), return_index=True)
+            over = over[first_over]
+            first_seen, last_seen = _format_ms(np.concatenate([first[over], last[over]])).reshape(2, -1)
+            for ip, count, first_string, last_string in zip(over_ips.tolist(), counts[over].tolist(),
+                                                            first_seen.tolist(), last_seen.tolist()):
+                analysis['suspicious_activity'].append({
+                    'type': 'high_frequency_ip',
+                    'ip': ip_names[ip],
+                    'rule': rule['name'],
+                    'window_seconds': rule['window_seconds'],
+                    'threshold': rule['threshold'],
+                    'count': count,
+                    'first_seen': first_string,
+                    'last_seen': last_string
+                })
+
+        # Classify each distinct user agent once, then aggregate crawler rows in bulk
+        signatures = {}
+        for ua_id in np.unique(ua_ids).tolist():
+            signature = classifier.classify(self.strings[ua_id])
+            if signature is not None:
+                signatures[ua_id] = signature
+        # Crawler name per record as an index into crawler_names; 0 is unclassified
+        crawler_names = ['unclassified'] + sorted({signature['name'] for signature in signatures.values()})
+        crawler_of_ua = np.zeros(len(self.strings), dtype=np.int64)
+        for ua_id, signature in signatures.items():
+            crawler_of_ua[ua_id] = crawler_names.index(signature['name'])
+        crawler_index = crawler_of_ua[ua_ids]
+
+        if signatures:
+            crawler_mask = crawler_index > 0
+            crawler_counts = np.bincount(crawler_index[crawler_mask], minlength=len(crawler_names))
+            analysis['access_by_crawler'] = {name: int(crawler_counts[i]) for i, name in enumerate(crawler_names)
+                                             if crawler_counts[i]}
+            crawler_ua = ua_ids[crawler_mask].astype(np.int64)
+            groups, first, last, counts = _group_stats(crawler_ua * len(ip_values) + ip_index[crawler_mask],
+                                                       timestamps[crawler_mask])
+            first_seen = _format_ms(first)
+            last_seen = _format_ms(last)
+            group_ua, group_ip = np.divmod(groups, len(ip_values))
+            # Fields shared by every row of a user agent are built once, in report key order
+            rows = {ua_id: {'type': 'crawler_user_agent', 'user_agent': self.strings[ua_id], 'ip': None,
+                            'crawler': signature['name'], 'category': signature['category'],
+                            'crawler_type': signature['type'], 'first_seen': None, 'last_seen': None, 'count': 0}
+                    for ua_id, signature in signatures.items()}
+            suspicious_activity = analysis['suspicious_activity']
+            for ua_id, ip, first_string, last_string, count in zip(group_ua.tolist(), group_ip.tolist(),
+                                                                   first_seen.tolist(), last_seen.tolist(),
+                                                                   counts.tolist()):
+                row = rows[ua_id].copy()
+                row['ip'] = ip_names[ip]
+                row['first_seen'] = first_string
+                row['last_seen'] = last_string
+                row['count'] = count
+                suspicious_activity.append(row)
+
+        analysis['rotation_staleness'] = self.rotation_staleness(
+            timestamps, ip_index, ip_names, crawler_index, crawler_names, rotation_index, signer).report()
+        return analysis
+
+    def rotation_staleness(self, timestamps, ip_index, ip_names, crawler_index, crawler_names,
+                           rotation_index=None, signer=None):
+        """StalenessHistograms over the whole segment, one vectorized pass per distinct URL"""
+        histograms = StalenessHistograms()
+        if rotation_index is None and signer is None:
+            return histograms
+        url_ids = self.records['url_id']
+        order = np.argsort(url_ids, kind='stable')
+        distinct, starts = np.unique(url_ids[order], return_index=True)
+        for url_id, rows in zip(distinct.tolist(), np.split(order, starts[1:])):
+            url = self.strings[url_id]
+            seconds = timestamps[rows] / 1000
+            name = url.split('?', 1)[0].rsplit('/', 1)[-1]
+            entry = rotation_index.intervals.get(name) if rotation_index is not None else None
+            if entry is not None:
+                _add_index_hits(histograms, rotation_index, entry, seconds, crawler_index[rows], crawler_names)
+            elif signer is not None and signer.verify(url) is not None:
+                _add_signed_hits(histograms, signer, url, seconds, ip_index[rows], ip_names,
+                                 crawler_index[rows], crawler_names)
+        return histograms
+
+def _add_counts(counter, labels, codes):
+    """Add how often each label index occurs in codes to a label -> count dict"""
+    for code, count in enumerate(np.bincount(codes, minlength=len(labels)).tolist()):
+        if count:
+            counter[labels[code]] += count
+
+def _add_histogram(counter, buckets, edges, values):
+    # bisect_left per value, as rotation_index._bucket does
+    _add_counts(counter, [label for _, label in buckets], np.searchsorted(edges, values, side='left'))
+
+def _add_states(histograms, states, crawler_index, crawler_names):
+    """Add state counts (0 unpublished, 1 live, 2 retired) overall and per crawler"""
+    labels = ['unpublished', 'live', 'retired']
+    _add_counts(histograms.states, labels, states)
+    pairs = np.bincount(crawler_index * 3 + states, minlength=len(crawler_names) * 3).reshape(-1, 3)
+    for crawler in np.flatnonzero(pairs.sum(axis=1)).tolist():
+        counter = histograms.by_crawler.setdefault(crawler_names[crawler], defaultdict(int))
+        for state, count in enumerate(pairs[crawler].tolist()):
+            if count:
+                counter[labels[state]] += count
+
+def _add_index_hits(histograms, index, entry, seconds, crawler_index, crawler_names):
+    """RotationIndex.lookup for every hit on one URL name, added to the histograms"""
+    starts, intervals = entry
+    position = np.searchsorted(starts, seconds, side='right') - 1
+    published = position >= 0
+    position = np.maximum(position, 0)
+    live_from = np.array([interval[0] for interval in intervals])[position]
+    retired_at = np.array([interval[1] for interval in intervals])[position]
+    generation = np.array([interval[3] for interval in intervals])[position]
+    families = [interval[2] for interval in intervals]
+    current_generation = np.zeros(len(seconds), dtype=np.int64)
+    for family in set(families):
+        mask = np.array([name == family for name in families])[position]
+        current_generation[mask] = np.searchsorted(index.family_times[family], seconds[mask], side='right')
+    retired = published & (seconds >= retired_at)
+    _add_states(histograms, np.where(published, np.where(retired, 2, 1), 0), crawler_index, crawler_names)
+    known_start = published & (live_from != -np.inf)
+    _add_histogram(histograms.live_age, AGE_BUCKETS, AGE_EDGES,
+                   (np.minimum(seconds, retired_at) - live_from)[known_start])
+    _add_histogram(histograms.retired_age, AGE_BUCKETS, AGE_EDGES, (seconds - retired_at)[retired])
+    _add_histogram(histograms.generations_behind, GENERATION_BUCKETS, GENERATION_EDGES,
+                   (current_generation - generation)[published])
+
+def _add_signed_hits(histograms, signer, url, seconds, ip_index, ip_names, crawler_index, crawler_names):
+    """URLSigner.attribute for every hit on one signed URL, added to the histograms"""
+    token = signer.verify(url)
+    issued, window = token['issued'], signer.window_seconds
+    expires = issued + window
+    published = seconds >= issued
+    retired = seconds >= expires
+    _add_states(histograms, np.where(published, np.where(retired, 2, 1), 0), crawler_index, crawler_names)
+    _add_histogram(histograms.live_age, AGE_BUCKETS, AGE_EDGES, (np.minimum(seconds, expires) - issued)[published])
+    _add_histogram(histograms.retired_age, AGE_BUCKETS, AGE_EDGES, (seconds - expires)[retired])
+    behind = (seconds // window - issued // window).astype(np.int64)
+    _add_histogram(histograms.generations_behind, GENERATION_BUCKETS, GENERATION_EDGES, behind[published])
+    histograms.channels[token['channel']] += len(seconds)
+    if SIGNED_NAME.fullmatch(url.split('?', 1)[0].rsplit('/', 1)[-1]).group('visitor') is not None:
+        # Bound to a visitor: check each distinct requesting IP once
+        ips, inverse = np.unique(ip_index, return_inverse=True)
+        matches = np.array([signer.verify(url, ip_names[ip])['visitor_match'] for ip in ips.tolist()])
+        histograms.handoffs += int(np.count_nonzero(~matches[inverse.reshape(-1)]))
+
+def _top_counts(names, counts, n):
+    """top_items over parallel name/count arrays, with the same tie order"""
+    return [(names[i], int(counts[i])) for i in np.argsort(-counts, kind='stable')[:n].tolist()]
+
+def _group_stats(keys, timestamps):
+    """Distinct keys with the first/last timestamp and count of each group"""
+    # Sorted by key then time, each group's first and last rows hold its first/last timestamps
+    order = np.lexsort((timestamps, keys))
+    keys, timestamps = keys[order], timestamps[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    ends = np.append(starts[1:], len(keys))
+    return keys[starts], timestamps[starts], timestamps[ends - 1], ends - starts
+
+def _format_ms(values):
+    """Format epoch milliseconds as local ISO timestamps like the JSON log uses"""
+    if np.ndim(values) == 0:
+        return datetime.fromtimestamp(int(values) / 1000).isoformat()
+    values = np.asarray(values, dtype=np.int64)
+    # Local UTC offset looked up once per distinct hour instead of once per value
+    hours, inverse = np.unique(values // 3600000, return_inverse=True)
+    offsets = np.array([int(datetime.fromtimestamp(hour * 3600).astimezone().utcoffset().total_seconds() * 1000)
+                        for hour in hours.tolist()], dtype=np.int64)
+    seconds, milliseconds = np.divmod(values + offsets[inverse.reshape(-1)], 1000)
+    # Each distinct second is formatted once; the fraction comes from a table
+    seconds, inverse = np.unique(seconds, return_inverse=True)
+    strings = np.datetime_as_string(seconds.astype('datetime64[s]'))
+    return np.char.add(strings[inverse.reshape(-1)], FRACTIONS[milliseconds])
+
+def convert_jsonl_to_segment(jsonl_path, segment_path):
+    """Append every record of a JSON-lines access log to a binary segment"""
+    from honeypot_monitor import LogLineReader, parse_accesses
+
+    writer = SegmentWriter(segment_path)
+    converted = 0
+    try:
+        for access in parse_accesses(LogLineReader(jsonl_path)):
+            try:
+                writer.append(access)
+            except ValueError:
+                continue
+            converted += 1
+    finally:
+        writer.close()
+    return converted
+
+def convert_segment_to_jsonl(segment_path, jsonl_path):
+    """Write a binary segment back out as a JSON-lines access log (millisecond timestamps)"""
+    strings = load_strings(segment_path)
+    exported = 0
+    with open(segment_path, 'rb') as segment, open(jsonl_path, 'w') as out:
+        magic, version, record_size = HEADER.unpack(segment.read(HEADER.size))
+        if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD.size:
+            raise ValueError(f"{segment_path} is not a version {FORMAT_VERSION} access segment")
+        data = segment.read()
+        whole = len(data) // RECORD.size * RECORD.size
+        for timestamp_ms, ip, url_id, ua_id in RECORD.iter_unpack(data[:whole]):
+            out.write(json.dumps({
+                'timestamp': datetime.fromtimestamp(timestamp_ms / 1000).isoformat(),
+                'url': strings[url_id],
+                'user_agent': strings[ua_id & ~IP_IS_STRING],
+                'ip_address': strings[ip] if ua_id & IP_IS_STRING else unpack_ipv4(ip),
+                'type': 'honeypot_access'
+            }) + '\n')
+            exported += 1
+    return exported
+
+def compare(jsonl_path, segment_path):
+    """Compare size and analysis time of the JSON-lines log and its binary segment"""
+    from honeypot_monitor import (ROTATIONS_LOG, AccessAggregator, LogLineReader, parse_accesses,
+                                  classify_accesses)
+    from rotation_index import attribute_rotations, load_rotation_index
+    from signed_urls import get_default_signer
+
+    # Both sides attribute rotations, so they build the same report
+    rotation_index = load_rotation_index(ROTATIONS_LOG)
+    signer = get_default_signer()
+    jsonl_size = os.path.getsize(jsonl_path)
+    segment_size = os.path.getsize(segment_path) + os.path.getsize(strings_path(segment_path))
+
+    started = time.perf_counter()
+    AccessAggregator().consume(attribute_rotations(classify_accesses(parse_accesses(LogLineReader(jsonl_path))),
+                                                   rotation_index, signer)).build_analysis()
+    jsonl_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    reader = SegmentReader(segment_path)
+    reader.build_analysis(rotation_index=rotation_index, signer=signer)
+    reader.close()
+    segment_seconds = time.perf_counter() - started
+
+    print(f"JSONL:   {jsonl_size / 1024 / 1024:8.1f} MB  analysis {jsonl_seconds:7.2f}s")
+    print(f"Segment: {segment_size / 1024 / 1024:8.1f} MB  analysis {segment_seconds:7.2f}s")
+    print(f"Size ratio {jsonl_size / max(segment_size, 1):.1f}x, speedup {jsonl_seconds / max(segment_seconds, 1e-9):.1f}x")
+
+def main():
+    if len(sys.argv) < 4 and not (len(sys.argv) == 3 and sys.argv[1] == 'analyze'):
+        print("Usage: python binary_access_log.py [command] ...")
+        print("Commands:")
+        print("  convert JSONL SEGMENT  - Append a JSON-lines access log to a binary segment")
+        print("  export SEGMENT JSONL   - Write a binary segment back out as JSON lines")
+        print("  analyze SEGMENT        - Print the analysis report for a segment (needs NumPy)")
+        print("  compare JSONL SEGMENT  - Compare size and analysis time of both formats")
+        return
+
+    command = sys.argv[1]
+    if command == 'convert':
+        print(f"Converted {convert_jsonl_to_segment(sys.argv[2], sys.argv[3])} records")
+    elif command == 'export':
+        print(f"Exported {convert_segment_to_jsonl(sys.argv[2], sys.argv[3])} records")
+    elif command == 'analyze':
+        from honeypot_monitor import ROTATIONS_LOG, HoneypotMonitor
+        from rotation_index import load_rotation_index
+        from signed_urls import get_default_signer
+        reader = SegmentReader(sys.argv[2])
+        HoneypotMonitor().print_report(reader.build_analysis(rotation_index=load_rotation_index(ROTATIONS_LOG),
+                                                             signer=get_default_signer()))
+        reader.close()
+    elif command == 'compare':
+        compare(sys.argv[2], sys.argv[3])
+    else:
+        print(f"Unknown command: {command}")
+
+if __name__ == "__main__":
+    main()
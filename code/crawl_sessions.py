@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Crawl Session Reconstruction
+Groups access records into crawl sessions per (IP, user agent), closed after
+an inactivity gap, and reports for each session the ordered fetch sequence,
+how every page was discovered (a link from a page fetched earlier in the
+session, the sitemap, a robots.txt Disallow rule, or none of those), the link
+depth and breadth reached, and the fetch cadence
+
+Sessions are written to a JSONL report as soon as they close. Records are
+processed in one pass in log order, open sessions live in an OrderedDict kept
+in last-seen order so expiry is O(1) per record, and every per-session
+structure is capped, so memory depends on the number of concurrently active
+crawlers rather than on the size of the logs
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import heapq
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from collections import OrderedDict, defaultdict, namedtuple
+
+from honeypot_monitor import HoneypotMonitor, classify_accesses, epoch_seconds
+from log_importer import LogImporter
+from site_builder import load_manifest
+from decoy_generator import DecoyGraph, parse_decoy_url
+from timing_metrics import run_main
+
+DEFAULT_GAP_SECONDS = 30 * 60
+DEFAULT_OUTPUT = 'logs/crawl_sessions.jsonl'
+
+# Per-session caps
+MAX_SEQUENCE = 500
+MAX_HONEYPOT_HITS = 100
+MAX_TRACKED_PAGES = 20000
+
+# Sessions open at once; the least recently active is closed early beyond this
+MAX_OPEN_SESSIONS = 100000
+
+CHANNELS = ('link', 'sitemap', 'robots', 'direct')
+
+# Upper bounds (seconds) and labels for the gaps between consecutive fetches
+CADENCE_BUCKETS = [(1, '<1s'), (5, '1-5s'), (30, '5-30s'), (300, '30s-5m'), (float('inf'), '>5m')]
+CADENCE_EDGES = [edge for edge, _ in CADENCE_BUCKETS]
+
+HREF = re.compile(r'href=["\']([^"\'#?]+)')
+
+# Everything the sessionizer needs to know about a requested URL
+PageInfo = namedtuple('PageInfo', 'path role sources in_sitemap disallowed honeypot decoy_depth')
+
+class SiteMap:
+    """What the site tells a crawler: which pages link where, the sitemap and robots.txt
+
+    Built once from the site manifest, the top-level pages' links and
+    robots.txt; decoy links are computed from the decoy graph instead of
+    being read from disk.
+    """
+
+    def __init__(self, root='.'):
+        manifest = load_manifest()
+        self.honeypots = manifest['honeypots']
+        self.honeypot_stems = {name[:-len('.html')]: name for name in self.honeypots}
+        self.sitemap_name = manifest['sitemap']
+        sitemap_stem = self.sitemap_name[:-len('.xml')]
+        self.sitemap_files = re.compile(re.escape(sitemap_stem) + r'(?:-\d+)?\.xml(?:\.gz)?')
+        self.sitemap_pages = {page['path'] or 'index.html' for page in manifest['pages']}
+        self.sitemap_pages.update(name for name, settings in self.honeypots.items() if settings['channel'] == 'sitemap')
+        self.sitemap_directories = tuple(inventory['directory'].strip('/') + '/'
+                                         for inventory in manifest.get('sitemap_directories', []))
+        decoys = manifest.get('decoys')
+        self.decoy_graph = DecoyGraph(decoys) if decoys else None
+        self.decoy_entry_pages = tuple(decoys.get('entry_pages', [])) if decoys else ()
+
+        # Target page -> pages linking to it, for the hand-written top-level pages
+        self.links = defaultdict(set)
+        for entry in sorted(os.scandir(root), key=lambda entry: entry.name):
+            if not entry.name.endswith('.html') or not entry.is_file():
+                continue
+            source = self.page(entry.name)
+            with open(entry.path, 'r', encoding='utf-8', errors='replace') as f:
+                for href in HREF.findall(f.read()):
+                    if '://' not in href:
+                        self.links[self.page(href)].add(source)
+
+        self.disallowed = []
+        robots_file = os.path.join(root, 'robots.txt')
+        if os.path.exists(robots_file):
+            with open(robots_file, 'r') as f:
+                for line in f:
+                    field, _, value = line.partition(':')
+                    value = value.strip().lstrip('/')
+                    # "Disallow: /" for everyone else names nothing in particular
+                    if field.strip().lower() == 'disallow' and value:
+                        self.disallowed.append(value)
+        self.disallowed = tuple(self.disallowed)
+
+        # URL cardinality is tiny next to hit volume, so cache per distinct URL
+        self.info = lru_cache(maxsize=65536)(self._info)
+
+    def _info(self, url):
+        path = self.page(url)
+        role = 'sitemap' if self.is_sitemap(path) else 'robots' if path == 'robots.txt' else 'page'
+        decoy = parse_decoy_url(path, self.decoy_graph.directory) if self.decoy_graph else None
+        return PageInfo(path, role, tuple(self.sources(path)), self.in_sitemap(path), self.is_disallowed(path),
+                        path in self.honeypots, decoy['depth'] if decoy else None)
+
+    def page(self, url):
+        """Site path for a URL, with rotated and signed honeypot names mapped to the original page"""
+        path = url.split('?', 1)[0].lstrip('/') or 'index.html'
+        if '/' not in path and path.endswith('.html'):
+            stem = path[:-len('.html')]
+            for family in (stem, stem.rsplit('-', 1)[0], stem.rsplit('-', 2)[0]):
+                if family in self.honeypot_stems:
+                    return self.honeypot_stems[family]
+        return path
+
+    def is_sitemap(self, path):
+        return self.sitemap_files.fullmatch(path) is not None
+
+    def in_sitemap(self, path):
+        return path in self.sitemap_pages or path.startswith(self.sitemap_directories)
+
+    def is_disallowed(self, path):
+        return path.startswith(self.disallowed)
+
+    def sources(self, path):
+        """Pages that link to path"""
+        decoy = parse_decoy_url(path, self.decoy_graph.directory) if self.decoy_graph else None
+        if decoy is None:
+            return self.links.get(path, ())
+        if decoy['kind'] == 'index':
+            return self.decoy_entry_pages
+        if decoy['kind'] == 'tree':
+            return (self.decoy_graph.parent(decoy['branch'], decoy['depth'], decoy['node']),)
+        return ()
+
+class CrawlSession:
+    """Bounded state for one (IP, user agent) session"""
+
+    def __init__(self, ip, user_agent, crawler, start):
+        self.ip = ip
+        self.user_agent = user_agent
+        self.crawler = crawler['name'] if crawler else None
+        self.start = start
+        self.last = start
+        self.fetches = 0
+        self.unique_pages = 0
+        self.channels = dict.fromkeys(CHANNELS, 0)
+        # Page -> (first fetch time, link depth), oldest evicted first past MAX_TRACKED_PAGES
+        self.seen = OrderedDict()
+        self.sitemap_at = None
+        self.robots_at = None
+        self.sequence = []
+        self.honeypot_hits = []
+        self.breadth = defaultdict(int)
+        self.decoy_depth = None
+        self.gaps = 0
+        self.gap_mean = 0.0
+        self.gap_m2 = 0.0
+        self.gap_min = None
+        self.gap_max = None
+        self.cadence = dict.fromkeys((label for _, label in CADENCE_BUCKETS), 0)
+
+    def add(self, url, now, site):
+        """Fold one fetch into the session"""
+        if self.fetches:
+            self._add_gap(now - self.last)
+        self.fetches += 1
+        self.last = now
+        info = site.info(url)
+        path = info.path
+
+        via = None
+        depth = 0
+        if info.role == 'sitemap':
+            channel = 'direct'
+            if self.sitemap_at is None:
+                self.sitemap_at = now
+        elif info.role == 'robots':
+            channel = 'direct'
+            if self.robots_at is None:
+                self.robots_at = now
+        else:
+            channel, via, depth = self._discovery(info, site)
+
+        if path not in self.seen:
+            self.unique_pages += 1
+            self.breadth[depth] += 1
+            self.seen[path] = (now, depth)
+            if len(self.seen) > MAX_TRACKED_PAGES:
+                self.seen.popitem(last=False)
+        self.channels[channel] += 1
+        if info.decoy_depth is not None and (self.decoy_depth is None or info.decoy_depth > self.decoy_depth):
+            self.decoy_depth = info.decoy_depth
+
+        if len(self.sequence) < MAX_SEQUENCE:
+            self.sequence.append((now, url, channel, via, depth))
+        if info.honeypot and len(self.honeypot_hits) < MAX_HONEYPOT_HITS:
+            via_at = self._via_time(via, channel)
+            self.honeypot_hits.append({
+                'page': path,
+                'url': url,
+                'channel': channel,
+                'via': via,
+                'seconds_after_via': None if via_at is None else round(now - via_at, 3),
+                'offset_seconds': round(now - self.start, 3)
+            })
+
+    def _discovery(self, info, site):
+        """(channel, via, link depth) for a page, judged by what the session fetched before it"""
+        best = None
+        for source in info.sources:
+            seen = self.seen.get(source)
+            if seen is not None and (best is None or seen[1] < best[1][1]):
+                best = (source, seen)
+        if best is not None:
+            return 'link', best[0], best[1][1] + 1
+        if self.sitemap_at is not None and info.in_sitemap:
+            return 'sitemap', site.sitemap_name, 0
+        if self.robots_at is not None and info.disallowed:
+            return 'robots', 'robots.txt', 0
+        return 'direct', None, 0
+
+    def _via_time(self, via, channel):
+        if channel == 'sitemap':
+            return self.sitemap_at
+        if channel == 'robots':
+            return self.robots_at
+        if via is not None and via in self.seen:
+            return self.seen[via][0]
+        return None
+
+    def _add_gap(self, gap):
+        # Welford's running mean and variance
+        self.gaps += 1
+        delta = gap - self.gap_mean
+        self.gap_mean += delta / self.gaps
+        self.gap_m2 += delta * (gap - self.gap_mean)
+        self.gap_min = gap if self.gap_min is None else min(self.gap_min, gap)
+        self.gap_max = gap if self.gap_max is None else max(self.gap_max, gap)
+        self.cadence[CADENCE_BUCKETS[bisect_right(CADENCE_EDGES, gap)][1]] += 1
+
+    def to_dict(self, ended):
+        return {
+            'ip': self.ip,
+            'user_agent': self.user_agent,
+            'crawler': self.crawler,
+            'start': datetime.fromtimestamp(self.start).isoformat(),
+            'end': datetime.fromtimestamp(self.last).isoformat(),
+            'duration_seconds': round(self.last - self.start, 3),
+            'ended': ended,
+            'fetches': self.fetches,
+            'unique_pages': self.unique_pages,
+            'channels': self.channels,
+            'depth': max(self.breadth) if self.breadth else 0,
+            'breadth': max(self.breadth.values()) if self.breadth else 0,
+            'pages_by_depth': {str(depth): count for depth, count in sorted(self.breadth.items())},
+            'decoy_depth': self.decoy_depth,
+            'fetched_sitemap': self.sitemap_at is not None,
+            'fetched_robots': self.robots_at is not None,
+            'cadence': {
+                'mean_seconds': round(self.gap_mean, 3) if self.gaps else None,
+                'stdev_seconds': round(math.sqrt(self.gap_m2 / self.gaps), 3) if self.gaps else None,
+                'min_seconds': None if self.gap_min is None else round(self.gap_min, 3),
+                'max_seconds': None if self.gap_max is None else round(self.gap_max, 3),
+                'histogram': self.cadence
+            },
+            'honeypot_hits': self.honeypot_hits,
+            'sequence': [{'offset_seconds': round(at - self.start, 3), 'url': url, 'channel': channel,
+                          'via': via, 'depth': depth}
+                         for at, url, channel, via, depth in self.sequence],
+            'sequence_truncated': self.fetches - len(self.sequence)
+        }
+
+class Sessionizer:
+    """Stream access records into sessions, yielding each session dict as it closes"""
+
+    def __init__(self, site, gap_seconds=DEFAULT_GAP_SECONDS, max_open=MAX_OPEN_SESSIONS):
+        self.site = site
+        self.gap_seconds = gap_seconds
+        self.max_open = max_open
+        self.open = OrderedDict()
+        self.clock = None
+        self.records = 0
+
+    def consume(self, accesses):
+        """Yield closed sessions while folding classified access records in log order"""
+        for access in accesses:
+            try:
+                now = epoch_seconds(access['timestamp'])
+            except (ValueError, TypeError):
+                continue
+            self.records += 1
+            # Slightly out-of-order lines don't move the clock backwards
+            self.clock = now if self.clock is None else max(self.clock, now)
+            yield from self._expire(self.clock - self.gap_seconds)
+
+            key = (access['ip_address'], access['user_agent'])
+            session = self.open.get(key)
+            if session is None:
+                session = self.open[key] = CrawlSession(key[0], key[1], access.get('crawler'), now)
+                if len(self.open) > self.max_open:
+                    yield self.open.popitem(last=False)[1].to_dict('evicted')
+            else:
+                self.open.move_to_end(key)
+            session.add(access['url'], max(now, session.last), self.site)
+        yield from self.flush()
+
+    def _expire(self, cutoff):
+        while self.open:
+            session = next(iter(self.open.values()))
+            if session.last >= cutoff:
+                return
+            self.open.popitem(last=False)
+            yield session.to_dict('idle')
+
+    def flush(self):
+        while self.open:
+            yield self.open.popitem(last=False)[1].to_dict('end_of_log')
+
+class SessionSummary:
+    """Totals over the emitted sessions for the console report"""
+
+    def __init__(self, top=10):
+        self.top = top
+        self.sessions = 0
+        self.fetches = 0
+        self.channels = dict.fromkeys(CHANNELS, 0)
+        self.honeypot_channels = defaultdict(int)
+        self.deepest = []
+
+    def add(self, session):
+        self.sessions += 1
+        self.fetches += session['fetches']
+        for channel, count in session['channels'].items():
+            self.channels[channel] += count
+        for hit in session['honeypot_hits']:
+            self.honeypot_channels[hit['channel']] += 1
+        entry = (session['depth'], session['decoy_depth'] or 0, session['ip'], session['crawler'] or session['user_agent'][:60])
+        if len(self.deepest) < self.top:
+            heapq.heappush(self.deepest, entry)
+        else:
+            heapq.heappushpop(self.deepest, entry)
+
+def iter_accesses(paths, log_format='auto'):
+    """Every request in the given logs as access records, not only honeypot hits"""
+    importer = LogImporter(HoneypotMonitor(), prefixes=('/',), log_format=log_format)
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Skipping missing log {path}")
+            continue
+        yield from importer.import_file(path)
+
+def get_option(args, name, default=None):
+    if name in args:
+        return args[args.index(name) + 1]
+    return default
+
+def main():
+    args = sys.argv[1:]
+    if '--help' in args or '-h' in args:
+        print("Usage: python crawl_sessions.py [FILE ...] [--gap SECONDS] [--output PATH] [--format auto|combined|json] [--profile]")
+        print("  Rebuild crawl sessions from access logs (plain or compressed, oldest first;")
+        print("  default logs/honeypot_access.log) and write them to a JSONL report")
+        print("  --gap: Inactivity that ends a session (default 1800)")
+        print("  --output: Report path (default logs/crawl_sessions.jsonl, - for stdout)")
+        print("  Web server logs give the full picture; the honeypot access log only has honeypot hits")
+        return
+
+    options = ('--gap', '--output', '--format')
+    paths = [arg for i, arg in enumerate(args) if not arg.startswith('--') and (i == 0 or args[i - 1] not in options)]
+    gap = float(get_option(args, '--gap', DEFAULT_GAP_SECONDS))
+    output = get_option(args, '--output', DEFAULT_OUTPUT)
+
+    sessionizer = Sessionizer(SiteMap(), gap)
+    summary = SessionSummary()
+    accesses = classify_accesses(iter_accesses(paths or ['logs/honeypot_access.log'], get_option(args, '--format', 'auto')))
+    if output != '-':
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    out = sys.stdout if output == '-' else open(output, 'w')
+    try:
+        for session in sessionizer.consume(accesses):
+            out.write(json.dumps(session) + '\n')
+            summary.add(session)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if output == '-':
+        return
+
+    print(f"{summary.sessions} sessions from {sessionizer.records} requests written to {output}")
+    print("Discovery channels: " + '  '.join(f"{channel}={count}" for channel, count in summary.channels.items()))
+    if summary.honeypot_channels:
+        print("Honeypot hits by channel: " + '  '.join(f"{channel}={count}" for channel, count in
+                                                      sorted(summary.honeypot_channels.items())))
+    if summary.deepest:
+        print("Deepest sessions (link depth, decoy depth):")
+        for depth, decoy_depth, ip, who in sorted(summary.deepest, reverse=True):
+            print(f"  {depth:3d} {decoy_depth:3d}  {ip}  {who}")
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Crawler User-Agent Classifier
+Matches user agents against the crawler catalogue in crawler_signatures.json
+using one precompiled regex, with results memoized per distinct user agent
+"""
+
+import os
+import re
+import sys
+import json
+from functools import lru_cache
+
+DEFAULT_SIGNATURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crawler_signatures.json')
+
+class CrawlerClassifier:
+    """Classify user agent strings as known crawlers, generic bots or browsers
+
+    ``classify`` returns the catalogue entry for the matching crawler (name,
+    vendor, category, type, robots_group) or None. Returned dicts are shared
+    between calls and must not be modified.
+    """
+
+    def __init__(self, signatures_file=DEFAULT_SIGNATURES_FILE, cache_size=65536):
+        with open(signatures_file, 'r') as f:
+            catalogue = json.load(f)
+
+        self.signatures = []
+        self.signature_by_token = {}
+        for entry in catalogue['signatures']:
+            signature = {key: value for key, value in entry.items() if key != 'tokens'}
+            self.signatures.append(signature)
+            for token in entry['tokens']:
+                self.signature_by_token[token.lower()] = signature
+
+        # Longest tokens first so 'Googlebot-Image' wins over 'Googlebot' at the same position
+        tokens = sorted(self.signature_by_token, key=len, reverse=True)
+        self.known_pattern = re.compile(r'\b(?:' + '|'.join(re.escape(token) for token in tokens) + ')', re.IGNORECASE)
+
+        indicators = catalogue.get('generic_indicators', [])
+        self.generic_pattern = re.compile('|'.join(re.escape(indicator) for indicator in indicators), re.IGNORECASE) if indicators else None
+        self.generic_signature = {
+            'name': 'Generic bot',
+            'vendor': 'Unknown',
+            'category': 'generic',
+            'type': 'unknown',
+            'robots_group': '*'
+        }
+
+        # UA cardinality is tiny next to hit volume, so cache per distinct string
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, user_agent):
+        """Classify a user agent without consulting the cache"""
+        if not user_agent:
+            return None
+
+        match = self.known_pattern.search(user_agent)
+        if match:
+            return self.signature_by_token[match.group(0).lower()]
+
+        if self.generic_pattern is not None and self.generic_pattern.search(user_agent):
+            return self.generic_signature
+
+        return None
+
+    def is_crawler(self, user_agent):
+        """Check whether a user agent belongs to any crawler"""
+        return self.classify(user_agent) is not None
+
+_default_classifier = None
+
+def get_default_classifier():
+    """Return a shared classifier built from the bundled catalogue"""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = CrawlerClassifier()
+    return _default_classifier
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python crawler_classifier.py \"<user agent>\" [...]")
+        return
+
+    classifier = get_default_classifier()
+    for user_agent in sys.argv[1:]:
+        signature = classifier.classify(user_agent)
+        if signature is None:
+            print(f"{user_agent}: not a crawler")
+        else:
+            print(f"{user_agent}: {signature['name']} ({signature['vendor']}, {signature['category']}, "
+                  f"type={signature['type']}, robots group={signature['robots_group']})")
+
+if __name__ == "__main__":
+    main()
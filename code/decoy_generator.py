@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Decoy Site Generator
+Builds a synthetic site under decoy/ from the existing hub and article pages,
+so crawl depth can be measured far past the eight hand-written pages. The link
+graph comes from the "decoys" section of code/site_manifest.json: branches of
+a tree with a fixed depth and fan-out, some of them disallowed in robots.txt,
+plus orphan pages (no inbound links) and sitemap-only pages
+
+    decoy/index.html                   depth 0, links every branch root
+    decoy/b2/d3-17.html                branch 2, depth 3, node 17 at that depth
+    decoy/private/b3/d1-0.html         branch 3, under a robots.txt Disallow rule
+    decoy/orphan/o-4.html              never linked or listed
+    decoy/sitemap/s-4.html             only listed in the sitemap
+
+Page text is picked from the template pages by a hash of the manifest seed
+and the page path, so pages are reproducible and independent of
+each other. Pages are rendered through precompiled templates in a process
+pool, compared with the digests of the previous build, and only pages whose
+content changed are written
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from site_builder import (MANIFEST_FILE, ROBOTS_FILE, SiteBuilder, content_digest, write_atomic, iter_directory_pages,
+                          load_manifest, sync_robots_rules)
+from page_pipeline import PagePipeline, remove_precompressed
+from git_pipeline import GitPipeline, GitError
+from timing_metrics import run_main
+
+STATE_FILE = 'logs/decoy_state.json'
+ENTRY_LINK_TEXT = '📚 Archive'
+
+# Pages per pool task; small builds are rendered in-process
+CHUNK_PAGES = 2000
+
+DECOY_URL = re.compile(r'(?:^|/)(?P<directory>[^/]+)/(?:(?P<private>private)/)?'
+                       r'(?:b(?P<branch>\d+)/d(?P<depth>\d+)-(?P<node>\d+)'
+                       r'|(?P<kind>orphan|sitemap)/[os]-(?P<number>\d+)'
+                       r'|(?P<index>index))\.html$')
+
+HUB_SLOTS = [
+    ('title', r'<title>(.*?)</title>'),
+    ('heading', r'<h1>(.*?)</h1>'),
+    ('subtitle', r'<header>\s*<h1>.*?</h1>\s*<p>(.*?)</p>'),
+    ('cards', r'<div class="article-grid">(.*?)</div>\s*<div class="hub-links">'),
+    ('links', r'<div class="hub-links">(.*?)</div>')
+]
+CARD_PATTERN = r'<div class="article-card">.*?class="read-more">.*?</a>\s*</div>\s*</div>'
+CARD_SLOTS = [
+    # The template's inline background, or the data-image the page pipeline leaves in its place
+    ('image', r"(?:url\('|data-image=\")([^'\"]*)"),
+    ('icon', r'<span style="font-size: 16px;">(.*?)</span>'),
+    ('title', r'<h3 class="article-title">(.*?)</h3>'),
+    ('excerpt', r'<p class="article-excerpt">(.*?)</p>'),
+    ('href', r'<a href="([^"]*)" class="read-more"')
+]
+ARTICLE_SLOTS = [
+    ('title', r'<title>(.*?)</title>'),
+    ('heading', r'<h1>(.*?)</h1>'),
+    ('subtitle', r'<header>\s*<h1>.*?</h1>\s*<p>(.*?)</p>'),
+    ('image', r"class=\"article-image\" (?:style=\"background-image: url\('|data-image=\")([^'\"]*)"),
+    ('icon', r'<span style="font-size: 32px;">(.*?)</span>'),
+    ('meta', r'<div class="article-meta">(.*?)</div>'),
+    ('body', r'<div class="article-content">(.*?)</div>\s*</div>\s*<div class="navigation">'),
+    ('navigation', r'<div class="navigation">(.*?)</div>')
+]
+
+class SlotTemplate:
+    """Text split into literal parts and named slots, each slot being the first group of its regex"""
+
+    def __init__(self, content, slots, source):
+        spans = []
+        for name, pattern in slots:
+            match = re.search(pattern, content, re.DOTALL)
+            if match is None:
+                raise ValueError(f"{source}: no {name} slot in template")
+            spans.append((match.start(1), match.end(1), name))
+        spans.sort()
+        self.parts = []
+        self.slots = []
+        position = 0
+        for start, end, name in spans:
+            self.parts.append(content[position:start])
+            self.slots.append(name)
+            position = end
+        self.parts.append(content[position:])
+
+    def render(self, values):
+        pieces = [self.parts[0]]
+        for slot, literal in zip(self.slots, self.parts[1:]):
+            pieces.append(values[slot])
+            pieces.append(literal)
+        return ''.join(pieces)
+
+def parse_decoy_url(url, directory='decoy'):
+    """Kind, branch, depth and node encoded in a decoy URL, or None for other URLs"""
+    match = DECOY_URL.search(url.split('?', 1)[0])
+    if match is None or match.group('directory') != directory:
+        return None
+    if match.group('index'):
+        return {'kind': 'index', 'branch': None, 'depth': 0, 'node': 0, 'disallowed': False}
+    if match.group('kind'):
+        return {'kind': match.group('kind'), 'branch': None, 'depth': None,
+                'node': int(match.group('number')), 'disallowed': False}
+    return {'kind': 'tree', 'branch': int(match.group('branch')), 'depth': int(match.group('depth')),
+            'node': int(match.group('node')), 'disallowed': match.group('private') is not None}
+
+class DecoyGraph:
+    """The decoy link graph: page paths and who links to whom, computed from the config alone"""
+
+    def __init__(self, config):
+        self.directory = config['directory'].strip('/')
+        self.depth = config['depth']
+        self.fan_out = config['fan_out']
+        self.branches = config['branches']
+        self.disallowed_branches = config.get('disallowed_branches', 0)
+        self.orphan_pages = config.get('orphan_pages', 0)
+        self.sitemap_only_pages = config.get('sitemap_only_pages', 0)
+        if self.depth < 1 or self.fan_out < 1 or self.branches < 0:
+            raise ValueError("decoys: depth and fan_out must be at least 1 and branches not negative")
+        if not 0 <= self.disallowed_branches <= self.branches:
+            raise ValueError("decoys: disallowed_branches must be between 0 and branches")
+
+    def branch_directory(self, branch):
+        # The last branches are the robots-disallowed ones
+        if branch >= self.branches - self.disallowed_branches:
+            return f'{self.directory}/private/b{branch}'
+        return f'{self.directory}/b{branch}'
+
+    def node_path(self, branch, depth, node):
+        return f'{self.branch_directory(branch)}/d{depth}-{node}.html'
+
+    def index_path(self):
+        return f'{self.directory}/index.html'
+
+    def parent(self, branch, depth, node):
+        return self.node_path(branch, depth - 1, node // self.fan_out) if depth > 1 else self.index_path()
+
+    def children(self, branch, depth, node):
+        # Depth 1 is the branch root; node i's children are i*fan_out .. i*fan_out+fan_out-1
+        if depth == self.depth:
+            return []
+        return [self.node_path(branch, depth + 1, node * self.fan_out + child) for child in range(self.fan_out)]
+
+    def pages(self):
+        """Yield (path, kind, branch, depth, node) for every page in the graph"""
+        yield self.index_path(), 'index', None, 0, 0
+        for branch in range(self.branches):
+            for depth in range(1, self.depth + 1):
+                for node in range(self.fan_out ** (depth - 1)):
+                    yield self.node_path(branch, depth, node), 'tree', branch, depth, node
+        for number in range(self.orphan_pages):
+            yield f'{self.directory}/orphan/o-{number}.html', 'orphan', None, None, number
+        for number in range(self.sitemap_only_pages):
+            yield f'{self.directory}/sitemap/s-{number}.html', 'sitemap', None, None, number
+
+class DecoyGenerator:
+    """Render and write the decoy site described by the manifest's "decoys" section"""
+
+    def __init__(self, manifest_file=MANIFEST_FILE, root='.', overrides=None):
+        manifest = load_manifest(manifest_file)
+        self.config = {**manifest['decoys'], **(overrides or {})}
+        self.root = root
+        self.graph = DecoyGraph(self.config)
+        self.directory = self.graph.directory
+        self.state_file = os.path.join(root, STATE_FILE)
+        sitemap_directory = f'{self.directory}/sitemap'
+        if self.graph.sitemap_only_pages and not any(
+                inventory['directory'] == sitemap_directory for inventory in manifest.get('sitemap_directories', [])):
+            raise ValueError(f"decoys: sitemap_only_pages needs {sitemap_directory!r} in sitemap_directories")
+
+    # Templates
+
+    def compile_templates(self):
+        """Hub, card and article templates plus the text pools to fill them from"""
+        def read(path):
+            with open(os.path.join(self.root, path), 'r', encoding='utf-8') as f:
+                return f.read()
+
+        hub_source = self.config.get('hub_template', 'hp-1.html')
+        article_source = self.config.get('article_template', 'a-1.html')
+        hub = read(hub_source)
+        card = re.search(CARD_PATTERN, hub, re.DOTALL)
+        if card is None:
+            raise ValueError(f"{hub_source}: no article card in template")
+        pools = {'titles': [], 'excerpts': [], 'icons': [], 'paragraphs': [], 'images': []}
+        for page in self.config.get('text_sources', ['hp-1.html', 'hp-2.html', 'a-1.html', 'a-2.html',
+                                                     'a-3.html', 'a-4.html', 'a-5.html']):
+            content = read(page)
+            pools['titles'] += re.findall(r'<h3 class="article-title">(.*?)</h3>', content)
+            pools['excerpts'] += re.findall(r'<p class="article-excerpt">(.*?)</p>', content)
+            pools['icons'] += re.findall(r'<span style="font-size: \d+px;">(.*?)</span>', content)
+            pools['paragraphs'] += [paragraph for paragraph in re.findall(r'<p>(.*?)</p>', content, re.DOTALL)
+                                    if len(paragraph) > 80]
+            pools['images'] += re.findall(r"(?:url\('|data-image=\")(img/[^'\"]*)", content)
+        for name, pool in pools.items():
+            if not pool:
+                raise ValueError(f"decoys: text_sources give no {name}")
+            pools[name] = sorted(set(pool))
+        return {
+            'hub': SlotTemplate(hub, HUB_SLOTS, hub_source),
+            'card': SlotTemplate(card.group(0), CARD_SLOTS, hub_source),
+            'article': SlotTemplate(read(article_source), ARTICLE_SLOTS, article_source),
+            'pools': pools
+        }
+
+    # Build
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file, 'r') as f:
+            return json.load(f).get('digests', {})
+
+    def save_state(self, digests):
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        write_atomic(self.state_file, json.dumps({'config': self.config, 'digests': digests}, sort_keys=True))
+
+    def build(self, dry_run=False, workers=None):
+        """Write changed pages, delete stale ones and sync robots.txt and the entry links
+
+        Returns (changed paths, number of pages in the graph).
+        """
+        templates = self.compile_templates()
+        state = self.load_state()
+        existing = set(iter_directory_pages(self.root, self.directory))
+        pages = list(self.graph.pages())
+        planned = {page[0] for page in pages}
+        if not dry_run:
+            for directory in {os.path.dirname(path) for path in planned}:
+                os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+
+        chunks = [pages[start:start + CHUNK_PAGES] for start in range(0, len(pages), CHUNK_PAGES)]
+        tasks = [(self.config, self.root, templates, chunk,
+                  {path: state[path] for path, *_ in chunk if path in existing and path in state},
+                  {path for path, *_ in chunk if path in existing}, dry_run)
+                 for chunk in chunks]
+        workers = workers or self.config.get('workers') or os.cpu_count() or 1
+        if workers <= 1 or len(tasks) <= 1:
+            results = [render_chunk(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(render_chunk, tasks))
+        digests = {}
+        changed = []
+        for chunk_digests, chunk_changed in results:
+            digests.update(chunk_digests)
+            changed += chunk_changed
+
+        for path in sorted(existing - planned):
+            changed.append(path)
+            if not dry_run:
+                os.remove(os.path.join(self.root, path))
+                remove_precompressed(os.path.join(self.root, path))
+        if not dry_run:
+            remove_empty_directories(os.path.join(self.root, self.directory))
+            self.save_state(digests)
+        if self.sync_robots(dry_run):
+            changed.append(ROBOTS_FILE)
+        changed += self.sync_entry_links(True, dry_run)
+        return changed, len(pages)
+
+    def clean(self, dry_run=False):
+        """Remove the decoy site, its robots.txt rule and its entry links; returns the changed paths"""
+        changed = sorted(iter_directory_pages(self.root, self.directory))
+        if self.sync_robots(dry_run, enabled=False):
+            changed.append(ROBOTS_FILE)
+        changed += self.sync_entry_links(False, dry_run)
+        if not dry_run:
+            shutil.rmtree(os.path.join(self.root, self.directory), ignore_errors=True)
+            if os.path.exists(self.state_file):
+                os.remove(self.state_file)
+        return changed
+
+    def sync_robots(self, dry_run=False, enabled=True):
+        """Add (or remove) the Disallow rule for private branches in every group that allows the site"""
+        path = os.path.join(self.root, ROBOTS_FILE)
+        if not os.path.exists(path):
+            return False
+        rule = f'Disallow: /{self.directory}/private/'
+        wanted = enabled and self.graph.disallowed_branches > 0
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        updated = sync_robots_rules(content, [rule] if wanted else [], lambda line: line == rule)
+        if updated == content:
+            return False
+        if not dry_run:
+            write_atomic(path, updated)
+        return True
+
+    def sync_entry_links(self, enabled, dry_run=False):
+        """Make sure the entry pages' hub links do (or don't) point at the decoy index"""
+        href = self.graph.index_path()
+        link = re.compile(r'\s*<a href="' + re.escape(href) + r'">[^<]*</a>')
+        hub_links = re.compile(r'(<div class="hub-links">.*?)(\s*</div>)', re.DOTALL)
+        changed = []
+        for page in self.config.get('entry_pages', []):
+            path = os.path.join(self.root, page)
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            present = link.search(content) is not None
+            if present == enabled:
+                continue
+            if enabled:
+                updated = hub_links.sub(lambda match: (f'{match.group(1)}\n            '
+                                                       f'<a href="{href}">{ENTRY_LINK_TEXT}</a>{match.group(2)}'),
+                                        content, count=1)
+            else:
+                updated = link.sub('', content)
+            if updated == content:
+                continue
+            changed.append(page)
+            if not dry_run:
+                write_atomic(path, updated)
+        return changed
+
+def remove_empty_directories(directory):
+    for current, subdirectories, files in os.walk(directory, topdown=False):
+        if current != directory and not os.listdir(current):
+            os.rmdir(current)
+
+class PageRenderer:
+    """Renders single decoy pages; built inside each pool worker"""
+
+    def __init__(self, config, templates):
+        self.graph = DecoyGraph(config)
+        self.seed = config['seed']
+        self.templates = templates
+        self.pools = templates['pools']
+
+    def choices(self, path):
+        """Deterministic per-page picks: one keyed hash, two bytes per pick"""
+        digest = hashlib.blake2b(f'{self.seed}:{path}'.encode(), digest_size=16).digest()
+        pools = self.pools
+
+        def pick(slot, pool):
+            return pools[pool][int.from_bytes(digest[2 * slot:2 * slot + 2], 'big') % len(pools[pool])]
+        return pick, digest
+
+    def title(self, path):
+        return self.choices(path)[0](0, 'titles')
+
+    def url(self, path):
+        return '/' + path
+
+    def card(self, path):
+        pick, _ = self.choices(path)
+        return self.templates['card'].render({
+            'image': '/' + pick(1, 'images'),
+            'icon': pick(2, 'icons'),
+            'title': pick(0, 'titles'),
+            'excerpt': pick(3, 'excerpts'),
+            'href': self.url(path)
+        })
+
+    def hub(self, path, heading, children, links):
+        pick, _ = self.choices(path)
+        cards = '\n            '.join(self.card(child) for child in children)
+        return self.templates['hub'].render({
+            'title': f'{heading} - Tech News',
+            'heading': heading,
+            'subtitle': pick(4, 'excerpts'),
+            'cards': f'\n            {cards}\n        ',
+            'links': ''.join(f'\n            <a href="{self.url(target)}">{text}</a>' for target, text in links) + '\n        '
+        })
+
+    def article(self, path, meta, links):
+        pick, digest = self.choices(path)
+        title = pick(0, 'titles')
+        # 3-6 paragraphs from a per-page offset into the pool, so no paragraph repeats on a page
+        pool = self.pools['paragraphs']
+        start = int.from_bytes(digest[10:12], 'big')
+        paragraphs = [pool[(start + offset) % len(pool)] for offset in range(min(len(pool), 3 + digest[12] % 4))]
+        body = ''.join(f'\n                <p>{paragraph}</p>\n' for paragraph in paragraphs)
+        return self.templates['article'].render({
+            'title': f'{title} - Tech News',
+            'heading': title,
+            'subtitle': pick(4, 'excerpts'),
+            'image': '/' + pick(1, 'images'),
+            'icon': pick(2, 'icons'),
+            'meta': f'\n                {meta}\n            ',
+            'body': body + '            ',
+            'navigation': ''.join(f'\n            <a href="{self.url(target)}">{text}</a>' for target, text in links) + '\n        '
+        })
+
+    def render(self, path, kind, branch, depth, node):
+        graph = self.graph
+        index = graph.index_path()
+        if kind == 'index':
+            roots = [graph.node_path(root, 1, 0) for root in range(graph.branches)]
+            return self.hub(path, '📚 News Archive', roots, [('hp-1.html', '🏠 Home')])
+        if kind != 'tree':
+            return self.article(path, f'<strong>Category:</strong> Archive | <strong>Item:</strong> {node}',
+                                [(index, '← Back to Archive')])
+        parent = graph.parent(branch, depth, node)
+        links = [(parent, f'← Back to {self.title(parent) if depth > 1 else "Archive"}'), (index, '📚 Archive')]
+        children = graph.children(branch, depth, node)
+        if not children:
+            return self.article(path, f'<strong>Section:</strong> {branch} | <strong>Level:</strong> {depth}', links)
+        return self.hub(path, self.title(path), children, links)
+
+def render_chunk(task):
+    """Render a chunk of pages and write the changed ones; returns ({path: digest}, changed paths)"""
+    config, root, templates, pages, previous, existing, dry_run = task
+    renderer = PageRenderer(config, templates)
+    digests = {}
+    changed = []
+    for path, kind, branch, depth, node in pages:
+        content = renderer.render(path, kind, branch, depth, node)
+        digest = content_digest(content)
+        digests[path] = digest
+        full_path = os.path.join(root, path)
+        if path in existing:
+            old = previous.get(path)
+            if old is None:
+                # No digest from a previous build: compare with the file itself
+                with open(full_path, 'r', encoding='utf-8') as f:
+                    old = content_digest(f.read())
+            if old == digest:
+                continue
+        changed.append(path)
+        if not dry_run:
+            write_atomic(full_path, content)
+    return digests, changed
+
+def parse_overrides(args):
+    """KEY=VALUE arguments as integer config overrides (e.g. depth=6 fan_out=10)"""
+    overrides = {}
+    for arg in args:
+        key, _, value = arg.partition('=')
+        if not value:
+            raise ValueError(f"Expected KEY=VALUE, got {arg!r}")
+        overrides[key] = int(value)
+    return overrides
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ('build', 'check', 'clean'):
+        print("Usage: python decoy_generator.py [build|check|clean] [KEY=VALUE ...] [--profile]")
+        print("  build: Generate the decoy site from the manifest's decoys section and update the sitemap")
+        print("  check: List the files a build would change (exit status 1 if any)")
+        print("  clean: Remove the decoy site, its robots.txt rule and entry links")
+        print("  build and clean commit the pages together with the links and sitemap entries to them")
+        print("  KEY=VALUE overrides a numeric setting for this run, e.g. depth=6 fan_out=10 seed=7")
+        return
+
+    generator = DecoyGenerator(overrides=parse_overrides(args[1:]))
+    start = time.perf_counter()
+    if args[0] == 'clean':
+        changed = generator.clean()
+        total = 0
+    else:
+        changed, total = generator.build(dry_run=args[0] == 'check')
+    if args[0] != 'check':
+        # Sitemap-only pages come and go with the decoy site
+        builder = SiteBuilder()
+        current_urls, lastmod = builder.link_targets()
+        changed += builder.build(current_urls, lastmod)
+        # Pages just written get the page transforms (canonical link, analytics) too
+        PagePipeline(current_urls, manifest=builder.manifest).run([path for path in changed if path.endswith('.html')])
+    elapsed = time.perf_counter() - start
+    verb = 'Would update' if args[0] == 'check' else 'Updated'
+    for path in changed[:20]:
+        print(f"{verb} {path}")
+    if len(changed) > 20:
+        print(f"... and {len(changed) - 20} more")
+    print(f"{len(changed)} files changed, {total} decoy pages in {elapsed:.2f}s")
+    if args[0] == 'check':
+        if changed:
+            sys.exit(1)
+        return
+    # The entry links, robots.txt rule and sitemap entries are committed files, so the
+    # pages they point at are committed with them; the next rotation cycle pushes both
+    try:
+        commit = GitPipeline().commit_paths(changed, f"Decoy site {args[0]} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    except GitError as e:
+        print(f"Commit failed: {e.stderr}")
+        sys.exit(1)
+    print(f"Committed {commit[:7]}" if commit else "Nothing to commit")
+
+if __name__ == "__main__":
+    run_main(main)
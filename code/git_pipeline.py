@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Git Pipeline
+Builds a single commit for an explicit list of paths with git plumbing
+(read-tree, update-index, write-tree, commit-tree, update-ref) using a
+private index file, and pushes it, without a shell or a whole-tree `git add`
+"""
+
+import os
+import subprocess
+
+class GitError(Exception):
+    """A git command failed"""
+
+    def __init__(self, args, returncode, stderr):
+        self.args_list = args
+        self.returncode = returncode
+        self.stderr = stderr.strip()
+        super().__init__(f"git {' '.join(args)} failed ({returncode}): {self.stderr}")
+
+class GitPipeline:
+    """Commit exactly the given paths and push, one git process per plumbing step
+
+    Every git invocation is timed as a ``git_command`` span when a
+    MetricsRecorder is given.
+    """
+
+    def __init__(self, repo_dir='.', remote='origin', branch='main', metrics=None):
+        self.repo_dir = os.path.abspath(repo_dir)
+        self.remote = remote
+        self.branch = branch
+        self.metrics = metrics
+        self._git_dir = None
+
+    def git(self, *args, input=None, env=None):
+        """Run a git command and return its stdout; raises GitError on failure"""
+        if self.metrics is None:
+            return self._run(args, input, env)
+        with self.metrics.span('git_command', command=args[0]) as span:
+            try:
+                return self._run(args, input, env)
+            except GitError:
+                span.ok = False
+                raise
+
+    def _run(self, args, input=None, env=None):
+        result = subprocess.run(['git', *args], cwd=self.repo_dir, input=input, capture_output=True,
+                                text=True, env=None if env is None else {**os.environ, **env})
+        if result.returncode != 0:
+            raise GitError(list(args), result.returncode, result.stderr)
+        return result.stdout.strip()
+
+    def git_dir(self):
+        if self._git_dir is None:
+            self._git_dir = os.path.join(self.repo_dir, self.git('rev-parse', '--git-dir'))
+        return self._git_dir
+
+    def head(self):
+        """Current HEAD commit id, or None in an empty repository"""
+        try:
+            return self.git('rev-parse', '--verify', '--quiet', 'HEAD^{commit}')
+        except GitError:
+            return None
+
+    def commit_paths(self, paths, message):
+        """Commit the working-tree state of exactly these paths on top of HEAD
+
+        Added, modified and deleted paths are all handled. Returns the new
+        commit id, or None if the paths already match HEAD.
+        """
+        paths = sorted(set(paths))
+        if not paths:
+            return None
+        parent = self.head()
+        stdin = ''.join(f'{path}\0' for path in paths)
+
+        # A private index keeps whatever the user has staged out of the commit
+        index_file = os.path.join(self.git_dir(), f'index.pipeline.{os.getpid()}')
+        env = {'GIT_INDEX_FILE': index_file}
+        try:
+            if parent is not None:
+                self.git('read-tree', parent, env=env)
+            self.git('update-index', '--add', '--remove', '-z', '--stdin', input=stdin, env=env)
+            tree = self.git('write-tree', env=env)
+        finally:
+            if os.path.exists(index_file):
+                os.remove(index_file)
+
+        if parent is not None and tree == self.git('rev-parse', f'{parent}^{{tree}}'):
+            return None
+        commit = self.git('commit-tree', tree, *(['-p', parent] if parent else []), '-m', message)
+        # Compare-and-swap on the old value so a concurrent commit is never overwritten
+        self.git('update-ref', '-m', f'commit: {message.splitlines()[0]}', 'HEAD', commit, parent or '')
+
+        # Bring the real index in line with the new HEAD for these paths
+        self.git('update-index', '--add', '--remove', '-z', '--stdin', input=stdin)
+        return commit
+
+    def squash_onto(self, base, message):
+        """Replace the commits between base and HEAD with one commit holding HEAD's tree"""
+        head = self.head()
+        commit = self.git('commit-tree', f'{head}^{{tree}}', '-p', base, '-m', message)
+        self.git('update-ref', '-m', f'squash: {message.splitlines()[0]}', 'HEAD', commit, head)
+        return commit
+
+    def push(self):
+        """Push the branch to the remote"""
+        return self.git('push', '--porcelain', self.remote, f'HEAD:refs/heads/{self.branch}')
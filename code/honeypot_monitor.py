@@ -6,18 +6,465 @@ Monitors access to honeypot pages and detects crawler activity
 
 import os
 import json
-import time
+import atexit
+import threading
+import heapq
+import hashlib
 from datetime import datetime
 from collections import defaultdict
+from access_log_writer import AccessLogWriter
+from log_follower import LogFollower, resolve_since
+from crawler_classifier import get_default_classifier
+from rotation_index import StalenessHistograms, attribute_rotations, load_rotation_index
+from site_builder import load_manifest
+from signed_urls import get_default_signer
+from timing_metrics import run_main
+from rate_detectors import (SlidingWindowCounter, HyperLogLog, ExactCounter,
+                            ApproximateCounter, counter_from_dict)
+
+# Bump when the checkpoint layout or aggregate semantics change
+CHECKPOINT_VERSION = 7
+CHECKPOINT_HEAD_BYTES = 4096
+
+# Size of the top-N lists kept in the analysis report
+TOP_N = 10
+
+# Per-IP sliding-window rate rules: more than `threshold` hits within `window_seconds`
+DEFAULT_RATE_RULES = [
+    {'name': 'ip_per_minute', 'window_seconds': 60, 'bucket_seconds': 5, 'threshold': 30},
+    {'name': 'ip_per_hour', 'window_seconds': 3600, 'bucket_seconds': 60, 'threshold': 300}
+]
+
+# HyperLogLog precision for distinct IPs per crawler in approximate mode (~3% error)
+CRAWLER_IP_PRECISION = 10
+
+DEFAULT_STORE_PATH = 'logs/honeypot_access.db'
+
+ROTATIONS_LOG = 'logs/honeypot_rotations.log'
+
+ACCESS_FIELDS = ('timestamp', 'url', 'user_agent', 'ip_address')
+
+class LogLineReader:
+    """Iterate over complete lines of a log file starting at a byte offset
+    
+    ``offset`` always points just past the last complete line returned, so it
+    can be stored and used to resume later. A trailing partial line is left
+    for the next reader.
+    """
+    
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset
+    
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self.offset += len(line)
+                yield line
+
+def parse_accesses(lines):
+    """Parse JSON log lines into access records, skipping malformed ones"""
+    for line in lines:
+        try:
+            access = json.loads(line)
+        except:
+            continue
+        if isinstance(access, dict) and all(field in access for field in ACCESS_FIELDS):
+            yield access
+
+def classify_accesses(accesses, classifier=None):
+    """Tag each access record with the crawler signature matching its user agent"""
+    classify = (classifier or get_default_classifier()).classify
+    for access in accesses:
+        access['crawler'] = classify(access['user_agent'])
+        yield access
+
+def top_items(counts, n=TOP_N):
+    """Return the n largest (key, count) pairs using a bounded heap"""
+    return heapq.nlargest(n, counts.items(), key=lambda item: item[1])
+
+def epoch_seconds(timestamp):
+    """Convert an ISO timestamp from the access log to epoch seconds"""
+    return datetime.fromisoformat(timestamp).timestamp()
+
+class AccessAggregator:
+    """Running aggregates over honeypot access records
+    
+    Memory never grows with the number of accesses: crawler detections are
+    collapsed per (user agent, IP) and rate rules use sliding windows that
+    evict idle IPs. In approximate mode the per-URL/IP/UA counters are
+    Count-Min/HyperLogLog sketches and crawler detections are collapsed per
+    user agent, so memory stays fixed however many IPs a crawl uses.
+    """
+    
+    def __init__(self, approximate=False, rate_rules=None):
+        self.approximate = approximate
+        self.rate_rules = rate_rules if rate_rules is not None else DEFAULT_RATE_RULES
+        self.total_accesses = 0
+        counter_class = ApproximateCounter if approximate else ExactCounter
+        self.access_by_url = counter_class()
+        self.access_by_ip = counter_class()
+        self.access_by_user_agent = counter_class()
+        self.access_by_crawler = defaultdict(int)
+        self.crawlers = {}
+        self.rate_windows = {
+            rule['name']: SlidingWindowCounter(rule['window_seconds'], rule['bucket_seconds'])
+            for rule in self.rate_rules
+        }
+        self.rate_alerts = {}
+        self.rotation_stats = StalenessHistograms()
+    
+    def consume(self, accesses):
+        """Fold a stream of classified access records into the aggregates"""
+        for access in accesses:
+            self.add(access)
+        return self
+    
+    def add(self, access):
+        """Fold a single classified access record into the aggregates"""
+        ip = access['ip_address']
+        user_agent = access['user_agent']
+        timestamp = access['timestamp']
+        
+        self.total_accesses += 1
+        self.access_by_url.add(access['url'])
+        self.access_by_ip.add(ip)
+        self.access_by_user_agent.add(user_agent)
+        
+        self._check_rates(ip, timestamp)
+        
+        signature = access['crawler']
+        rotation = access.get('rotation')
+        if rotation is not None:
+            self.rotation_stats.add(rotation, signature['name'] if signature is not None else None)
+        
+        if signature is not None:
+            self.access_by_crawler[signature['name']] += 1
+            key = (user_agent, None) if self.approximate else (user_agent, ip)
+            crawler = self.crawlers.get(key)
+            if crawler is None:
+                crawler = self.crawlers[key] = {
+                    'crawler': signature['name'],
+                    'category': signature['category'],
+                    'crawler_type': signature['type'],
+                    'first_seen': timestamp,
+                    'last_seen': timestamp,
+                    'count': 0
+                }
+                if self.approximate:
+                    crawler['ips'] = HyperLogLog(CRAWLER_IP_PRECISION)
+            crawler['first_seen'] = min(crawler['first_seen'], timestamp)
+            crawler['last_seen'] = max(crawler['last_seen'], timestamp)
+            crawler['count'] += 1
+            if self.approximate:
+                crawler['ips'].add(ip)
+    
+    def _check_rates(self, ip, timestamp):
+        """Feed the sliding windows and record any IP over a rule's threshold"""
+        try:
+            now = epoch_seconds(timestamp)
+        except ValueError:
+            return
+        for rule in self.rate_rules:
+            count = self.rate_windows[rule['name']].add(ip, now)
+            if count > rule['threshold']:
+                alert = self.rate_alerts.get((rule['name'], ip))
+                if alert is None:
+                    self.rate_alerts[(rule['name'], ip)] = {
+                        'first_seen': timestamp,
+                        'last_seen': timestamp,
+                        'peak_count': count
+                    }
+                else:
+                    alert['last_seen'] = max(alert['last_seen'], timestamp)
+                    alert['peak_count'] = max(alert['peak_count'], count)
+    
+    def merge(self, other):
+        """Merge the aggregates of another (later) part of the log into this one
+        
+        Sliding-window state is not merged: a burst that straddles the boundary
+        between two parts is judged separately in each part, so rate alerts are
+        the union of both parts' alerts.
+        """
+        self.total_accesses += other.total_accesses
+        self.access_by_url.merge(other.access_by_url)
+        self.access_by_ip.merge(other.access_by_ip)
+        self.access_by_user_agent.merge(other.access_by_user_agent)
+        for name, count in other.access_by_crawler.items():
+            self.access_by_crawler[name] += count
+        
+        for key, other_crawler in other.crawlers.items():
+            crawler = self.crawlers.get(key)
+            if crawler is None:
+                self.crawlers[key] = other_crawler
+                continue
+            crawler['first_seen'] = min(crawler['first_seen'], other_crawler['first_seen'])
+            crawler['last_seen'] = max(crawler['last_seen'], other_crawler['last_seen'])
+            crawler['count'] += other_crawler['count']
+            if 'ips' in crawler:
+                crawler['ips'].merge(other_crawler['ips'])
+        
+        self._merge_rate_alerts(other.rate_alerts)
+        self.rotation_stats.merge(other.rotation_stats)
+        return self
+    
+    def _merge_rate_alerts(self, rate_alerts):
+        for key, other_alert in rate_alerts.items():
+            alert = self.rate_alerts.get(key)
+            if alert is None:
+                self.rate_alerts[key] = other_alert
+                continue
+            alert['first_seen'] = min(alert['first_seen'], other_alert['first_seen'])
+            alert['last_seen'] = max(alert['last_seen'], other_alert['last_seen'])
+            alert['peak_count'] = max(alert['peak_count'], other_alert['peak_count'])
+    
+    def build_analysis(self):
+        """Build the analysis report from the current aggregates"""
+        analysis = {
+            'approximate': self.approximate,
+            'total_accesses': self.total_accesses,
+            'unique_ips': self.access_by_ip.cardinality(),
+            'unique_user_agents': self.access_by_user_agent.cardinality(),
+            'access_by_url': self.access_by_url.items(),
+            'access_by_ip': self.access_by_ip.items(),
+            'access_by_user_agent': self.access_by_user_agent.items(),
+            'access_by_crawler': dict(self.access_by_crawler),
+            'top_urls': self.access_by_url.top(TOP_N),
+            'top_ips': self.access_by_ip.top(TOP_N),
+            'top_user_agents': self.access_by_user_agent.top(TOP_N),
+            'rotation_staleness': self.rotation_stats.report(),
+            'suspicious_activity': []
+        }
+        
+        # Detect suspicious patterns
+        rules = {rule['name']: rule for rule in self.rate_rules}
+        for (rule_name, ip), alert in self.rate_alerts.items():
+            analysis['suspicious_activity'].append({
+                'type': 'high_frequency_ip',
+                'ip': ip,
+                'rule': rule_name,
+                'window_seconds': rules[rule_name]['window_seconds'] if rule_name in rules else None,
+                'threshold': rules[rule_name]['threshold'] if rule_name in rules else None,
+                'count': alert['peak_count'],
+                'first_seen': alert['first_seen'],
+                'last_seen': alert['last_seen']
+            })
+        
+        for (user_agent, ip), crawler in self.crawlers.items():
+            activity = {
+                'type': 'crawler_user_agent',
+                'user_agent': user_agent,
+                'ip': ip,
+                'crawler': crawler['crawler'],
+                'category': crawler['category'],
+                'crawler_type': crawler['crawler_type'],
+                'first_seen': crawler['first_seen'],
+                'last_seen': crawler['last_seen'],
+                'count': crawler['count']
+            }
+            if 'ips' in crawler:
+                activity['unique_ips'] = crawler['ips'].count()
+            analysis['suspicious_activity'].append(activity)
+        
+        return analysis
+    
+    def to_dict(self):
+        """Serialize the aggregates for a checkpoint"""
+        crawlers = []
+        for (user_agent, ip), crawler in self.crawlers.items():
+            crawler = dict(crawler)
+            if 'ips' in crawler:
+                crawler['ips'] = crawler['ips'].to_dict()
+            crawlers.append([user_agent, ip, crawler])
+        
+        return {
+            'approximate': self.approximate,
+            'rate_rules': self.rate_rules,
+            'total_accesses': self.total_accesses,
+            'access_by_url': self.access_by_url.to_dict(),
+            'access_by_ip': self.access_by_ip.to_dict(),
+            'access_by_user_agent': self.access_by_user_agent.to_dict(),
+            'access_by_crawler': self.access_by_crawler,
+            'crawlers': crawlers,
+            'rate_windows': {name: window.to_dict() for name, window in self.rate_windows.items()},
+            'rate_alerts': [[rule_name, ip, alert] for (rule_name, ip), alert in self.rate_alerts.items()],
+            'rotation_stats': self.rotation_stats.to_dict()
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Restore aggregates saved by to_dict"""
+        aggregator = cls(data['approximate'], data['rate_rules'])
+        aggregator.total_accesses = data['total_accesses']
+        aggregator.access_by_url = counter_from_dict(data['access_by_url'])
+        aggregator.access_by_ip = counter_from_dict(data['access_by_ip'])
+        aggregator.access_by_user_agent = counter_from_dict(data['access_by_user_agent'])
+        aggregator.access_by_crawler.update(data['access_by_crawler'])
+        for user_agent, ip, crawler in data['crawlers']:
+            if 'ips' in crawler:
+                crawler['ips'] = HyperLogLog.from_dict(crawler['ips'])
+            aggregator.crawlers[(user_agent, ip)] = crawler
+        aggregator.rate_windows = {
+            name: SlidingWindowCounter.from_dict(window) for name, window in data['rate_windows'].items()
+        }
+        aggregator.rate_alerts = {(rule_name, ip): alert for rule_name, ip, alert in data['rate_alerts']}
+        aggregator.rotation_stats = StalenessHistograms.from_dict(data['rotation_stats'])
+        return aggregator
+    
+    def to_partial(self):
+        """Compact picklable form of the aggregates, for merge_partial in another process
+        
+        Crawler detections are stored as columns, with each user agent string
+        and its classification sent once rather than once per IP, and the
+        sliding windows are left out because merging doesn't use them.
+        """
+        agents = {}
+        signatures = []
+        columns = ([], [], [], [], [], [])
+        for (user_agent, ip), crawler in self.crawlers.items():
+            agent = agents.get(user_agent)
+            if agent is None:
+                agent = agents[user_agent] = len(signatures)
+                signatures.append((user_agent, crawler['crawler'], crawler['category'], crawler['crawler_type']))
+            columns[0].append(agent)
+            columns[1].append(ip)
+            columns[2].append(crawler['first_seen'])
+            columns[3].append(crawler['last_seen'])
+            columns[4].append(crawler['count'])
+            columns[5].append(crawler.get('ips'))
+        
+        return {
+            'total_accesses': self.total_accesses,
+            'access_by_url': self.access_by_url,
+            'access_by_ip': self.access_by_ip,
+            'access_by_user_agent': self.access_by_user_agent,
+            'access_by_crawler': dict(self.access_by_crawler),
+            'crawler_agents': signatures,
+            'crawlers': columns,
+            'rate_alerts': self.rate_alerts,
+            'rotation_stats': self.rotation_stats
+        }
+    
+    def merge_partial(self, partial):
+        """merge() for the compact form sent by to_partial, without rebuilding an aggregator"""
+        self.total_accesses += partial['total_accesses']
+        self.access_by_url.merge(partial['access_by_url'])
+        self.access_by_ip.merge(partial['access_by_ip'])
+        self.access_by_user_agent.merge(partial['access_by_user_agent'])
+        for name, count in partial['access_by_crawler'].items():
+            self.access_by_crawler[name] += count
+        
+        agents = partial['crawler_agents']
+        for agent, ip, first_seen, last_seen, count, ips in zip(*partial['crawlers']):
+            user_agent, name, category, crawler_type = agents[agent]
+            crawler = self.crawlers.get((user_agent, ip))
+            if crawler is None:
+                crawler = self.crawlers[(user_agent, ip)] = {
+                    'crawler': name,
+                    'category': category,
+                    'crawler_type': crawler_type,
+                    'first_seen': first_seen,
+                    'last_seen': last_seen,
+                    'count': count
+                }
+                if ips is not None:
+                    crawler['ips'] = ips
+                continue
+            crawler['first_seen'] = min(crawler['first_seen'], first_seen)
+            crawler['last_seen'] = max(crawler['last_seen'], last_seen)
+            crawler['count'] += count
+            if ips is not None:
+                crawler['ips'].merge(ips)
+        
+        self._merge_rate_alerts(partial['rate_alerts'])
+        self.rotation_stats.merge(partial['rotation_stats'])
+        return self
+
+class StoreSink:
+    """AccessLogWriter sink that loads each committed batch into the SQLite store
+
+    Batches go through the store's incremental ingest of the log file rather
+    than a direct insert, so the ingest offset moves past them and a later
+    'index' doesn't load them again. Whatever the log gained since the store
+    last ingested it is back-filled on a thread of its own when the sink is
+    created; batches committed meanwhile are left for that back-fill, so the
+    writer thread never waits on it. Otherwise used only from the writer
+    thread, which owns its connection.
+    """
+
+    def __init__(self, store_path, log_path):
+        self.store_path = store_path
+        self.log_path = log_path
+        self.store = None
+        self.backfill = threading.Thread(target=self._backfill, name='access-store-backfill', daemon=True)
+        self.backfill.start()
+
+    def _backfill(self):
+        from access_store import AccessStore
+        store = AccessStore(self.store_path)
+        try:
+            if os.path.exists(self.log_path):
+                store.ingest_log(self.log_path)
+        except Exception as e:
+            print(f"Error back-filling {self.store_path} from {self.log_path}: {e}")
+        finally:
+            store.close()
+
+    def _ingest(self):
+        if self.store is None:
+            from access_store import AccessStore
+            self.store = AccessStore(self.store_path)
+        self.store.ingest_log(self.log_path)
+
+    def add(self, records):
+        if not self.backfill.is_alive():
+            self._ingest()
+
+    def close(self):
+        # Pick up batches committed while the back-fill was still running
+        self.backfill.join()
+        if os.path.exists(self.log_path):
+            self._ingest()
+        if self.store is not None:
+            self.store.close()
 
 class HoneypotMonitor:
-    def __init__(self):
+    def __init__(self, approximate=False, rate_rules=None, store_path=None):
+        self.approximate = approximate
+        self.rate_rules = rate_rules if rate_rules is not None else DEFAULT_RATE_RULES
         self.access_log_file = 'logs/honeypot_access.log'
         self.analysis_file = 'logs/honeypot_analysis.json'
-        self.honeypot_pages = ['a-6hp.html', 'a-7sm.html']
+        self.checkpoint_file = 'logs/honeypot_analysis_checkpoint.json'
+        self.ingest_state_file = 'logs/honeypot_ingest_state.json'
+        self.rotations_log_file = ROTATIONS_LOG
+        self.honeypot_pages = list(load_manifest()['honeypots'])
+        self.honeypot_stems = {page[:-len('.html')] for page in self.honeypot_pages}
+        # Optional SQLite store that every logged access is also written to
+        self.store_path = store_path
+        self.store = None
+        self.writer = None
+        self.writer_lock = threading.Lock()
         
-    def log_access(self, url, user_agent, ip_address, timestamp=None):
-        """Log access to honeypot pages"""
+    def is_honeypot_url(self, url):
+        """Check whether a URL or path names a honeypot page, original or rotated"""
+        name = url.rsplit('/', 1)[-1]
+        if not name.endswith('.html'):
+            return False
+        stem = name[:-len('.html')]
+        # A rotated name is the original stem plus one "-suffix", a signed name plus two
+        return (stem in self.honeypot_stems or stem.rsplit('-', 1)[0] in self.honeypot_stems
+                or stem.rsplit('-', 2)[0] in self.honeypot_stems)
+    
+    def log_access(self, url, user_agent, ip_address, timestamp=None, durable=False, served=None):
+        """Log access to honeypot pages
+        
+        Records are handed to a background writer that group-commits them; pass
+        durable=True to block until this record has been fsynced. ``served`` is
+        the page actually returned when it differs from the requested url.
+        """
         if timestamp is None:
             timestamp = datetime.now().isoformat()
             
@@ -28,79 +475,242 @@ class HoneypotMonitor:
             'ip_address': ip_address,
             'type': 'honeypot_access'
         }
+        if served is not None:
+            log_entry['served'] = served
         
+        self.get_writer().write(log_entry, durable=durable)
+    
+    def get_writer(self):
+        """Start the buffered access log writer on first use"""
+        if self.writer is None:
+            with self.writer_lock:
+                if self.writer is None:
+                    # With a store configured, each group commit is inserted on the writer thread
+                    sink = StoreSink(self.store_path, self.access_log_file) if self.store_path is not None else None
+                    self.writer = AccessLogWriter(self.access_log_file, sink=sink).start()
+                    atexit.register(self.writer.close)
+        return self.writer
+    
+    def close(self):
+        """Flush and close the access log writer and store"""
+        if self.writer is not None:
+            self.writer.close()
+        if self.store is not None:
+            self.store.close()
+    
+    def get_store(self):
+        """Open the SQLite access store on first use"""
+        if self.store is None:
+            from access_store import AccessStore
+            self.store = AccessStore(self.store_path or DEFAULT_STORE_PATH)
+        return self.store
+    
+    def index_accesses(self):
+        """Load accesses appended to the JSON-lines log since the last run into the store"""
+        if not os.path.exists(self.access_log_file):
+            print("No access log found.")
+            return 0
+        inserted = self.get_store().ingest_log(self.access_log_file)
+        print(f"Indexed {inserted} new accesses into {self.get_store().db_path}")
+        return inserted
+    
+    def ingest_logs(self, paths, prefixes=(), log_format='auto'):
+        """Import honeypot hits from nginx/Apache/CDN access logs into the access log
+
+        Each log's imported offset is kept in the ingest state file, so running
+        this again (or on the rotated copy of a log) only imports new lines.
+        Records are appended in import order, not time order.
+        """
+        import time
+        from log_importer import LogImporter
+
+        importer = LogImporter(self, prefixes, log_format)
+        writer = self.get_writer()
+        state = self.load_ingest_state()
+        started = time.perf_counter()
+        imported = 0
+        for path in paths:
+            if not os.path.exists(path):
+                print(f"Skipping missing log {path}")
+                continue
+            # With a store configured, the writer's sink inserts these as well
+            for access in importer.import_file(path, state):
+                writer.write(access)
+                imported += 1
+            writer.flush()
+            # Only once the file's records are on disk, so a crash re-imports rather than loses them
+            self.save_ingest_state(state)
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(f"Imported {imported} honeypot accesses from {importer.lines_read:,} lines "
+              f"({importer.bytes_read / 1e6:,.1f} MB, {importer.candidates:,} candidate lines)")
+        print(f"Throughput: {importer.bytes_read / 1e6 / elapsed:,.1f} MB/s, {importer.lines_read / elapsed:,.0f} lines/s")
+        return imported
+
+    def load_ingest_state(self):
+        try:
+            with open(self.ingest_state_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_ingest_state(self, state):
         os.makedirs('logs', exist_ok=True)
-        with open(self.access_log_file, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
+        temp_file = self.ingest_state_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_file, self.ingest_state_file)
+
+    def query_accesses(self, crawler=None, after_rotation=None, **filters):
+        """Query the access store and print matching accesses"""
+        from access_store import rotation_time
+        
+        store = self.get_store()
+        if crawler is not None:
+            filters['user_agent_ids'] = store.user_agent_ids_for_crawler(crawler)
+        if after_rotation is not None:
+            since = rotation_time(after_rotation)
+            if since is None:
+                print(f"No rotation to {after_rotation} found in logs/honeypot_rotations.log")
+                return
+            if filters.get('since') is None or filters['since'] < since:
+                filters['since'] = since
+        
+        if filters.get('count_only'):
+            print(f"{store.query(**filters)} matching accesses")
+            return
+        
+        for access in store.query(**filters):
+            print(f"[{access['timestamp']}] {access['url']} from {access['ip_address']} - {access['user_agent']}")
     
-    def analyze_access_patterns(self):
+    def analyze_access_patterns(self, incremental=False):
         """Analyze access patterns to detect crawler activity"""
         if not os.path.exists(self.access_log_file):
             print("No access log found.")
             return
         
-        # Load access logs
-        accesses = []
-        with open(self.access_log_file, 'r') as f:
-            for line in f:
-                try:
-                    accesses.append(json.loads(line.strip()))
-                except:
-                    continue
+        aggregator = AccessAggregator(self.approximate, self.rate_rules)
+        start_offset = 0
+        
+        # Resume from the last checkpoint when running incrementally
+        if incremental:
+            checkpoint = self.load_checkpoint()
+            if checkpoint is not None:
+                aggregator = AccessAggregator.from_dict(checkpoint['state'])
+                start_offset = checkpoint['offset']
+        
+        # Single pass: read -> parse -> classify -> attribute to rotations -> aggregate
+        reader = LogLineReader(self.access_log_file, start_offset)
+        rotation_index = load_rotation_index(self.rotations_log_file)
+        aggregator.consume(attribute_rotations(classify_accesses(parse_accesses(reader)), rotation_index,
+                                               get_default_signer()))
         
-        if not accesses:
+        if incremental:
+            self.save_checkpoint(aggregator, reader.offset)
+        
+        if not aggregator.total_accesses:
             print("No access data found.")
             return
         
-        # Analyze patterns
-        analysis = {
-            'total_accesses': len(accesses),
-            'unique_ips': len(set(access['ip_address'] for access in accesses)),
-            'unique_user_agents': len(set(access['user_agent'] for access in accesses)),
-            'access_by_url': defaultdict(int),
-            'access_by_ip': defaultdict(int),
-            'access_by_user_agent': defaultdict(int),
-            'suspicious_activity': []
-        }
-        
-        # Count accesses
-        for access in accesses:
-            analysis['access_by_url'][access['url']] += 1
-            analysis['access_by_ip'][access['ip_address']] += 1
-            analysis['access_by_user_agent'][access['user_agent']] += 1
+        return self.save_analysis(aggregator)
+    
+    def analyze_archives(self, paths, workers=1):
+        """Analyze plain and compressed access logs in parallel with a process pool"""
+        from parallel_analysis import analyze_files
         
-        # Detect suspicious patterns
-        for ip, count in analysis['access_by_ip'].items():
-            if count > 10:  # More than 10 accesses from same IP
-                analysis['suspicious_activity'].append({
-                    'type': 'high_frequency_ip',
-                    'ip': ip,
-                    'count': count
-                })
+        aggregator = analyze_files(paths, workers, self.approximate, self.rate_rules, self.rotations_log_file)
+        if not aggregator.total_accesses:
+            print("No access data found.")
+            return
         
-        # Check for known crawler user agents
-        crawler_indicators = ['bot', 'crawler', 'spider', 'scraper', 'googlebot', 'bingbot']
-        for access in accesses:
-            user_agent_lower = access['user_agent'].lower()
-            for indicator in crawler_indicators:
-                if indicator in user_agent_lower:
-                    analysis['suspicious_activity'].append({
-                        'type': 'crawler_user_agent',
-                        'user_agent': access['user_agent'],
-                        'ip': access['ip_address'],
-                        'timestamp': access['timestamp']
-                    })
-                    break
+        return self.save_analysis(aggregator)
+    
+    def save_analysis(self, aggregator):
+        """Build the analysis report from an aggregator and save it"""
+        analysis = aggregator.build_analysis()
         
-        # Save analysis
+        os.makedirs('logs', exist_ok=True)
         with open(self.analysis_file, 'w') as f:
             json.dump(analysis, f, indent=2)
         
         return analysis
     
-    def print_analysis(self):
+    def _file_identity(self, f, length):
+        """Identify the log file by inode and a hash of its first bytes"""
+        stat = os.fstat(f.fileno())
+        f.seek(0)
+        head = f.read(min(length, CHECKPOINT_HEAD_BYTES))
+        return {
+            'device': stat.st_dev,
+            'inode': stat.st_ino,
+            'head_length': len(head),
+            'head_hash': hashlib.sha1(head).hexdigest()
+        }
+    
+    def load_checkpoint(self):
+        """Load the analysis checkpoint if it still matches the access log"""
+        if not os.path.exists(self.checkpoint_file):
+            return None
+        
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('version') != CHECKPOINT_VERSION:
+                print("Checkpoint version changed, rebuilding analysis from scratch.")
+                return None
+            state = checkpoint['state']
+            if state['approximate'] != self.approximate or state['rate_rules'] != self.rate_rules:
+                print("Analysis settings changed, rebuilding analysis from scratch.")
+                return None
+            
+            with open(self.access_log_file, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < checkpoint['offset']:
+                    print("Access log was truncated, rebuilding analysis from scratch.")
+                    return None
+                
+                saved = checkpoint['file']
+                current = self._file_identity(f, saved['head_length'])
+                if current != saved:
+                    print("Access log was replaced, rebuilding analysis from scratch.")
+                    return None
+            
+            return checkpoint
+        except Exception as e:
+            print(f"Could not load checkpoint ({e}), rebuilding analysis from scratch.")
+            return None
+    
+    def save_checkpoint(self, aggregator, offset):
+        """Save the log offset and running aggregates to the checkpoint file"""
+        with open(self.access_log_file, 'rb') as f:
+            file_identity = self._file_identity(f, offset)
+        
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'offset': offset,
+            'file': file_identity,
+            'state': aggregator.to_dict(),
+            'last_updated': datetime.now().isoformat()
+        }
+        
+        # Write to a temporary file first so a crash never leaves a torn checkpoint
+        os.makedirs('logs', exist_ok=True)
+        temp_file = self.checkpoint_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_file, self.checkpoint_file)
+    
+    def reset_checkpoint(self):
+        """Remove the checkpoint so the next incremental run starts from scratch"""
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+    
+    def print_analysis(self, incremental=False):
         """Print current analysis results"""
-        analysis = self.analyze_access_patterns()
+        self.print_report(self.analyze_access_patterns(incremental=incremental))
+    
+    def print_report(self, analysis):
+        """Print an analysis report"""
         if not analysis:
             return
         
@@ -108,74 +718,168 @@ class HoneypotMonitor:
         print("HONEYPOT ACCESS ANALYSIS")
         print("="*50)
         print(f"Total Accesses: {analysis['total_accesses']}")
-        print(f"Unique IPs: {analysis['unique_ips']}")
-        print(f"Unique User Agents: {analysis['unique_user_agents']}")
+        approximate = ' (approx.)' if analysis['approximate'] else ''
+        print(f"Unique IPs: {analysis['unique_ips']}{approximate}")
+        print(f"Unique User Agents: {analysis['unique_user_agents']}{approximate}")
         
         print("\nTop Accessed URLs:")
-        for url, count in sorted(analysis['access_by_url'].items(), key=lambda x: x[1], reverse=True)[:5]:
+        for url, count in analysis['top_urls'][:5]:
             print(f"  {url}: {count} accesses")
         
         print("\nTop IP Addresses:")
-        for ip, count in sorted(analysis['access_by_ip'].items(), key=lambda x: x[1], reverse=True)[:5]:
+        for ip, count in analysis['top_ips'][:5]:
             print(f"  {ip}: {count} accesses")
         
+        if analysis['access_by_crawler']:
+            print("\nCrawlers Identified:")
+            for name, count in top_items(analysis['access_by_crawler'], 5):
+                print(f"  {name}: {count} accesses")
+
+        staleness = analysis.get('rotation_staleness')
+        if staleness and staleness['attributed']:
+            states = ', '.join(f"{state}: {count}" for state, count in sorted(staleness['states'].items()))
+            print(f"\nRotated URL Hits ({states}):")
+            for title, histogram in (('Live for', staleness['live_age']),
+                                     ('Retired for', staleness['retired_age']),
+                                     ('Generations behind', staleness['generations_behind'])):
+                if any(histogram.values()):
+                    print(f"  {title}: " + '  '.join(f"{label}={count}" for label, count in histogram.items() if count))
+            if staleness.get('signed_channels'):
+                print("  Signed URL channels: " + '  '.join(f"{channel}={count}" for channel, count in staleness['signed_channels'].items()))
+                print(f"  Signed URLs requested by a different visitor: {staleness['signed_handoffs']}")
+
         if analysis['suspicious_activity']:
             print("\n🚨 SUSPICIOUS ACTIVITY DETECTED:")
             for activity in analysis['suspicious_activity']:
                 if activity['type'] == 'high_frequency_ip':
-                    print(f"  High frequency IP: {activity['ip']} ({activity['count']} accesses)")
+                    print(f"  High frequency IP: {activity['ip']} ({activity['count']} accesses "
+                          f"within {activity['window_seconds']}s, rule {activity['rule']})")
                 elif activity['type'] == 'crawler_user_agent':
-                    print(f"  Crawler detected: {activity['user_agent']} from {activity['ip']}")
+                    source = activity['ip'] if activity['ip'] is not None else f"~{activity['unique_ips']} IPs"
+                    print(f"  Crawler detected: {activity['crawler']} ({activity['user_agent']}) from {source} "
+                          f"({activity['count']} hits, {activity['first_seen']} - {activity['last_seen']})")
         else:
             print("\n✅ No suspicious activity detected")
         
         print("="*50)
     
-    def monitor_realtime(self):
+    def monitor_realtime(self, since=None):
         """Monitor access in real-time"""
         print("Starting real-time honeypot monitoring...")
         print("Press Ctrl+C to stop")
         
-        last_size = 0
+        # Start at the end of the log unless asked to replay from an offset or time
+        follower = LogFollower(self.access_log_file, resolve_since(self.access_log_file, since))
+        rate_windows = [
+            (rule, SlidingWindowCounter(rule['window_seconds'], rule['bucket_seconds']))
+            for rule in self.rate_rules
+        ]
         try:
-            while True:
-                if os.path.exists(self.access_log_file):
-                    current_size = os.path.getsize(self.access_log_file)
-                    if current_size > last_size:
-                        # New access detected
-                        with open(self.access_log_file, 'r') as f:
-                            f.seek(last_size)
-                            new_lines = f.read()
-                            for line in new_lines.strip().split('\n'):
-                                if line:
-                                    try:
-                                        access = json.loads(line)
-                                        print(f"[{access['timestamp']}] Access: {access['url']} from {access['ip_address']}")
-                                        print(f"  User-Agent: {access['user_agent']}")
-                                    except:
-                                        continue
-                        last_size = current_size
+            for access in classify_accesses(parse_accesses(follower.follow())):
+                print(f"[{access['timestamp']}] Access: {access['url']} from {access['ip_address']}")
+                print(f"  User-Agent: {access['user_agent']}", flush=True)
+                if access['crawler'] is not None:
+                    print(f"  Crawler: {access['crawler']['name']} ({access['crawler']['category']})", flush=True)
                 
-                time.sleep(1)
+                try:
+                    now = epoch_seconds(access['timestamp'])
+                except ValueError:
+                    continue
+                for rule, window in rate_windows:
+                    count = window.add(access['ip_address'], now)
+                    if count == rule['threshold'] + 1:
+                        print(f"  🚨 Rate alert: {access['ip_address']} exceeded {rule['threshold']} hits "
+                              f"in {rule['window_seconds']}s ({rule['name']})", flush=True)
                 
         except KeyboardInterrupt:
             print("\nStopping real-time monitoring...")
+        finally:
+            follower.close()
+
+def print_usage():
+    print("Usage: python honeypot_monitor.py [--profile] [analyze [--incremental] [--rebuild] [--approximate] [--workers N [FILE ...]]|monitor [--since OFFSET|ISO_TIME]|index|ingest [--format auto|combined|json] [--prefix PREFIX ...] FILE ...|query [filters]]")
+    print("  analyze: Show current analysis")
+    print("    --incremental: Only parse log lines added since the last checkpoint")
+    print("    --rebuild: Discard the checkpoint and start from scratch")
+    print("    --approximate: Fixed-memory sketches for counts and unique IPs/user agents")
+    print("    --workers N: Analyze the given logs (plain, .gz, .bz2, .xz) with N processes")
+    print("  monitor: Start real-time monitoring")
+    print("    --since: Replay from a byte offset or timestamp instead of the end of the log")
+    print("  index: Load new log lines into the SQLite store (--db PATH, default logs/honeypot_access.db)")
+    print("  ingest: Import honeypot hits from nginx/Apache combined or JSON logs (plain or .gz)")
+    print("    --prefix: Also keep URLs starting with PREFIX (repeatable)")
+    print("  query: Query the SQLite store")
+    print("    --since/--until ISO_TIME, --ip ADDRESS|CIDR, --url-prefix PREFIX,")
+    print("    --user-agent SUBSTRING, --crawler NAME|TYPE, --after-rotation NEW_URL,")
+    print("    --limit N, --count")
+
+def get_option(name, default=None):
+    """Return the value following a --name command-line option"""
+    import sys
+    if name in sys.argv[2:]:
+        position = sys.argv.index(name)
+        if position + 1 == len(sys.argv):
+            # A trailing option has no value to use
+            print_usage()
+            sys.exit(2)
+        return sys.argv[position + 1]
+    return default
+
+def get_time_option(name, offsets=False):
+    """Return an ISO timestamp option (or a byte offset, with offsets=True), exiting with the usage text if it is neither"""
+    import sys
+    value = get_option(name)
+    if value is None or (offsets and value.isdigit()):
+        return value
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        print_usage()
+        sys.exit(2)
+    return value
 
 def main():
-    monitor = HoneypotMonitor()
-    
     import sys
+    monitor = HoneypotMonitor(approximate='--approximate' in sys.argv[2:],
+                              store_path=get_option('--db', DEFAULT_STORE_PATH if '--store' in sys.argv[2:] else None))
+    
     if len(sys.argv) > 1:
         if sys.argv[1] == 'analyze':
-            monitor.print_analysis()
+            if '--workers' in sys.argv[2:]:
+                workers = int(get_option('--workers'))
+                position = sys.argv.index('--workers')
+                paths = [arg for arg in sys.argv[2:position] + sys.argv[position + 2:] if not arg.startswith('--')]
+                monitor.print_report(monitor.analyze_archives(paths or [monitor.access_log_file], workers))
+                return
+            if '--rebuild' in sys.argv[2:]:
+                monitor.reset_checkpoint()
+            monitor.print_analysis(incremental='--incremental' in sys.argv[2:])
         elif sys.argv[1] == 'monitor':
-            monitor.monitor_realtime()
+            monitor.monitor_realtime(since=get_time_option('--since', offsets=True))
+        elif sys.argv[1] == 'index':
+            monitor.index_accesses()
+        elif sys.argv[1] == 'ingest':
+            options = ('--prefix', '--format', '--db')
+            paths = [arg for i, arg in enumerate(sys.argv[2:], 2)
+                     if not arg.startswith('--') and sys.argv[i - 1] not in options]
+            prefixes = [sys.argv[i + 1] for i, arg in enumerate(sys.argv) if arg == '--prefix']
+            monitor.ingest_logs(paths, prefixes, get_option('--format', 'auto'))
+        elif sys.argv[1] == 'query':
+            monitor.query_accesses(
+                since=get_time_option('--since'),
+                until=get_time_option('--until'),
+                network=get_option('--ip'),
+                url_prefix=get_option('--url-prefix'),
+                user_agent=get_option('--user-agent'),
+                crawler=get_option('--crawler'),
+                after_rotation=get_option('--after-rotation'),
+                limit=int(get_option('--limit', 100)),
+                count_only='--count' in sys.argv[2:]
+            )
         else:
-            print("Usage: python honeypot_monitor.py [analyze|monitor]")
-            print("  analyze: Show current analysis")
-            print("  monitor: Start real-time monitoring")
+            print_usage()
     else:
         monitor.print_analysis()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    run_main(main) 
\ No newline at end of file
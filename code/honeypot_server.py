@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Honeypot Web Server
+Small asyncio HTTP/1.1 server that serves the site from the repository root,
+resolves rotated honeypot names through logs/honeypot_url_history.json (and
+signed names by checking their HMAC) and records every honeypot hit through
+the monitor's buffered access log writer. In signed-URL mode the sitemap and
+pages with honeypot links are rendered per request with freshly signed links.
+Pages are sent from their precompressed .br/.gz siblings (see page_pipeline.py)
+to clients that accept those encodings
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import mimetypes
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote, urlsplit
+
+from honeypot_monitor import HoneypotMonitor
+from page_pipeline import PRECOMPRESSED_SUFFIXES
+from site_builder import ROBOTS_FILE, SiteBuilder
+from signed_urls import get_default_signer
+
+# Directories that must never be served
+PRIVATE_DIRECTORIES = ('logs', 'code', 'prompt')
+
+MAX_HEADER_BYTES = 16 * 1024
+KEEP_ALIVE_TIMEOUT = 15
+
+# Served as WebP instead when a .webp sibling exists and the client accepts it
+NEGOTIATED_IMAGES = ('.jpg', '.jpeg', '.png')
+mimetypes.add_type('image/webp', '.webp')
+
+# Served from a .br/.gz sibling written by the page pipeline when the client accepts it
+PRECOMPRESSED_PAGES = ('.html',)
+
+# How long stat results and the rotation mapping are trusted before re-checking
+METADATA_TTL = 1.0
+
+STATUS_TEXT = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed'
+}
+
+class StaticFile:
+    """Cached metadata for a file we serve"""
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/xml', 'application/javascript'):
+            self.content_type += '; charset=utf-8'
+
+    def not_modified(self, headers):
+        """Evaluate conditional GET headers (If-None-Match wins over If-Modified-Since)"""
+        if_none_match = headers.get('if-none-match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or self.etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = headers.get('if-modified-since')
+        if if_modified_since is not None:
+            try:
+                return int(parsedate_to_datetime(if_modified_since).timestamp()) >= self.mtime_ns // 1_000_000_000
+            except (TypeError, ValueError):
+                return False
+        return False
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (q=0 excluded)"""
+    encodings = set()
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+class HoneypotServer:
+    """Serve the static site and log honeypot hits"""
+
+    def __init__(self, root='.', monitor=None, trust_proxy=False):
+        self.root = os.path.abspath(root)
+        self.monitor = monitor or HoneypotMonitor()
+        self.trust_proxy = trust_proxy
+        self.url_history_file = os.path.join(self.root, 'logs', 'honeypot_url_history.json')
+        self.url_history_mtime = None
+        self.url_history_checked = 0
+        self.current_urls = {}
+        self.files = {}
+        self.resolved = {}
+        self.date_header = (0, '')
+        self.site = SiteBuilder(root=self.root)
+        self.signer = get_default_signer(create=self.site.signed)
+        self.per_visitor = self.site.manifest.get('signed_urls', {}).get('per_visitor', False)
+        # Outputs rendered per request in signed mode: the sitemap, robots.txt and every page with link slots
+        self.dynamic_paths = (set(self.site.linking_pages()) | {self.site.manifest['sitemap'], ROBOTS_FILE}
+                              if self.site.signed else set())
+
+    def load_url_history(self):
+        """Reload the rotation mapping when the history file changes"""
+        now = time.monotonic()
+        if now - self.url_history_checked < METADATA_TTL:
+            return
+        self.url_history_checked = now
+        try:
+            mtime = os.stat(self.url_history_file).st_mtime_ns
+        except FileNotFoundError:
+            self.current_urls = {}
+            return
+        if mtime == self.url_history_mtime:
+            return
+        try:
+            with open(self.url_history_file, 'r') as f:
+                self.current_urls = json.load(f).get('current_urls', {})
+            self.url_history_mtime = mtime
+            self.resolved.clear()
+        except (OSError, ValueError):
+            pass
+
+    def resolve(self, path):
+        """Map a request path to a StaticFile or None, caching the answer briefly"""
+        now = time.monotonic()
+        cached = self.resolved.get(path)
+        if cached is not None and now - cached[0] < METADATA_TTL:
+            return cached[1]
+        if len(self.resolved) > 10000:
+            self.resolved.clear()
+        static_file = self._resolve(path)
+        self.resolved[path] = (now, static_file)
+        return static_file
+
+    def _resolve(self, path):
+        name = unquote(path).lstrip('/')
+        if name == '' or name.endswith('/'):
+            name += 'index.html'
+        parts = name.split('/')
+        if any(part in ('', '.', '..') or part.startswith('.') for part in parts) or parts[0] in PRIVATE_DIRECTORIES:
+            return None
+
+        # An original honeypot name resolves to whatever it has been rotated to,
+        # and a signed name to its page once the MAC checks out
+        if len(parts) == 1 and name in self.current_urls:
+            name = self.current_urls[name]
+        elif len(parts) == 1 and self.signer is not None:
+            token = self.signer.verify(name)
+            if token is not None:
+                name = self.current_urls.get(token['page'], token['page'])
+
+        full_path = os.path.join(self.root, *name.split('/'))
+        try:
+            stat = os.stat(full_path)
+        except (FileNotFoundError, NotADirectoryError):
+            self.files.pop(full_path, None)
+            return None
+        if not os.path.isfile(full_path):
+            return None
+
+        cached = self.files.get(full_path)
+        if cached is None or cached.mtime_ns != stat.st_mtime_ns or cached.size != stat.st_size:
+            cached = self.files[full_path] = StaticFile(full_path, stat)
+        return cached
+
+    def precompressed(self, static_file, suffix):
+        """StaticFile for a precompressed sibling, or None if missing or older than the page"""
+        key = ('precompressed', static_file.path + suffix)
+        now = time.monotonic()
+        cached = self.resolved.get(key)
+        if cached is not None and now - cached[0] < METADATA_TTL and cached[2] == static_file.mtime_ns:
+            return cached[1]
+        sibling = None
+        try:
+            stat = os.stat(key[1])
+        except FileNotFoundError:
+            pass
+        else:
+            # A page edited after the last pipeline run must not be shadowed by its old siblings
+            if stat.st_mtime_ns >= static_file.mtime_ns:
+                sibling = StaticFile(key[1], stat)
+        self.resolved[key] = (now, sibling, static_file.mtime_ns)
+        return sibling
+
+    def client_ip(self, headers, peer):
+        if self.trust_proxy and 'x-forwarded-for' in headers:
+            return headers['x-forwarded-for'].split(',')[0].strip()
+        return peer[0] if peer else ''
+
+    def record_hit(self, path, headers, peer):
+        """Queue a honeypot hit on the buffered writer without blocking the event loop
+
+        An original name is served as the page it was rotated to, so that name
+        is logged too for rotation attribution.
+        """
+        name = unquote(path).lstrip('/')
+        served = '/' + self.current_urls[name] if name in self.current_urls else None
+        self.monitor.log_access(path, headers.get('user-agent', ''), self.client_ip(headers, peer), served=served)
+
+    def render_dynamic(self, path, headers, peer):
+        """Body of a per-request page in signed mode, or None for ordinary files"""
+        name = unquote(path).lstrip('/')
+        if name not in self.dynamic_paths:
+            return None
+        visitor = self.client_ip(headers, peer) if self.per_visitor else None
+        now = time.time()
+        current_urls = {**self.current_urls, **self.signer.current_urls(self.site.honeypots, now, visitor)}
+        try:
+            body = self.site.render_path(name, current_urls, datetime.fromtimestamp(now).strftime('%Y-%m-%d'))
+        except FileNotFoundError:
+            return None
+        return body.encode('utf-8') if body is not None else None
+
+    async def handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self.send_error(writer, 400, keep_alive=False)
+                    return
+
+                try:
+                    method, target, version, headers = self.parse_head(head)
+                except ValueError:
+                    await self.send_error(writer, 400, keep_alive=False)
+                    return
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                if not await self.handle_request(method, target, headers, peer, writer, keep_alive):
+                    return
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    def parse_head(self, head):
+        lines = head.decode('latin-1').split('\r\n')
+        method, target, version = lines[0].split(' ')
+        if not version.startswith('HTTP/1.'):
+            raise ValueError(version)
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return method, target, version, headers
+
+    async def handle_request(self, method, target, headers, peer, writer, keep_alive):
+        """Serve one request; returns False if the connection should be dropped"""
+        if method not in ('GET', 'HEAD'):
+            await self.send_error(writer, 405, keep_alive)
+            return True
+
+        path = urlsplit(target).path or '/'
+        self.load_url_history()
+        if self.monitor.is_honeypot_url(path):
+            self.record_hit(path, headers, peer)
+
+        body = self.render_dynamic(path, headers, peer) if self.dynamic_paths else None
+        if body is not None:
+            content_type = {'.xml': 'application/xml', '.txt': 'text/plain'}.get(os.path.splitext(path)[1], 'text/html')
+            content_type += '; charset=utf-8'
+            # Links are signed per window (or per visitor), so never cache
+            self.write_head(writer, 200, [('Content-Type', content_type), ('Cache-Control', 'no-store'),
+                                          ('Content-Length', str(len(body)))], keep_alive)
+            if method == 'GET':
+                writer.write(body)
+            await writer.drain()
+            return True
+
+        static_file = self.resolve(path)
+        if static_file is None:
+            await self.send_error(writer, 404, keep_alive)
+            return True
+
+        response_headers = []
+        if path.endswith(NEGOTIATED_IMAGES):
+            # The image pipeline writes a .webp next to every JPEG; send it to clients that accept it
+            alternative = self.resolve(path.rsplit('.', 1)[0] + '.webp')
+            if alternative is not None:
+                response_headers.append(('Vary', 'Accept'))
+                if 'image/webp' in headers.get('accept', ''):
+                    static_file = alternative
+        content_type = static_file.content_type
+        if static_file.path.endswith(PRECOMPRESSED_PAGES):
+            encodings = None
+            for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+                sibling = self.precompressed(static_file, suffix)
+                if sibling is None:
+                    continue
+                if encodings is None:
+                    response_headers.append(('Vary', 'Accept-Encoding'))
+                    encodings = accepted_encodings(headers.get('accept-encoding', ''))
+                if encoding in encodings or '*' in encodings:
+                    static_file = sibling
+                    response_headers.append(('Content-Encoding', encoding))
+                    break
+        response_headers += [
+            ('Content-Type', content_type),
+            ('ETag', static_file.etag),
+            ('Last-Modified', static_file.last_modified),
+            ('Cache-Control', 'no-cache')
+        ]
+        if static_file.not_modified(headers):
+            self.write_head(writer, 304, response_headers, keep_alive)
+            await writer.drain()
+            return True
+
+        self.write_head(writer, 200, response_headers + [('Content-Length', str(static_file.size))], keep_alive)
+        if method == 'HEAD':
+            await writer.drain()
+            return True
+        await writer.drain()
+        try:
+            with open(static_file.path, 'rb') as f:
+                # Zero-copy os.sendfile where the transport supports it, read/write otherwise
+                await asyncio.get_running_loop().sendfile(writer.transport, f, 0, static_file.size)
+        except FileNotFoundError:
+            # Rotated away between stat and open; the length is already promised
+            return False
+        return True
+
+    def write_head(self, writer, status, headers, keep_alive):
+        now = int(time.time())
+        if self.date_header[0] != now:
+            self.date_header = (now, formatdate(now, usegmt=True))
+        lines = [f'HTTP/1.1 {status} {STATUS_TEXT[status]}', f'Date: {self.date_header[1]}', 'Server: honeypot']
+        lines.extend(f'{name}: {value}' for name, value in headers)
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+    async def send_error(self, writer, status, keep_alive):
+        body = f'{status} {STATUS_TEXT[status]}\n'.encode()
+        self.write_head(writer, status, [('Content-Type', 'text/plain; charset=utf-8'),
+                                         ('Content-Length', str(len(body)))], keep_alive)
+        writer.write(body)
+        await writer.drain()
+
+    async def serve(self, host='0.0.0.0', port=8000):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=4096,
+                                            limit=MAX_HEADER_BYTES, reuse_address=True)
+        print(f"[{datetime.now()}] Serving {self.root} on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def run(self, host='0.0.0.0', port=8000):
+        try:
+            asyncio.run(self.serve(host, port))
+        except KeyboardInterrupt:
+            print("\nStopping honeypot server...")
+        finally:
+            self.monitor.close()
+
+def main():
+    host = '0.0.0.0'
+    port = 8000
+    args = sys.argv[1:]
+    if args and args[0] in ('-h', '--help'):
+        print("Usage: python honeypot_server.py [--host HOST] [--port PORT] [--root DIR] [--trust-proxy]")
+        print("  Serves the site and logs honeypot hits to logs/honeypot_access.log")
+        print("  --trust-proxy: Take the client IP from X-Forwarded-For")
+        return
+    root = '.'
+    if '--host' in args:
+        host = args[args.index('--host') + 1]
+    if '--port' in args:
+        port = int(args[args.index('--port') + 1])
+    if '--root' in args:
+        root = args[args.index('--root') + 1]
+
+    HoneypotServer(root, trust_proxy='--trust-proxy' in args).run(host, port)
+
+if __name__ == "__main__":
+    main()
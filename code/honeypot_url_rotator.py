@@ -1,22 +1,45 @@
 #!/usr/bin/env python3
 """
 Honeypot URL Rotator System
-Changes URLs for honeypot pages every 5 minutes to detect crawlers
+Changes URLs for the honeypot pages listed in code/site_manifest.json, each on
+its own interval, to detect crawlers
 """
 
 import os
 import time
+import heapq
 import random
 import string
-import shutil
 from datetime import datetime
 import json
+from site_builder import MANIFEST_FILE, load_manifest
+from timing_metrics import run_main
+
+# Pages due this close to now are rotated in the current pass rather than the next
+DUE_TOLERANCE_SECONDS = 60
 
 class HoneypotURLRotator:
-    def __init__(self):
-        self.honeypot_pages = ['a-6hp.html', 'a-7sm.html']
+    """Rotate the honeypot pages listed in the site manifest, each on its own interval
+
+    Due times live in a heap (stale entries are skipped when popped), and the
+    names already taken in the site root are kept in a set, so a pass costs
+    time in proportion to the pages it rotates rather than to the total.
+    """
+
+    def __init__(self, manifest_file=MANIFEST_FILE, root='.'):
+        manifest = load_manifest(manifest_file)
+        self.root = root
+        self.honeypots = manifest['honeypots']
+        self.honeypot_pages = list(self.honeypots)
+        default_interval = manifest.get('default_interval_minutes', 30)
+        self.intervals = {
+            page: settings.get('interval_minutes', default_interval) * 60 for page, settings in self.honeypots.items()
+        }
         self.url_history_file = 'logs/honeypot_url_history.json'
         self.current_urls = {}
+        self.next_rotation = {}
+        self.schedule = []
+        self.taken = set()
         self.load_current_urls()
     
     def generate_random_filename(self, original_name):
@@ -29,98 +52,149 @@ class HoneypotURLRotator:
         return f"{prefix}-{random_suffix}.html"
     
     def load_current_urls(self):
-        """Load current URL mappings from history file"""
+        """Load current URL mappings and the rotation schedule from the history file"""
+        data = {}
         if os.path.exists(self.url_history_file):
             try:
                 with open(self.url_history_file, 'r') as f:
                     data = json.load(f)
-                    self.current_urls = data.get('current_urls', {})
-            except:
-                self.current_urls = {}
-        else:
-            self.current_urls = {}
+            except (OSError, ValueError):
+                data = {}
+        self.current_urls = data.get('current_urls', {})
+        saved_schedule = data.get('next_rotation', {})
+        
+        # Pages without a saved due time (new in the manifest) are due now
+        now = time.time()
+        self.next_rotation = {page: saved_schedule.get(page, now) for page in self.honeypot_pages}
+        self.schedule = [(due, page) for page, due in self.next_rotation.items()]
+        heapq.heapify(self.schedule)
+        
+        # One directory scan instead of an exists() call per collision check
+        self.taken = {entry.name for entry in os.scandir(self.root)}
     
     def save_url_history(self):
-        """Save current URL mappings to history file"""
+        """Save current URL mappings and the schedule to the history file atomically"""
         os.makedirs('logs', exist_ok=True)
         data = {
             'current_urls': self.current_urls,
+            'next_rotation': self.next_rotation,
             'last_updated': datetime.now().isoformat()
         }
-        with open(self.url_history_file, 'w') as f:
+        temp_file = self.url_history_file + '.tmp'
+        with open(temp_file, 'w') as f:
             json.dump(data, f, indent=2)
+        os.replace(temp_file, self.url_history_file)
+    
+    def due_pages(self, now=None):
+        """Pop every page due by now (within DUE_TOLERANCE_SECONDS) off the schedule"""
+        limit = (now or time.time()) + DUE_TOLERANCE_SECONDS
+        due = []
+        while self.schedule and self.schedule[0][0] <= limit:
+            due_time, page = heapq.heappop(self.schedule)
+            # Entries left behind by a forced rotation are stale
+            if self.next_rotation.get(page) == due_time:
+                due.append(page)
+        return due
+    
+    def reschedule(self, page, now):
+        """Move a page to its next slot on its interval grid"""
+        interval = self.intervals[page]
+        due = self.next_rotation.get(page, now)
+        if due + interval <= now:
+            due += ((now - due) // interval + 1) * interval
+        else:
+            due += interval
+        self.next_rotation[page] = due
+        heapq.heappush(self.schedule, (due, page))
+    
+    def rotate_due(self, now=None):
+        """Rotate only the pages whose interval has elapsed"""
+        now = now or time.time()
+        return self.rotate_urls(self.due_pages(now), now)
     
-    def rotate_urls(self):
-        """Rotate URLs for honeypot pages"""
+    def rotate_urls(self, pages=None, now=None):
+        """Rotate the given pages (all by default), returning (original, old, new) filenames moved"""
         print(f"[{datetime.now()}] Starting URL rotation for honeypot pages...")
+        now = now or time.time()
+        if pages is None:
+            pages = self.honeypot_pages
         
-        # Get current filenames from mappings or use original names
-        current_files = {}
-        for original_page in self.honeypot_pages:
+        rotated = []
+        for original_page in pages:
+            self.reschedule(original_page, now)
+            # Get current filename from mappings or use original name
             current_file = self.current_urls.get(original_page, original_page)
-            if os.path.exists(current_file):
-                current_files[original_page] = current_file
-            else:
+            if current_file not in self.taken:
                 print(f"Warning: {current_file} does not exist, skipping...")
                 continue
-        
-        for original_page, current_file in current_files.items():
-            # Generate new random filename with original prefix
-            new_filename = self.generate_random_filename(original_page)
             
-            # Ensure new filename doesn't conflict with existing files
-            while os.path.exists(new_filename):
+            # Generate new random filename with original prefix, unused in the site root
+            new_filename = self.generate_random_filename(original_page)
+            while new_filename in self.taken:
                 new_filename = self.generate_random_filename(original_page)
             
             # Move the file to new name
             try:
-                shutil.move(current_file, new_filename)
+                os.rename(os.path.join(self.root, current_file), os.path.join(self.root, new_filename))
+                self.taken.discard(current_file)
+                self.taken.add(new_filename)
                 self.current_urls[original_page] = new_filename
                 print(f"Rotated {current_file} -> {new_filename}")
-                
-                # Log the rotation
-                self.log_rotation(current_file, new_filename)
+                rotated.append((original_page, current_file, new_filename))
                 
             except Exception as e:
                 print(f"Error rotating {current_file}: {e}")
         
-        # Save updated mappings
-        self.save_url_history()
-        print(f"[{datetime.now()}] URL rotation completed.")
+        # Log the rotations and save updated mappings once per pass
+        self.log_rotations(rotated)
+        if pages:
+            self.save_url_history()
+        print(f"[{datetime.now()}] URL rotation completed ({len(rotated)} of {len(self.honeypot_pages)} pages rotated).")
+        return rotated
     
-    def log_rotation(self, old_name, new_name):
-        """Log URL rotation for monitoring"""
-        log_entry = {
-            'timestamp': datetime.now().isoformat(),
-            'old_url': old_name,
-            'new_url': new_name,
-            'action': 'url_rotation'
-        }
-        
+    def log_rotations(self, rotated):
+        """Log URL rotations for monitoring"""
+        if not rotated:
+            return
+        timestamp = datetime.now().isoformat()
         log_file = 'logs/honeypot_rotations.log'
         with open(log_file, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
+            f.write(''.join(json.dumps({
+                'timestamp': timestamp,
+                'old_url': old_name,
+                'new_url': new_name,
+                'action': 'url_rotation'
+            }) + '\n' for _, old_name, new_name in rotated))
     
     def get_current_urls(self):
         """Get current URL mappings"""
         return self.current_urls
     
-    def run_continuous_rotation(self, interval_minutes=5):
-        """Run continuous URL rotation every N minutes"""
-        print(f"Starting continuous URL rotation every {interval_minutes} minutes...")
+    def next_due(self):
+        """Time the next page is due, skipping stale schedule entries"""
+        while self.schedule and self.next_rotation.get(self.schedule[0][1]) != self.schedule[0][0]:
+            heapq.heappop(self.schedule)
+        return self.schedule[0][0] if self.schedule else None
+    
+    def run_continuous_rotation(self):
+        """Rotate each page as it falls due, sleeping until the next one"""
+        print(f"Starting continuous URL rotation of {len(self.honeypot_pages)} pages on their own schedules...")
         print("Press Ctrl+C to stop")
         
         try:
             while True:
-                self.rotate_urls()
-                print(f"Next rotation in {interval_minutes} minutes...")
-                time.sleep(interval_minutes * 60)
+                self.rotate_due()
+                next_due = self.next_due()
+                if next_due is None:
+                    break
+                print(f"Next rotation at {datetime.fromtimestamp(next_due).strftime('%Y-%m-%d %H:%M:%S')}...")
+                time.sleep(max(0, next_due - time.time()))
                 
         except KeyboardInterrupt:
             print("\nStopping URL rotation...")
     
     def manual_rotation(self):
-        """Perform a single manual rotation"""
+        """Perform a single manual rotation of every page"""
         self.rotate_urls()
 
 def main():
@@ -131,18 +205,24 @@ def main():
         if sys.argv[1] == 'manual':
             print("Performing manual URL rotation...")
             rotator.manual_rotation()
+        elif sys.argv[1] == 'due':
+            rotator.rotate_due()
         elif sys.argv[1] == 'status':
             print("Current URL mappings:")
-            for original, current in rotator.get_current_urls().items():
-                print(f"  {original} -> {current}")
+            for original in rotator.honeypot_pages:
+                current = rotator.current_urls.get(original, original)
+                due = datetime.fromtimestamp(rotator.next_rotation[original]).strftime('%Y-%m-%d %H:%M:%S')
+                print(f"  {original} -> {current} ({rotator.honeypots[original]['channel']}, "
+                      f"every {rotator.intervals[original] // 60:g} min, next {due})")
         else:
-            print("Usage: python honeypot_url_rotator.py [manual|status]")
-            print("  manual: Perform single rotation")
-            print("  status: Show current URL mappings")
-            print("  (no args): Run continuous rotation every 5 minutes")
+            print("Usage: python honeypot_url_rotator.py [manual|due|status] [--profile]")
+            print("  manual: Rotate every honeypot page now")
+            print("  due: Rotate only the pages whose interval has elapsed")
+            print("  status: Show current URL mappings and schedules")
+            print("  (no args): Run continuous rotation, each page on its own interval")
     else:
         # Run continuous rotation
         rotator.run_continuous_rotation()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    run_main(main) 
\ No newline at end of file
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+HTML Minifier
+Conservative minification of the site's pages for precompressed output:
+comments are dropped, whitespace runs collapse to one space (or to nothing
+next to block-level tags), tag attributes are re-spaced, and inline <style>
+blocks are minified as CSS. <pre>, <textarea> and <script> contents, quoted
+attribute values and CSS strings are left exactly as they are
+"""
+
+import re
+import sys
+from functools import lru_cache
+
+from timing_metrics import run_main
+
+# Whitespace next to these tags never renders, so it can go entirely
+BLOCK_TAGS = frozenset('''
+    !doctype address article aside base blockquote body br dd details dialog div dl dt fieldset figcaption
+    figure footer form h1 h2 h3 h4 h5 h6 head header hr html li link main meta nav noscript ol option p
+    script section style summary table tbody td tfoot th thead title tr ul
+'''.split())
+
+HTML_TOKENS = re.compile(r'<(?P<raw>pre|textarea|script|style)\b[^>]*>.*?</(?P=raw)\s*>'
+                         r'|<!--.*?-->|<[!/]?[A-Za-z][^>]*>|\s+', re.DOTALL | re.IGNORECASE)
+TAG_NAME = re.compile(r'<\s*/?\s*(![A-Za-z]+|[A-Za-z][A-Za-z0-9]*)')
+TAG_SPACES = re.compile(r'("[^"]*"|\'[^\']*\')|\s+')
+STYLE_BLOCK = re.compile(r'(<style\b[^>]*>)(.*?)(</style\s*>)', re.DOTALL | re.IGNORECASE)
+
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|;(?=(?:\s|/\*.*?\*/)*\})|(?:\s|/\*.*?\*/)+',
+                        re.DOTALL)
+# No space is needed after these, or before the first four (a space before
+# ':' can be a descendant combinator, so that one stays)
+CSS_TIGHT_AFTER = '{};,>:'
+CSS_TIGHT_BEFORE = '{};,>'
+
+# Pages built from the same template share their <style> block
+@lru_cache(maxsize=256)
+def minify_css(css):
+    """Drop comments, needless whitespace and the last ';' of each block"""
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group(0) == ';':
+            return ''
+        before = css[match.start() - 1:match.start()]
+        after = css[match.end():match.end() + 1]
+        if not before or not after or before in CSS_TIGHT_AFTER or after in CSS_TIGHT_BEFORE:
+            return ''
+        return ' '
+    return CSS_TOKENS.sub(replace, css)
+
+def tag_name(content, position):
+    match = TAG_NAME.match(content, position)
+    return match.group(1).lower() if match else None
+
+def minify_tag(tag):
+    """Single spaces between attributes; quoted values untouched"""
+    if '  ' not in tag and '\n' not in tag and '\t' not in tag and not tag.endswith((' >', ' />')):
+        return tag
+    tag = TAG_SPACES.sub(lambda match: match.group(1) or ' ', tag)
+    return tag.replace(' >', '>').replace(' />', '/>')
+
+def minify_html(content):
+    """The page with comments and insignificant whitespace removed and inline CSS minified"""
+    def replace(match):
+        token = match.group(0)
+        raw = match.group('raw')
+        if raw is not None:
+            if raw.lower() == 'style':
+                return STYLE_BLOCK.sub(lambda style: minify_tag(style.group(1)) + minify_css(style.group(2)).strip()
+                                       + style.group(3), token)
+            return token
+        if token.startswith('<!--'):
+            # Conditional comments are markup for old IE, not commentary
+            return token if token.startswith('<!--[if') else ''
+        if token.startswith('<'):
+            return minify_tag(token)
+        start, end = match.span()
+        if start == 0 or end == len(content):
+            return ''
+        if content[start - 1] == '>' and tag_name(content, content.rfind('<', 0, start)) in BLOCK_TAGS:
+            return ''
+        if content[end] == '<' and tag_name(content, end) in BLOCK_TAGS:
+            return ''
+        return ' '
+    return HTML_TOKENS.sub(replace, content)
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python html_minifier.py FILE [--profile]")
+        print("  Print the minified page and its size before and after (on stderr)")
+        return
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        content = f.read()
+    minified = minify_html(content)
+    sys.stdout.write(minified)
+    print(f"{len(content.encode()):,} -> {len(minified.encode()):,} bytes", file=sys.stderr)
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Image Pipeline
+Builds every placeholder image in img/ from the "images" section of
+code/site_manifest.json: one JPEG and one WebP per configured width. Each
+output is addressed by a hash of everything that goes into it (text, colours,
+size, font, format, quality), recorded in img/.image_hashes.json, so outputs
+whose inputs are unchanged are skipped without being opened and a no-op build
+is one JSON read plus a stat per file. Changed outputs are rendered in a
+process pool and only replace the existing file if the bytes differ
+
+    img/image-1.jpg         full width (the name pages already use)
+    img/image-1.webp
+    img/image-1-200w.jpg    narrower variants for small cards
+    img/image-1-200w.webp
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+from site_builder import load_manifest, write_atomic
+from timing_metrics import run_main
+
+HASHES_FILE = '.image_hashes.json'
+
+# Bump when rendering changes in a way the inputs don't capture
+RENDER_VERSION = 1
+
+# Fallback when none of the configured fonts exist on this machine
+DEFAULT_FONT = 'default'
+
+FORMAT_EXTENSIONS = {'jpeg': '.jpg', 'webp': '.webp'}
+DEFAULT_QUALITY = {'jpeg': 80, 'webp': 75}
+
+def find_font(candidates):
+    """First configured font file that exists here, or DEFAULT_FONT"""
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return DEFAULT_FONT
+
+def variant_name(name, width, full_width, extension):
+    return f'{name}{extension}' if width == full_width else f'{name}-{width}w{extension}'
+
+def render_image(job):
+    """Draw one image at one width and encode it in every requested format
+
+    Returns [(output path, encoded bytes)]; runs in pool workers, so Pillow is
+    imported here rather than at module level.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    spec, width, height, font_path, font_size, formats = job
+    image = Image.new('RGB', (width, height), tuple(spec['color']))
+    draw = ImageDraw.Draw(image)
+    if font_path == DEFAULT_FONT:
+        font = ImageFont.load_default(font_size)
+    else:
+        font = ImageFont.truetype(font_path, font_size)
+    left, top, right, bottom = draw.textbbox((0, 0), spec['text'], font=font)
+    position = ((width - (right - left)) // 2 - left, (height - (bottom - top)) // 2 - top)
+    draw.text(position, spec['text'], fill=tuple(spec['text_color']), font=font)
+
+    outputs = []
+    for path, image_format, quality in formats:
+        buffer = BytesIO()
+        if image_format == 'jpeg':
+            image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(buffer, 'WEBP', quality=quality, method=6)
+        outputs.append((path, buffer.getvalue()))
+    return outputs
+
+class ImagePipeline:
+    """Plan, render and write the manifest's images"""
+
+    def __init__(self, root='.', manifest=None):
+        self.root = root
+        self.config = (manifest or load_manifest())['images']
+        self.directory = os.path.join(root, self.config['directory'])
+        self.hashes_file = os.path.join(self.directory, HASHES_FILE)
+        self.width, self.height = self.config['size']
+        self.widths = sorted(set(self.config.get('widths', [self.width])) | {self.width}, reverse=True)
+        self.formats = self.config.get('formats', ['jpeg', 'webp'])
+        self.quality = {**DEFAULT_QUALITY, **self.config.get('quality', {})}
+        self.font_path = find_font(self.config.get('fonts', []))
+        for image_format in self.formats:
+            if image_format not in FORMAT_EXTENSIONS:
+                raise ValueError(f"images: unknown format {image_format!r}; expected one of {', '.join(FORMAT_EXTENSIONS)}")
+
+    def font_identity(self):
+        # Path and size rather than mtime, so a checkout elsewhere doesn't look changed
+        if self.font_path == DEFAULT_FONT:
+            return DEFAULT_FONT
+        return f'{self.font_path}:{os.path.getsize(self.font_path)}'
+
+    def plan(self):
+        """Yield (render job, [(path, input hash)]) for every image and width"""
+        font = self.font_identity()
+        text_color = self.config.get('text_color', [255, 255, 255])
+        for entry in self.config['images']:
+            spec = {'text': entry['text'], 'color': entry['color'], 'text_color': entry.get('text_color', text_color)}
+            for width in self.widths:
+                height = round(self.height * width / self.width)
+                font_size = max(8, round(self.config.get('font_size', 24) * width / self.width))
+                formats = []
+                hashes = []
+                for image_format in self.formats:
+                    path = os.path.join(self.directory, variant_name(entry['name'], width, self.width,
+                                                                     FORMAT_EXTENSIONS[image_format]))
+                    inputs = [RENDER_VERSION, spec, width, height, font, font_size, image_format,
+                              self.quality[image_format]]
+                    formats.append((path, image_format, self.quality[image_format]))
+                    hashes.append((path, hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()))
+                yield (spec, width, height, self.font_path, font_size, formats), hashes
+
+    def load_hashes(self):
+        if not os.path.exists(self.hashes_file):
+            return {}
+        with open(self.hashes_file, 'r') as f:
+            return json.load(f)
+
+    def build(self, dry_run=False, workers=None):
+        """Render outputs whose input hash changed; returns (changed paths, size report)
+
+        The report maps each output's site path to (bytes before, bytes after).
+        """
+        previous = self.load_hashes()
+        hashes = {}
+        jobs = []
+        for job, outputs in self.plan():
+            stale = False
+            for path, digest in outputs:
+                relative = os.path.relpath(path, self.root)
+                hashes[relative] = digest
+                if previous.get(relative) != digest or not os.path.exists(path):
+                    stale = True
+            if stale:
+                jobs.append(job)
+
+        report = {}
+        changed = []
+        if jobs:
+            workers = workers or self.config.get('workers') or os.cpu_count() or 1
+            if workers <= 1 or len(jobs) <= 1:
+                results = [render_image(job) for job in jobs]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(render_image, jobs))
+            for outputs in results:
+                for path, data in outputs:
+                    relative = os.path.relpath(path, self.root)
+                    before = os.path.getsize(path) if os.path.exists(path) else 0
+                    report[relative] = (before, len(data))
+                    if before == len(data):
+                        with open(path, 'rb') as f:
+                            if f.read() == data:
+                                continue
+                    changed.append(relative)
+                    if not dry_run:
+                        write_binary(path, data)
+
+        if not dry_run and hashes != previous:
+            write_atomic(self.hashes_file, json.dumps(hashes, indent=2, sort_keys=True) + '\n')
+            changed.append(os.path.relpath(self.hashes_file, self.root))
+        return changed, report
+
+    def unmanaged(self):
+        """Files in the image directory the manifest doesn't produce"""
+        produced = {os.path.basename(path) for _, outputs in self.plan() for path, _ in outputs}
+        return sorted(name for name in os.listdir(self.directory)
+                      if name not in produced and not name.startswith('.'))
+
+    def sizes(self):
+        """Site path -> size of every output, for the size report"""
+        return {os.path.relpath(path, self.root): os.path.getsize(path) if os.path.exists(path) else None
+                for _, outputs in self.plan() for path, _ in outputs}
+
+def write_binary(path, data):
+    temp_file = path + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+    os.replace(temp_file, path)
+
+def print_sizes(pipeline):
+    """Size of every variant per image, with totals and what each saves over the full-width JPEG"""
+    sizes = pipeline.sizes()
+    directory = os.path.relpath(pipeline.directory, pipeline.root)
+    columns = [(width, image_format) for width in pipeline.widths for image_format in pipeline.formats]
+    totals = dict.fromkeys(columns, 0)
+    print(f"{'image':<16}" + ''.join(f"{f'{width}w {image_format}':>14}" for width, image_format in columns))
+    for entry in pipeline.config['images']:
+        row = []
+        for width, image_format in columns:
+            size = sizes.get(os.path.join(directory, variant_name(entry['name'], width, pipeline.width,
+                                                                  FORMAT_EXTENSIONS[image_format])))
+            totals[width, image_format] += size or 0
+            row.append(f"{size:>14,}" if size is not None else f"{'-':>14}")
+        print(f"{entry['name']:<16}" + ''.join(row))
+    print(f"{'total':<16}" + ''.join(f"{totals[column]:>14,}" for column in columns))
+    baseline = totals.get((pipeline.width, 'jpeg'))
+    if baseline:
+        print(f"{'saved':<16}" + ''.join(f"{f'{100 * (baseline - totals[column]) / baseline:.0f}%':>14}" for column in columns))
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ('build', 'check', 'report'):
+        print("Usage: python image_pipeline.py [build|check|report] [--profile]")
+        print("  build: Render images whose inputs changed, in every width and format")
+        print("  check: List the outputs a build would change (exit status 1 if any)")
+        print("  report: Show output sizes and bytes saved by WebP and narrow widths")
+        return
+
+    pipeline = ImagePipeline()
+    if args[0] == 'report':
+        print_sizes(pipeline)
+        for name in pipeline.unmanaged():
+            print(f"Not in the manifest: {name}")
+        return
+
+    start = time.perf_counter()
+    changed, report = pipeline.build(dry_run=args[0] == 'check')
+    elapsed = time.perf_counter() - start
+    for path in changed:
+        if path in report:
+            before, after = report[path]
+            print(f"{'Updated' if args[0] == 'build' else 'Would update'} {path}: {before:,} -> {after:,} bytes")
+        else:
+            print(f"{'Updated' if args[0] == 'build' else 'Would update'} {path}")
+    if report:
+        before = sum(size[0] for path, size in report.items() if path in changed)
+        after = sum(size[1] for path, size in report.items() if path in changed)
+        print(f"{len(changed)} files changed ({before:,} -> {after:,} bytes) in {elapsed * 1000:.0f} ms")
+    else:
+        print(f"Images are up to date ({elapsed * 1000:.1f} ms)")
+    if pipeline.font_path == DEFAULT_FONT:
+        print("Warning: none of the configured fonts exist here; used Pillow's built-in font")
+    if args[0] == 'check' and changed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    run_main(main)
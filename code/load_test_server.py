@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Load test for the honeypot web server
+Opens many concurrent keep-alive connections, issues GET requests for a fixed
+duration and reports requests per second and latency percentiles
+"""
+
+import os
+import sys
+import time
+import asyncio
+import subprocess
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def read_response(reader):
+    """Read one HTTP response and return its status code"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return status
+
+async def client(host, port, paths, deadline, latencies, errors, client_id):
+    request_index = client_id
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        errors.append('connect')
+        return
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[request_index % len(paths)]
+            request_index += 1
+            request = (f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+                       f'User-Agent: LoadTest/1.0 (client {client_id})\r\n\r\n').encode()
+            started = time.perf_counter()
+            writer.write(request)
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+    except (OSError, asyncio.IncompleteReadError) as e:
+        errors.append(type(e).__name__)
+    finally:
+        writer.close()
+
+async def run_load(host, port, connections, duration, paths):
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(client(host, port, paths, deadline, latencies, errors, i) for i in range(connections)))
+    elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+def wait_for_port(host, port, timeout=10):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] in ('-h', '--help'):
+        print("Usage: python load_test_server.py [--host HOST] [--port PORT] [--connections N] [--duration SECONDS]")
+        print("                                  [--path PATH ...] [--spawn]")
+        print("  --spawn: Start code/honeypot_server.py for the duration of the test")
+        print("  Honeypot paths are logged as real hits, so the default paths leave them out")
+        return
+
+    def option(name, default):
+        return args[args.index(name) + 1] if name in args else default
+
+    host = option('--host', '127.0.0.1')
+    port = int(option('--port', 8000))
+    connections = int(option('--connections', 1000))
+    duration = float(option('--duration', 10))
+    paths = [args[i + 1] for i, arg in enumerate(args) if arg == '--path'] or ['/index.html', '/a-1.html']
+
+    server = None
+    if '--spawn' in args:
+        server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'honeypot_server.py')
+        server = subprocess.Popen([sys.executable, server_script, '--host', host, '--port', str(port)],
+                                  stdout=subprocess.DEVNULL)
+        if not wait_for_port(host, port):
+            server.terminate()
+            print("Server did not start")
+            sys.exit(1)
+
+    try:
+        print(f"Running {connections} keep-alive connections for {duration:.0f}s against http://{host}:{port}")
+        latencies, errors, elapsed = asyncio.run(run_load(host, port, connections, duration, paths))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latencies.sort()
+    print(f"Requests:    {len(latencies)}")
+    print(f"Errors:      {len(errors)}")
+    print(f"Requests/s:  {len(latencies) / elapsed:,.0f}")
+    print(f"Latency p50: {percentile(latencies, 0.50) * 1000:.2f} ms")
+    print(f"Latency p99: {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"Latency max: {percentile(latencies, 1.0) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Log Follower
+Follows a growing log file across truncation and rotation, waking on
+inotify events where available and falling back to short polling elsewhere
+"""
+
+import os
+import sys
+import json
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+from datetime import datetime
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+READ_CHUNK_SIZE = 64 * 1024
+
+class InotifyWatcher:
+    """Wait for changes to a single file by watching its directory with inotify"""
+
+    def __init__(self, path):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or not libc_name:
+            raise OSError("inotify is not available on this platform")
+
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # Watching the directory catches rename/create of the log as well as writes
+        directory = os.path.dirname(os.path.abspath(path)) or '.'
+        self.name = os.path.basename(path).encode()
+        if libc.inotify_add_watch(self.fd, directory.encode(), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout):
+        """Block until the watched file changes or the timeout expires"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return False
+            if self._drain_events():
+                return True
+
+    def _drain_events(self):
+        """Read pending events and report whether any concern the watched file"""
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    return relevant
+                raise
+            position = 0
+            while position < len(data):
+                _, _, _, name_length = EVENT_HEADER.unpack_from(data, position)
+                position += EVENT_HEADER.size
+                name = data[position:position + name_length].rstrip(b'\0')
+                position += name_length
+                if name == self.name:
+                    relevant = True
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Fallback watcher that simply sleeps for a short interval"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(min(self.interval, timeout))
+        return True
+
+    def close(self):
+        pass
+
+class LogFollower:
+    """Yield complete lines appended to a log file, following truncation and rotation
+
+    Partial lines are buffered until their newline arrives. ``offset`` is the
+    byte position just past the last line yielded in the current file.
+    """
+
+    def __init__(self, path, offset=0, use_inotify=True, poll_interval=0.05, idle_check_interval=1.0):
+        self.path = path
+        self.offset = offset
+        self.poll_interval = poll_interval
+        # Even with inotify we re-stat the file occasionally in case events were missed
+        self.idle_check_interval = idle_check_interval
+        self.watcher = None
+        if use_inotify:
+            try:
+                self.watcher = InotifyWatcher(path)
+            except OSError:
+                self.watcher = None
+        if self.watcher is None:
+            self.watcher = PollingWatcher(poll_interval)
+
+    def _open(self):
+        """Open the log file, returning None if it does not exist yet"""
+        try:
+            return open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+
+    def _replaced(self, f):
+        """Check whether the path now points at a different file than our handle"""
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        opened = os.fstat(f.fileno())
+        return (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+
+    def follow(self):
+        """Generator yielding complete lines (bytes, newline included) forever"""
+        buffer = b''
+        f = self._open()
+        if f is not None:
+            f.seek(self.offset)
+
+        try:
+            while True:
+                if f is None:
+                    f = self._open()
+                    if f is None:
+                        self.watcher.wait(self.idle_check_interval)
+                        continue
+                    self.offset = 0
+                    buffer = b''
+
+                chunk = f.read(READ_CHUNK_SIZE)
+                if chunk:
+                    buffer += chunk
+                    lines = buffer.split(b'\n')
+                    buffer = lines.pop()
+                    for line in lines:
+                        self.offset += len(line) + 1
+                        yield line + b'\n'
+                    continue
+
+                # No new data: look for truncation or rotation before sleeping
+                if os.fstat(f.fileno()).st_size < self.offset + len(buffer):
+                    f.seek(0)
+                    self.offset = 0
+                    buffer = b''
+                    continue
+
+                if self._replaced(f):
+                    # Everything written before the rename has been drained above
+                    f.close()
+                    f = None
+                    continue
+
+                self.watcher.wait(self.idle_check_interval)
+        finally:
+            if f is not None:
+                f.close()
+
+    def close(self):
+        self.watcher.close()
+
+def _line_start_at_or_after(f, position):
+    """Return the offset of the first line starting at or after position"""
+    if position == 0:
+        return 0
+    f.seek(position - 1)
+    f.readline()
+    return f.tell()
+
+def _aware(timestamp):
+    """Treat a naive timestamp as local time, as the access log writes them, so naive and aware compare"""
+    return timestamp if timestamp.tzinfo is not None else timestamp.astimezone()
+
+def _line_timestamp(f, offset):
+    """Return the timestamp of the first parsable line at or after offset, or None at EOF"""
+    f.seek(offset)
+    for line in f:
+        try:
+            return _aware(datetime.fromisoformat(json.loads(line)['timestamp']))
+        except:
+            continue
+    return None
+
+def find_offset_for_time(path, since):
+    """Binary search a time-ordered JSON log for the first line at or after since"""
+    with open(path, 'rb') as f:
+        low, high = 0, os.fstat(f.fileno()).st_size
+        while low < high:
+            middle = (low + high) // 2
+            timestamp = _line_timestamp(f, _line_start_at_or_after(f, middle))
+            if timestamp is None or timestamp >= since:
+                high = middle
+            else:
+                low = middle + 1
+        return _line_start_at_or_after(f, low)
+
+def resolve_since(path, since):
+    """Turn a --since value (byte offset or ISO timestamp) into a byte offset
+
+    Raises ValueError if since is neither.
+    """
+    if since is None:
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    if since.isdigit():
+        return int(since)
+    since = _aware(datetime.fromisoformat(since))
+    if not os.path.exists(path):
+        return 0
+    return find_offset_for_time(path, since)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Web Server Log Importer
+Turns nginx/Apache combined logs and JSON (nginx json, CDN edge) logs into
+honeypot_access records. Logs are read in large binary chunks and only lines
+containing a honeypot name prefix are located and parsed; everything else is
+discarded without being split into lines or decoded
+"""
+
+import os
+import re
+import json
+import hashlib
+from datetime import datetime, timezone
+
+from parallel_analysis import COMPRESSED_OPENERS
+
+# Bytes read per chunk
+CHUNK_BYTES = 16 * 1024 * 1024
+
+# nginx/Apache "combined" (and "common", which lacks referer and user agent)
+COMBINED_LINE = re.compile(
+    rb'(\S+) \S+ \S+ \[([^\]]+)\] "(?:[A-Z]+ )?([^" ]*)[^"]*" \d{3} \S+'
+    rb'(?: "(?:[^"\\]|\\.)*" "((?:[^"\\]|\\.)*)")?'
+)
+
+# Field names used by common nginx JSON log_format recipes and CDN edge logs
+JSON_FIELDS = {
+    'url': ('request_uri', 'uri', 'url', 'path', 'ClientRequestURI', 'ClientRequestPath', 'cs-uri-stem'),
+    'user_agent': ('http_user_agent', 'user_agent', 'userAgent', 'ClientRequestUserAgent', 'cs(User-Agent)'),
+    'ip_address': ('remote_addr', 'client_ip', 'ip', 'ip_address', 'ClientIP', 'c-ip'),
+    'timestamp': ('time_iso8601', 'timestamp', 'time', '@timestamp', 'EdgeStartTimestamp', 'time_local')
+}
+
+def honeypot_needles(honeypot_pages, prefixes=()):
+    """Byte strings that every line worth parsing must contain"""
+    needles = [page[:-len('.html')].encode() for page in honeypot_pages]
+    needles.extend(prefix.encode() for prefix in prefixes)
+    return needles
+
+def iter_candidate_lines(f, needles, chunk_size=CHUNK_BYTES, partial_tail=True):
+    """Yield the lines of a binary stream that contain any needle, in file order
+
+    Each chunk is searched with bytes.find for every needle and only the lines
+    around the hits are sliced out, so non-matching lines cost a memchr-speed
+    scan and nothing more. With partial_tail=False, text after the last
+    newline is left alone, since a live log may still be writing that line.
+    """
+    carry = b''
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            break
+        data = carry + block if carry else block
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            carry = data
+            continue
+        carry = data[end:]
+        yield from _scan(data, end, needles)
+    if carry and partial_tail:
+        yield from _scan(carry + b'\n', len(carry) + 1, needles)
+
+def _scan(data, end, needles):
+    starts = set()
+    for needle in needles:
+        position = data.find(needle, 0, end)
+        while position != -1:
+            line_start = data.rfind(b'\n', 0, position) + 1
+            starts.add(line_start)
+            # Skip the rest of this line; one hit is enough
+            line_end = data.find(b'\n', position, end)
+            position = data.find(needle, line_end + 1, end)
+    for line_start in sorted(starts):
+        yield data[line_start:data.find(b'\n', line_start, end)]
+
+def log_identity(f, limit=65536):
+    """Digest of a log's first line, or None while it has no complete line; rewinds f"""
+    head = f.read(limit)
+    f.seek(0)
+    end = head.find(b'\n')
+    return hashlib.sha1(head[:end]).hexdigest() if end != -1 else None
+
+class LogImporter:
+    """Convert web server access log lines into honeypot access records"""
+
+    def __init__(self, monitor, prefixes=(), log_format='auto'):
+        if log_format not in ('auto', 'combined', 'json'):
+            raise ValueError(f"Unknown log format: {log_format}")
+        self.monitor = monitor
+        self.prefixes = tuple(prefixes)
+        self.log_format = log_format
+        self.needles = honeypot_needles(monitor.honeypot_pages, self.prefixes)
+        self.timestamps = {}
+        self.lines_read = 0
+        self.bytes_read = 0
+        self.candidates = 0
+
+    def is_wanted(self, path):
+        """Honeypot families plus any configured name prefixes"""
+        if self.monitor.is_honeypot_url(path):
+            return True
+        name = path.rsplit('/', 1)[-1]
+        return any(name.startswith(prefix) or path.startswith(prefix) for prefix in self.prefixes)
+
+    def import_file(self, path, state=None):
+        """Yield honeypot access records from a plain or compressed log file
+
+        With a state dict (log identity -> bytes already imported), only what
+        was appended since the last import of the same log is read, and the
+        dict is updated once the file is done. A log is identified by its
+        first line, so logrotate's renames and compression keep the offset.
+        An unterminated last line of a plain log is left for the next import.
+        """
+        opener = COMPRESSED_OPENERS.get(os.path.splitext(path)[1], open)
+        with opener(path, 'rb') as f:
+            identity = log_identity(f) if state is not None else None
+            offset = state.get(identity, 0) if identity is not None else 0
+            if opener is open and offset > os.fstat(f.fileno()).st_size:
+                # Same first line but shorter: a different log, read it all
+                offset = 0
+            f.seek(offset)
+            reader = _CountingReader(f, self)
+            # Compressed logs are complete, so only a plain log can have a line still being written
+            yield from self._import(reader, partial_tail=opener is not open)
+            if identity is not None:
+                state[identity] = f.tell() - (reader.tail if opener is open else 0)
+
+    def import_stream(self, f):
+        """Yield honeypot access records from a binary stream"""
+        yield from self._import(_CountingReader(f, self))
+
+    def _import(self, reader, partial_tail=True):
+        for line in iter_candidate_lines(reader, self.needles, partial_tail=partial_tail):
+            self.candidates += 1
+            access = self.parse_line(line)
+            if access is not None:
+                yield access
+
+    def parse_line(self, line):
+        """Parse one log line into an access record, or None if it isn't a honeypot hit"""
+        line = line.strip()
+        if line.startswith(b'{') and self.log_format != 'combined':
+            return self._parse_json(line)
+        if self.log_format != 'json':
+            return self._parse_combined(line)
+        return None
+
+    def _parse_combined(self, line):
+        match = COMBINED_LINE.match(line)
+        if match is None:
+            return None
+        ip, raw_time, target, user_agent = match.groups()
+        url = target.decode('utf-8', 'replace').split('?', 1)[0]
+        if not self.is_wanted(url):
+            return None
+        timestamp = self._timestamp(raw_time.decode('ascii', 'replace'))
+        if timestamp is None:
+            return None
+        user_agent = user_agent.decode('utf-8', 'replace').replace('\\"', '"') if user_agent else ''
+        return self._record(timestamp, url, '' if user_agent == '-' else user_agent, ip.decode('ascii', 'replace'))
+
+    def _parse_json(self, line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict):
+            return None
+        fields = {}
+        for field, names in JSON_FIELDS.items():
+            fields[field] = next((entry[name] for name in names if entry.get(name) not in (None, '')), None)
+        url = fields['url']
+        if not isinstance(url, str):
+            return None
+        url = url.split('?', 1)[0]
+        if not self.is_wanted(url):
+            return None
+        timestamp = self._timestamp(fields['timestamp'])
+        if timestamp is None:
+            return None
+        return self._record(timestamp, url, str(fields['user_agent'] or ''), str(fields['ip_address'] or ''))
+
+    def _record(self, timestamp, url, user_agent, ip_address):
+        return {
+            'timestamp': timestamp,
+            'url': url,
+            'user_agent': user_agent,
+            'ip_address': ip_address,
+            'type': 'honeypot_access'
+        }
+
+    def _timestamp(self, value):
+        """Normalize a log timestamp to the local naive ISO format log_access writes"""
+        if value is None:
+            return None
+        key = value if isinstance(value, str) else repr(value)
+        cached = self.timestamps.get(key)
+        if cached is None:
+            cached = parse_timestamp(value)
+            if len(self.timestamps) > 100000:
+                self.timestamps.clear()
+            self.timestamps[key] = cached
+        return cached
+
+def parse_timestamp(value):
+    """Parse combined-log, ISO 8601 or epoch (s/ms/ns) timestamps; None if unparseable"""
+    try:
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace('.', '', 1).isdigit()):
+            seconds = float(value)
+            # Epoch milliseconds / microseconds / nanoseconds
+            while seconds > 1e11:
+                seconds /= 1000
+            moment = datetime.fromtimestamp(seconds, timezone.utc)
+        elif '/' in value:
+            moment = datetime.strptime(value, '%d/%b/%Y:%H:%M:%S %z')
+        else:
+            moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
+class _CountingReader:
+    """Wrap a binary stream to count bytes and lines as chunks are read
+
+    ``tail`` is the number of bytes read since the last newline.
+    """
+
+    def __init__(self, f, importer):
+        self.f = f
+        self.importer = importer
+        self.tail = 0
+
+    def read(self, size):
+        block = self.f.read(size)
+        self.importer.bytes_read += len(block)
+        self.importer.lines_read += block.count(b'\n')
+        newline = block.rfind(b'\n')
+        self.tail = self.tail + len(block) if newline == -1 else len(block) - newline - 1
+        return block
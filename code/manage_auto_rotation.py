@@ -6,14 +6,20 @@ Control and monitor the automated rotation system
 
 import os
 import sys
+import time
 import subprocess
 import json
 from datetime import datetime
+from timing_metrics import run_main
+from push_queue import PushQueue
+from scheduler_daemon import DEFAULT_SOCKET, send_command, daemon_running
 
 class AutoRotationManager:
     def __init__(self):
         self.log_file = 'logs/auto_rotation.log'
         self.cron_log_file = 'logs/cron.log'
+        self.scheduler_log_file = 'logs/scheduler.log'
+        self.socket_path = DEFAULT_SOCKET
         
     def check_cron_status(self):
         """Check if cron job is installed"""
@@ -114,13 +120,69 @@ class AutoRotationManager:
         except Exception as e:
             print(f"❌ Error running test rotation: {e}")
     
+    def start_daemon(self):
+        """Start the scheduler daemon in the background"""
+        if daemon_running(self.socket_path):
+            print("✅ Scheduler daemon is already running")
+            return True
+        os.makedirs('logs', exist_ok=True)
+        with open(self.scheduler_log_file, 'a') as log:
+            subprocess.Popen([sys.executable, os.path.join('code', 'scheduler_daemon.py'), 'serve'],
+                             stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                             start_new_session=True)
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            if daemon_running(self.socket_path):
+                print(f"✅ Scheduler daemon started (log: {self.scheduler_log_file})")
+                return True
+            time.sleep(0.1)
+        print(f"❌ Scheduler daemon did not start, see {self.scheduler_log_file}")
+        return False
+    
+    def stop_daemon(self):
+        """Ask the scheduler daemon to stop once running jobs finish"""
+        try:
+            send_command('stop', self.socket_path)
+        except OSError:
+            print("❌ Scheduler daemon is not running")
+            return False
+        while daemon_running(self.socket_path):
+            time.sleep(0.2)
+        print("✅ Scheduler daemon stopped")
+        return True
+    
+    def run_daemon_job(self, job):
+        """Run a scheduler job now"""
+        try:
+            reply = send_command('run', self.socket_path, job=job)
+        except OSError:
+            print("❌ Scheduler daemon is not running")
+            return False
+        print(f"✅ Started {job}" if reply['ok'] else f"❌ {reply['error']}")
+        return reply['ok']
+    
+    def check_daemon_status(self):
+        """Print the scheduler daemon's jobs; returns False if it isn't running"""
+        try:
+            reply = send_command('status', self.socket_path)
+        except (OSError, ValueError):
+            print("❌ Scheduler daemon is not running")
+            return False
+        print(f"✅ Scheduler daemon running (pid {reply['pid']}, since {reply['started']})")
+        for job in reply['jobs']:
+            last = f"{job['last_status']} at {job['last_run']} ({job['last_duration_seconds']}s)" if job['last_run'] else 'never run'
+            print(f"   {job['job']:<11} {job['state']:<9} every {job['interval_seconds']}s, "
+                  f"next {job['next_run'] or '-'}, last {last}")
+        return True
+    
     def show_status(self):
         """Show overall status of the automated system"""
         print("🤖 Automated Honeypot Rotation Status")
         print("=" * 50)
         
-        # Check cron status
-        cron_active = self.check_cron_status()
+        # The scheduler daemon replaces cron; only fall back to crontab when it isn't running
+        daemon_active = self.check_daemon_status()
+        cron_active = daemon_active or self.check_cron_status()
         
         # Check log files
         log_files_exist = os.path.exists(self.log_file) and os.path.exists(self.cron_log_file)
@@ -128,24 +190,36 @@ class AutoRotationManager:
         # Check if honeypot files exist
         honeypot_files_exist = os.path.exists('a-6hp.html') and os.path.exists('a-7sm.html')
         
-        print(f"Cron Job Active: {'✅ Yes' if cron_active else '❌ No'}")
+        print(f"Scheduler Active: {'✅ Yes' if daemon_active else '❌ No'}")
+        if not daemon_active:
+            print(f"Cron Job Active: {'✅ Yes' if cron_active else '❌ No'}")
         print(f"Log Files Exist: {'✅ Yes' if log_files_exist else '❌ No'}")
         print(f"Honeypot Files Exist: {'✅ Yes' if honeypot_files_exist else '❌ No'}")
         
-        if cron_active and log_files_exist:
+        # Rotation commits waiting to be pushed
+        push_queue = PushQueue()
+        print(f"Push Queue: {'✅ ' if not push_queue.depth() else '⏳ '}{push_queue.describe()}")
+        
+        if daemon_active:
+            print("\n🎯 System Status: ACTIVE")
+            print("   The scheduler daemon is running the rotation jobs")
+        elif cron_active and log_files_exist:
             print("\n🎯 System Status: ACTIVE")
             print("   The automated rotation is running every 30 minutes")
         else:
             print("\n🎯 System Status: INACTIVE")
-            print("   Run 'install' to activate the automated system")
+            print("   Run 'start' to start the scheduler daemon")
 
 def main():
     manager = AutoRotationManager()
     
     if len(sys.argv) < 2:
-        print("Usage: python manage_auto_rotation.py [command]")
+        print("Usage: python manage_auto_rotation.py [command] [--profile]")
         print("Commands:")
         print("  status     - Show system status")
+        print("  start      - Start the scheduler daemon (rotation, pushes, analysis, compaction)")
+        print("  stop       - Stop the scheduler daemon")
+        print("  run JOB    - Run a scheduler job now (rotation, push, analysis, compaction)")
         print("  install    - Install cron job")
         print("  remove     - Remove cron job")
         print("  logs       - Show recent logs")
@@ -156,6 +230,12 @@ def main():
     
     if command == 'status':
         manager.show_status()
+    elif command == 'start':
+        manager.start_daemon()
+    elif command == 'stop':
+        manager.stop_daemon()
+    elif command == 'run' and len(sys.argv) > 2:
+        manager.run_daemon_job(sys.argv[2])
     elif command == 'install':
         manager.install_cron_job()
     elif command == 'remove':
@@ -169,4 +249,4 @@ def main():
         print(f"Unknown command: {command}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    run_main(main) 
\ No newline at end of file
@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+"""
+Page Pipeline
+Applies every registered HTML transform to a page in one read, one scan and
+at most one write: Google Analytics injection, honeypot link rewriting,
+script-only honeypot links, responsive article images and canonical/meta tags, configured by the "transforms" section of
+code/site_manifest.json. Pages are processed in a process pool, and a cache
+in logs/page_pipeline_cache.json records for each file its stat, its content
+hash and a key over the transforms' versions, settings and inputs, so a page
+that hasn't changed since it was last processed is skipped on a stat alone.
+
+With "precompress" configured, each page is then minified (code/html_minifier.py)
+into .gz and, if the brotli package is installed, .br siblings that
+honeypot_server.py sends to clients accepting those encodings. The pages
+themselves stay readable: they are templates for the decoy generator and
+are edited by hand
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import gzip
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from html_minifier import minify_html
+from image_pipeline import FORMAT_EXTENSIONS, variant_name
+from site_builder import (SiteBuilder, content_digest, iter_directory_pages, js_links, load_manifest, script_links_edit,
+                          write_atomic)
+from timing_metrics import run_main
+
+CACHE_FILE = 'logs/page_pipeline_cache.json'
+
+# Pages per pool task; small runs are processed in-process
+CHUNK_PAGES = 1000
+
+# Precompressed siblings, by content encoding
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# One scan finds everything the transforms edit: the head, its meta and link
+# tags, and every other href value. Case-sensitive: the site's markup is
+# lowercase, and an IGNORECASE scan is several times slower
+TOKENS = re.compile(r'<(?P<tag>head|/head|meta|link)\b[^>]*>|href=["\'](?P<href>[^"\']*)')
+META_NAME = re.compile(r'\bname=["\']([^"\']+)["\']')
+CANONICAL = re.compile(r'\brel=["\']canonical["\']')
+
+GA_SNIPPET = '''    <!-- Google tag (gtag.js) -->
+    <script async src="https://www.googletagmanager.com/gtag/js?id={measurement_id}"></script>
+    <script>
+      window.dataLayer = window.dataLayer || [];
+      function gtag(){{dataLayer.push(arguments);}}
+      gtag('js', new Date());
+
+      gtag('config', '{measurement_id}');
+    </script>'''
+
+# An article image slot, as the templates write it (an inline background) or as
+# ResponsiveImageTransform leaves it (the image in data-image, then its <picture>)
+IMAGE_SLOT = re.compile(r'<div class="article-image" (?:style="background-image: url\(\'(?P<url>[^\']+)\'\);"'
+                        r'|data-image="(?P<image>[^"]+)" style="[^"]*")>(?:\n[ \t]*<picture>.*?</picture>)?', re.DOTALL)
+IMAGE_SLOT_STYLE = 'position: relative; z-index: 0;'
+# The picture covers the div like the background did, under the div's own content
+PICTURE_IMG_STYLE = 'position: absolute; top: 0; left: 0; z-index: -1; width: 100%; height: 100%; object-fit: cover;'
+DEFAULT_IMAGE_SIZES = '(max-width: 440px) calc(100vw - 40px), 400px'
+
+class ParsedPage:
+    """A page scanned once for the spans transforms care about, plus the edits they queue"""
+
+    def __init__(self, path, content, links=True):
+        self.path = path
+        self.content = content
+        self.head_start = None
+        self.head_end = None
+        self.meta = {}
+        self.canonical = None
+        self.hrefs = []
+        end = len(content)
+        if not links:
+            # Nobody rewrites this page's links, so only the head needs scanning
+            head_end = content.find('</head>')
+            end = end if head_end == -1 else head_end + len('</head>')
+        for match in TOKENS.finditer(content, 0, end):
+            tag = match.group('tag')
+            if tag is None:
+                self.hrefs.append((match.start('href'), match.end('href'), match.group('href')))
+            elif tag == 'head':
+                self.head_start = self.head_start or match.end()
+            elif tag == '/head':
+                self.head_end = self.head_end or match.start()
+            elif tag == 'meta':
+                name = META_NAME.search(match.group(0))
+                if name is not None:
+                    self.meta.setdefault(name.group(1), (match.start(), match.end(), match.group(0)))
+            elif self.canonical is None and CANONICAL.search(match.group(0)):
+                self.canonical = (match.start(), match.end(), match.group(0))
+        self.edits = []
+
+    def replace(self, start, end, text):
+        self.edits.append((start, end, len(self.edits), text))
+
+    def insert(self, position, text):
+        self.replace(position, position, text)
+
+    def render(self):
+        """The content with every queued edit applied, in position order"""
+        pieces = []
+        position = 0
+        for start, end, _, text in sorted(self.edits):
+            pieces.append(self.content[position:start])
+            pieces.append(text)
+            position = max(position, end)
+        pieces.append(self.content[position:])
+        return ''.join(pieces)
+
+class Transform:
+    """Base class: bump ``version`` whenever apply() changes what it writes"""
+
+    name = None
+    version = 1
+
+    def __init__(self, settings, context):
+        self.settings = settings
+        self.context = context
+
+    def key(self, path):
+        """Everything besides the page content that apply() depends on for this page"""
+        return None
+
+    def reads_links(self, path):
+        """Whether apply() looks at hrefs outside <head> on this page"""
+        return False
+
+    def apply(self, page):
+        raise NotImplementedError
+
+class AnalyticsTransform(Transform):
+    """Insert the Google tag after the viewport meta tag (or at the top of <head>) if it is missing"""
+
+    name = 'analytics'
+
+    def apply(self, page):
+        measurement_id = self.settings['measurement_id']
+        if measurement_id in page.content or page.head_start is None:
+            return
+        viewport = page.meta.get('viewport')
+        page.insert(viewport[1] if viewport else page.head_start, '\n' + GA_SNIPPET.format(measurement_id=measurement_id))
+
+def href_pattern(honeypots):
+    """site_builder.slot_pattern for a bare href value: any generation of the given honeypots"""
+    stems = '|'.join(re.escape(name[:-len('.html')]) for name in sorted(honeypots))
+    return re.compile(r'(?P<stem>' + stems + r')(?:-[A-Za-z0-9]+)?\.html(?=$|[#?])')
+
+class HoneypotLinkTransform(Transform):
+    """Point honeypot link slots at each honeypot's current name"""
+
+    name = 'honeypot_links'
+
+    def __init__(self, settings, context):
+        super().__init__(settings, context)
+        self.linking_pages = context['linking_pages']
+        self.current_urls = context['current_urls']
+        self.patterns = {}
+
+    def key(self, path):
+        links = self.linking_pages.get(path)
+        if not links:
+            return None
+        return [[name, self.current_urls.get(name, name)] for name in sorted(links)]
+
+    def reads_links(self, path):
+        return path in self.linking_pages
+
+    def apply(self, page):
+        links = self.linking_pages.get(page.path)
+        if not links:
+            return
+        key = tuple(sorted(links))
+        if key not in self.patterns:
+            self.patterns[key] = href_pattern(links)
+        pattern = self.patterns[key]
+        for start, _, href in page.hrefs:
+            match = pattern.match(href)
+            if match is not None:
+                slot = match.group('stem') + '.html'
+                target = self.current_urls.get(slot, slot)
+                if target != match.group(0):
+                    page.replace(start, start + match.end(), target)
+
+class ScriptLinkTransform(Transform):
+    """Keep the script block that links a page's js-channel honeypots under their current names"""
+
+    name = 'script_links'
+
+    def __init__(self, settings, context):
+        super().__init__(settings, context)
+        self.script_links = context['script_links']
+
+    def key(self, path):
+        return self.script_links.get(path)
+
+    def apply(self, page):
+        links = self.script_links.get(page.path)
+        if not links:
+            return
+        edit = script_links_edit(page.content, links)
+        if edit is not None:
+            page.replace(*edit)
+
+class ResponsiveImageTransform(Transform):
+    """Turn article image backgrounds into a <picture> over every configured width and format
+
+    A CSS background is always fetched at full width; the picture lets the
+    browser pick the smallest variant that fills the slot. The image stays in
+    a data-image attribute, which the decoy templates read.
+    """
+
+    name = 'responsive_images'
+
+    def __init__(self, settings, context):
+        # The images configuration is part of the settings so the cache key covers it
+        super().__init__({**settings, 'images': context['images']}, context)
+        images = context['images']
+        self.directory = images['directory']
+        self.names = set(images['names'])
+        self.full_width = images['size'][0]
+        self.widths = sorted(set(images.get('widths', [self.full_width])) | {self.full_width})
+        self.formats = images.get('formats', ['jpeg', 'webp'])
+        self.sizes = settings.get('sizes', DEFAULT_IMAGE_SIZES)
+
+    def picture(self, image):
+        """<picture> markup for an image path, or None if it isn't one of the pipeline's images"""
+        prefix, _, filename = image.rpartition('/')
+        name, extension = os.path.splitext(filename)
+        if prefix.rsplit('/', 1)[-1] != self.directory or name not in self.names:
+            return None
+        formats = {FORMAT_EXTENSIONS[image_format]: image_format for image_format in self.formats}
+        if extension not in formats:
+            return None
+
+        def srcset(variant_extension):
+            return ', '.join(f'{prefix}/{variant_name(name, width, self.full_width, variant_extension)} {width}w'
+                             for width in self.widths)
+        sources = ''.join(f'<source type="image/{image_format}" srcset="{srcset(variant_extension)}" sizes="{self.sizes}">'
+                          for variant_extension, image_format in formats.items() if variant_extension != extension)
+        return (f'<picture>{sources}<img src="{image}" srcset="{srcset(extension)}" sizes="{self.sizes}" alt="" '
+                f'style="{PICTURE_IMG_STYLE}"></picture>')
+
+    def apply(self, page):
+        content = page.content
+        if 'class="article-image"' not in content:
+            return
+        for match in IMAGE_SLOT.finditer(content):
+            image = match.group('url') or match.group('image')
+            picture = self.picture(image)
+            if picture is None:
+                continue
+            indent = content[content.rfind('\n', 0, match.start()) + 1:match.start()]
+            text = (f'<div class="article-image" data-image="{image}" style="{IMAGE_SLOT_STYLE}">\n'
+                    f'{indent if indent.isspace() else ""}    {picture}')
+            if text != match.group(0):
+                page.replace(match.start(), match.end(), text)
+
+class MetaTransform(Transform):
+    """Keep a canonical link and the configured <meta name=...> tags in <head>"""
+
+    name = 'meta'
+
+    def __init__(self, settings, context):
+        super().__init__(settings, context)
+        self.base_url = context['base_url']
+        self.honeypot_stems = tuple(name[:-len('.html')] for name in context['honeypots'])
+
+    def canonical_url(self, path):
+        # Honeypot names change every rotation, so they never get a canonical URL
+        if '/' not in path and path.startswith(self.honeypot_stems):
+            return None
+        return self.base_url + ('' if path == 'index.html' else path)
+
+    def apply(self, page):
+        if page.head_end is None:
+            return
+        tags = []
+        if self.settings.get('canonical', True):
+            url = self.canonical_url(page.path)
+            if url is not None:
+                tags.append((page.canonical, f'<link rel="canonical" href="{url}">'))
+        for name, value in sorted(self.settings.get('meta', {}).items()):
+            tags.append((page.meta.get(name), f'<meta name="{name}" content="{value}">'))
+        for existing, tag in tags:
+            if existing is None:
+                page.insert(page.head_end, f'    {tag}\n')
+            elif existing[2] != tag:
+                page.replace(existing[0], existing[1], tag)
+
+# Applied in this order; a transform is enabled by its section in the manifest
+TRANSFORMS = [AnalyticsTransform, HoneypotLinkTransform, ScriptLinkTransform, ResponsiveImageTransform, MetaTransform]
+
+class Precompressor:
+    """Write the minified page as a .gz sibling, and a .br sibling when brotli is installed"""
+
+    # Bump when minification changes what it writes
+    version = 1
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.encodings = ['gzip']
+        if brotli is not None and settings.get('brotli', True):
+            self.encodings.append('br')
+
+    def identity(self):
+        return [self.version, self.settings, self.encodings]
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            # Quality 11 is about 100x slower for 15% smaller pages; 5 beats gzip -9 at gzip's speed
+            return brotli.compress(data, quality=self.settings.get('brotli_quality', 5))
+        # mtime=0 keeps the output byte-identical for identical input
+        return gzip.compress(data, self.settings.get('gzip_level', 9), mtime=0)
+
+    def write(self, full_path, content):
+        """Write changed siblings; returns [page bytes, minified bytes, gzip bytes, br bytes or None]"""
+        data = content.encode('utf-8')
+        minified = minify_html(content).encode('utf-8') if self.settings.get('minify', True) else data
+        sizes = {}
+        for encoding in self.encodings:
+            compressed = self.compress(minified, encoding)
+            sizes[encoding] = len(compressed)
+            write_if_changed(full_path + PRECOMPRESSED_SUFFIXES[encoding], compressed)
+        return [len(data), len(minified), sizes['gzip'], sizes.get('br')]
+
+    def stale(self, full_path):
+        """Whether a sibling is older than its page, so the server would ignore it
+
+        Missing siblings don't count: they are build outputs that aren't checked in.
+        """
+        page_mtime = os.stat(full_path).st_mtime_ns
+        for encoding in self.encodings:
+            try:
+                if os.stat(full_path + PRECOMPRESSED_SUFFIXES[encoding]).st_mtime_ns < page_mtime:
+                    return True
+            except FileNotFoundError:
+                continue
+        return False
+
+    def touch(self, full_path):
+        """Bring the siblings' mtimes up to the page's; False if one is missing"""
+        for encoding in self.encodings:
+            try:
+                os.utime(full_path + PRECOMPRESSED_SUFFIXES[encoding])
+            except FileNotFoundError:
+                return False
+        return True
+
+def write_if_changed(path, data):
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                # The server only trusts siblings at least as new as their page
+                os.utime(path)
+                return False
+    except FileNotFoundError:
+        pass
+    write_atomic(path, data)
+    return True
+
+def remove_precompressed(full_path):
+    """Delete a page's precompressed siblings, if any"""
+    for suffix in PRECOMPRESSED_SUFFIXES.values():
+        try:
+            os.remove(full_path + suffix)
+        except FileNotFoundError:
+            pass
+
+class TransformChain:
+    """The manifest's enabled transforms, applied to a page in order, and the optional precompressor"""
+
+    def __init__(self, settings, context):
+        self.transforms = [transform(settings[transform.name], context) for transform in TRANSFORMS
+                           if transform.name in settings and settings[transform.name].get('enabled', True)]
+        precompress = settings.get('precompress', {'enabled': False})
+        self.precompressor = Precompressor(precompress) if precompress.get('enabled', True) else None
+        # Most pages have no per-page inputs, so their key is computed once
+        self.default_key = self.digest([None] * len(self.transforms))
+
+    def digest(self, page_keys):
+        return content_digest(json.dumps([[transform.name, transform.version, transform.settings, page_key]
+                                          for transform, page_key in zip(self.transforms, page_keys)]
+                                         + [self.precompressor and self.precompressor.identity()],
+                                         sort_keys=True))
+
+    def key(self, path):
+        """Digest of every transform's version, settings and inputs for this page"""
+        page_keys = [transform.key(path) for transform in self.transforms]
+        if not any(page_key is not None for page_key in page_keys):
+            return self.default_key
+        return self.digest(page_keys)
+
+    def reads_links(self, path):
+        return any(transform.reads_links(path) for transform in self.transforms)
+
+    def apply(self, page):
+        for transform in self.transforms:
+            transform.apply(page)
+
+def process_chunk(task):
+    """Transform (and precompress) a chunk of pages
+
+    Returns [(path, cache entry, changed)]; in a dry run the entry is None,
+    since nothing was written, and changed also covers stale siblings.
+    """
+    settings, context, root, pages, dry_run = task
+    chain = TransformChain(settings, context)
+    results = []
+    for path, cached in pages:
+        full_path = os.path.join(root, path)
+        with open(full_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        digest = content_digest(content)
+        key = chain.key(path)
+        stale = dry_run and chain.precompressor is not None and chain.precompressor.stale(full_path)
+        if (cached is not None and cached[2] == digest and cached[3] == key
+                and (dry_run or chain.precompressor is None or chain.precompressor.touch(full_path))):
+            # Touched but not changed since it was last processed
+            stat = os.stat(full_path)
+            results.append((path, None if dry_run else [stat.st_mtime_ns, stat.st_size, digest, key, cached[4]], stale))
+            continue
+        page = ParsedPage(path, content, chain.reads_links(path))
+        chain.apply(page)
+        output = page.render() if page.edits else content
+        if dry_run:
+            # Without a cache entry (a fresh clone) this is the whole check: the
+            # transforms' output against the page, and the siblings' mtimes
+            results.append((path, None, output != content or stale))
+            continue
+        stat = write_atomic(full_path, output) if output != content else os.stat(full_path)
+        sizes = chain.precompressor.write(full_path, output) if chain.precompressor else None
+        results.append((path, [stat.st_mtime_ns, stat.st_size, content_digest(output), key, sizes], output != content))
+    return results
+
+class PagePipeline:
+    """Run the manifest's transforms over the site's pages"""
+
+    def __init__(self, current_urls, root='.', manifest=None):
+        manifest = manifest or load_manifest()
+        self.root = root
+        self.settings = manifest.get('transforms', {})
+        self.cache_file = os.path.join(root, CACHE_FILE)
+        self.context = {
+            'base_url': manifest['base_url'],
+            'honeypots': sorted(manifest['honeypots']),
+            'linking_pages': {page['path']: page['honeypot_links'] for page in manifest['pages']
+                              if page.get('honeypot_links')},
+            'current_urls': current_urls,
+            'images': {key: manifest['images'][key] for key in ('directory', 'size', 'widths', 'formats')
+                       if key in manifest['images']}
+        }
+        self.context['images']['names'] = [entry['name'] for entry in manifest['images']['images']]
+        script_links = {path: js_links(manifest['honeypots'], links, current_urls)
+                        for path, links in self.context['linking_pages'].items()}
+        self.context['script_links'] = {path: links for path, links in script_links.items() if links}
+        self.chain = TransformChain(self.settings, self.context)
+
+    def top_level_pages(self):
+        """Pages in the site root, rotated honeypots included"""
+        return sorted(entry.name for entry in os.scandir(self.root) if entry.name.endswith('.html') and entry.is_file())
+
+    def pages(self):
+        """Top-level pages and pages under the configured directories"""
+        yield from self.top_level_pages()
+        for directory in self.settings.get('directories', []):
+            yield from iter_directory_pages(self.root, directory)
+
+    def load_cache(self):
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def prune_precompressed(self, pages, directories=(), dry_run=False):
+        """Delete precompressed siblings of pages that are gone (rotated away or removed)
+
+        pages must list every live page in the site root and the given
+        directories. The site root is always checked; directories only when
+        given, since walking them costs as much as a full run's page listing.
+        """
+        suffixes = tuple('.html' + suffix for suffix in PRECOMPRESSED_SUFFIXES.values())
+        siblings = [entry.name for entry in os.scandir(self.root) if entry.name.endswith(suffixes)]
+        for directory in directories:
+            siblings += iter_directory_pages(self.root, directory, suffixes)
+        removed = [path for path in siblings if path.rsplit('.', 1)[0] not in pages]
+        if not dry_run:
+            for path in removed:
+                os.remove(os.path.join(self.root, path))
+        return removed
+
+    def run(self, paths=None, dry_run=False, workers=None):
+        """Transform and precompress pages that changed (or whose transform inputs changed)
+
+        Returns the pages whose HTML changed (in a dry run, also those whose
+        precompressed siblings are stale); the number of pages processed is
+        left in self.processed.
+        """
+        cache = self.load_cache()
+        full_run = paths is None
+        if full_run:
+            paths = list(self.pages())
+        pending = []
+        for path in paths:
+            cached = cache.get(path)
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except FileNotFoundError:
+                continue
+            if (cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size
+                    and cached[3] == self.chain.key(path)):
+                continue
+            pending.append((path, cached))
+        self.processed = len(pending)
+
+        chunks = [pending[start:start + CHUNK_PAGES] for start in range(0, len(pending), CHUNK_PAGES)]
+        tasks = [(self.settings, self.context, self.root, chunk, dry_run) for chunk in chunks]
+        workers = workers or self.settings.get('workers') or os.cpu_count() or 1
+        if workers <= 1 or len(tasks) <= 1:
+            results = [process_chunk(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(process_chunk, tasks))
+
+        changed = []
+        for chunk_results in results:
+            for path, entry, was_changed in chunk_results:
+                if was_changed:
+                    changed.append(path)
+                if entry is not None:
+                    cache[path] = entry
+        if full_run:
+            self.pruned = self.prune_precompressed(set(paths), self.settings.get('directories', []), dry_run)
+        else:
+            self.pruned = self.prune_precompressed(set(self.top_level_pages()), dry_run=dry_run)
+        if dry_run:
+            return changed
+        if full_run:
+            # Forget pages that are gone
+            live = set(paths)
+            cache = {path: entry for path, entry in cache.items() if path in live}
+        if pending or full_run:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            write_atomic(self.cache_file, json.dumps(cache, separators=(',', ':')))
+        return changed
+
+    def sizes(self, prefix=None):
+        """Site path -> [page, minified, gzip, br] bytes from the last run, for the size report"""
+        return {path: entry[4] for path, entry in sorted(self.load_cache().items())
+                if len(entry) > 4 and entry[4] is not None
+                and (path.startswith(prefix) if prefix is not None else '/' not in path)}
+
+def format_size(size):
+    return f"{size:>12,}" if size is not None else f"{'-':>12}"
+
+def print_sizes(pipeline, prefix=None):
+    """Page, minified and precompressed size of each page, with totals per directory"""
+    sizes = pipeline.sizes(prefix)
+    print(f"{'page':<32}{'html':>12}{'minified':>12}{'gzip':>12}{'br':>12}")
+    for path, row in sizes.items():
+        print(f"{path:<32}" + ''.join(format_size(size) for size in row))
+    groups = {'total': list(sizes.values())}
+    if prefix is None:
+        all_sizes = pipeline.sizes('')
+        for directory in pipeline.settings.get('directories', []):
+            groups[f'{directory}/ ({sum(path.startswith(directory + "/") for path in all_sizes):,} pages)'] = [
+                row for path, row in all_sizes.items() if path.startswith(directory + '/')]
+    for label, rows in groups.items():
+        if not rows:
+            continue
+        totals = [sum(row[column] or 0 for row in rows) if any(row[column] is not None for row in rows) else None
+                  for column in range(4)]
+        print(f"{label:<32}" + ''.join(format_size(size) for size in totals)
+              + f"  ({100 * (totals[0] - min(size for size in totals if size)) / totals[0]:.0f}% saved)")
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ('run', 'check', 'report'):
+        print("Usage: python page_pipeline.py [run|check|report] [--workers N] [PREFIX] [--profile]")
+        print("  run: Apply analytics, honeypot link, responsive image and canonical/meta transforms and precompress every page that needs it")
+        print("  check: List the pages a run would change (exit status 1 if any; missing .gz/.br siblings don't count)")
+        print("  report: Page, minified, gzip and brotli sizes of top-level pages (or pages under PREFIX)")
+        return
+
+    builder = SiteBuilder()
+    current_urls, _ = builder.link_targets()
+    pipeline = PagePipeline(current_urls, manifest=builder.manifest)
+    if args[0] == 'report':
+        print_sizes(pipeline, args[1] if len(args) > 1 else None)
+        if pipeline.chain.precompressor is not None and 'br' not in pipeline.chain.precompressor.encodings:
+            print("Note: brotli is not installed, so only .gz siblings are written (pip install brotli)")
+        return
+
+    workers = int(args[args.index('--workers') + 1]) if '--workers' in args else None
+    start = time.perf_counter()
+    changed = pipeline.run(dry_run=args[0] == 'check', workers=workers)
+    elapsed = time.perf_counter() - start
+    verb = 'Would update' if args[0] == 'check' else 'Updated'
+    for path in changed[:20]:
+        print(f"{verb} {path}")
+    if len(changed) > 20:
+        print(f"... and {len(changed) - 20} more")
+    for path in pipeline.pruned:
+        print(f"{'Would remove' if args[0] == 'check' else 'Removed'} {path}")
+    print(f"{len(changed)} pages changed, {pipeline.processed} processed in {elapsed:.2f}s")
+    # Processed only means a page had no cache entry or was touched; a fresh
+    # clone has no cache, so only real changes fail the check
+    if args[0] == 'check' and (changed or pipeline.pruned):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    run_main(main)
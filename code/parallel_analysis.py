@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Parallel Access Log Analysis
+Splits plain access logs into newline-aligned byte ranges (compressed logs are
+handled one file per task), aggregates each part in a process pool and merges
+the partial aggregates in file/offset order. Workers send back the compact
+AccessAggregator.to_partial form, so the transfer stays small next to the
+parsing it parallelizes
+"""
+
+import os
+import bz2
+import gzip
+import lzma
+from concurrent.futures import ProcessPoolExecutor
+
+from honeypot_monitor import AccessAggregator, parse_accesses, classify_accesses
+from rotation_index import attribute_rotations, load_rotation_index
+from signed_urls import get_default_signer
+
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open
+}
+
+# Don't bother splitting files into ranges smaller than this
+MIN_RANGE_BYTES = 8 * 1024 * 1024
+
+# Ranges per worker, so a slow range doesn't leave the other workers idle
+RANGES_PER_WORKER = 4
+
+def is_compressed(path):
+    return os.path.splitext(path)[1] in COMPRESSED_OPENERS
+
+def _next_line_start(f, position):
+    """Return the offset of the first line starting at or after position"""
+    if position == 0:
+        return 0
+    f.seek(position - 1)
+    f.readline()
+    return f.tell()
+
+def split_ranges(path, parts):
+    """Split a plain file into up to `parts` newline-aligned (start, end) byte ranges"""
+    size = os.path.getsize(path)
+    parts = max(1, min(parts, size // MIN_RANGE_BYTES))
+    with open(path, 'rb') as f:
+        boundaries = sorted(set(_next_line_start(f, size * i // parts) for i in range(parts)))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+def plan_tasks(paths, workers):
+    """Build the ordered list of (path, start, end) tasks; compressed files get end=None"""
+    tasks = []
+    for path in paths:
+        if is_compressed(path):
+            tasks.append((path, 0, None))
+        else:
+            for start, end in split_ranges(path, workers * RANGES_PER_WORKER):
+                tasks.append((path, start, end))
+    return tasks
+
+def iter_range_lines(path, start, end):
+    """Yield the lines of a plain file that start inside [start, end)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            if position >= end:
+                break
+            position += len(line)
+            yield line
+
+def iter_compressed_lines(path):
+    """Yield every line of a compressed log file"""
+    opener = COMPRESSED_OPENERS[os.path.splitext(path)[1]]
+    with opener(path, 'rb') as f:
+        for line in f:
+            yield line
+
+def aggregate_task(task, approximate=False, rate_rules=None, rotations_log=None):
+    """Aggregate one task's lines"""
+    path, start, end = task
+    lines = iter_compressed_lines(path) if end is None else iter_range_lines(path, start, end)
+    # The index is cached per process, so each worker loads the rotation log once
+    rotation_index = load_rotation_index(rotations_log) if rotations_log else None
+    aggregator = AccessAggregator(approximate, rate_rules)
+    return aggregator.consume(attribute_rotations(classify_accesses(parse_accesses(lines)), rotation_index,
+                                                  get_default_signer()))
+
+def analyze_task(task, approximate=False, rate_rules=None, rotations_log=None):
+    """Aggregate one task inside a worker process and return its compact partial"""
+    return aggregate_task(task, approximate, rate_rules, rotations_log).to_partial()
+
+def analyze_files(paths, workers=1, approximate=False, rate_rules=None, rotations_log=None):
+    """Analyze plain and compressed access logs with a process pool and merge the results"""
+    tasks = plan_tasks([path for path in paths if os.path.exists(path)], workers)
+    merged = AccessAggregator(approximate, rate_rules)
+
+    if workers <= 1:
+        for task in tasks:
+            merged.merge(aggregate_task(task, approximate, rate_rules, rotations_log))
+        return merged
+
+    # map() yields results in task order, so the merge is deterministic
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        partials = executor.map(analyze_task, tasks, [approximate] * len(tasks), [rate_rules] * len(tasks),
+                                [rotations_log] * len(tasks))
+        for partial in partials:
+            merged.merge_partial(partial)
+    return merged
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Push Queue
+Small on-disk queue of rotation commits that have not reached the remote yet.
+Pushes are coalesced (one push sends every queued commit), retried with
+exponential backoff and jitter, and queued commits can optionally be squashed
+into one before they are pushed
+"""
+
+import os
+import json
+import time
+import random
+from datetime import datetime
+
+from git_pipeline import GitError
+
+DEFAULT_QUEUE_FILE = 'logs/push_queue.json'
+
+class PushQueue:
+    """Pending rotation commits plus the retry state for pushing them
+
+    ``squash_after`` squashes the queue into a single commit once that many
+    commits are waiting (0 never squashes). Only commits that sit directly on
+    top of each other at HEAD are squashed, so work committed by hand is never
+    folded in.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_FILE, base_delay=60, max_delay=6 * 3600, squash_after=0):
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.squash_after = squash_after
+        self.pending = []
+        self.attempts = 0
+        self.next_attempt = None
+        self.last_error = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.pending = state.get('pending', [])
+        self.attempts = state.get('attempts', 0)
+        self.next_attempt = state.get('next_attempt')
+        self.last_error = state.get('last_error')
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_file = self.path + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({
+                'pending': self.pending,
+                'attempts': self.attempts,
+                'next_attempt': self.next_attempt,
+                'last_error': self.last_error
+            }, f, indent=2)
+        os.replace(temp_file, self.path)
+
+    def enqueue(self, commit, message=''):
+        self.pending.append({'commit': commit, 'message': message, 'queued_at': time.time()})
+        self.save()
+
+    def depth(self):
+        return len(self.pending)
+
+    def oldest_age(self, now=None):
+        """Seconds since the oldest pending commit was queued, or None"""
+        if not self.pending:
+            return None
+        return (now or time.time()) - self.pending[0]['queued_at']
+
+    def ready(self, now=None):
+        return self.next_attempt is None or (now or time.time()) >= self.next_attempt
+
+    def record_failure(self, error, now=None):
+        """Schedule the next attempt with exponential backoff and jitter"""
+        self.attempts += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.attempts - 1))
+        # Equal jitter: at least half the delay, so retries spread out but still back off
+        self.next_attempt = (now or time.time()) + random.uniform(delay / 2, delay)
+        self.last_error = str(error)
+        self.save()
+
+    def record_success(self):
+        self.pending = []
+        self.attempts = 0
+        self.next_attempt = None
+        self.last_error = None
+        self.save()
+
+    def squash(self, pipeline):
+        """Replace the queued commits with one; returns (old commit ids, new commit id) or None"""
+        if not self.squash_after or len(self.pending) < max(2, self.squash_after):
+            return None
+        commits = [entry['commit'] for entry in self.pending]
+        base = pipeline.git('rev-parse', f'{commits[0]}^')
+        # Squash only if HEAD is exactly the queued commits on top of base
+        if pipeline.git('rev-list', '--reverse', f'{base}..HEAD').split() != commits:
+            return None
+        first = datetime.fromtimestamp(self.pending[0]['queued_at']).strftime('%Y-%m-%d %H:%M:%S')
+        last = datetime.fromtimestamp(self.pending[-1]['queued_at']).strftime('%Y-%m-%d %H:%M:%S')
+        message = f"Auto-rotate honeypot URLs - {len(commits)} rotations {first} to {last}"
+        squashed = pipeline.squash_onto(base, message)
+        self.pending = [{'commit': squashed, 'message': message, 'queued_at': self.pending[0]['queued_at']}]
+        self.save()
+        return commits, squashed
+
+    def flush(self, pipeline, force=False, on_squash=None):
+        """Push every queued commit in one push unless backing off
+
+        Returns 'empty', 'deferred', 'pushed' or 'failed'. ``on_squash`` is
+        called with (old ids, new id) if the queue was squashed first.
+        """
+        if not self.pending:
+            return 'empty'
+        if not force and not self.ready():
+            return 'deferred'
+        try:
+            squashed = self.squash(pipeline)
+            if squashed is not None and on_squash is not None:
+                on_squash(*squashed)
+            pipeline.push()
+        except GitError as e:
+            self.record_failure(e.stderr or e)
+            return 'failed'
+        self.record_success()
+        return 'pushed'
+
+    def describe(self):
+        """One-line summary for status output"""
+        if not self.pending:
+            return "empty"
+        age = int(self.oldest_age())
+        text = f"{len(self.pending)} pending, oldest queued {age // 3600}h {age % 3600 // 60}m ago"
+        if self.next_attempt is not None:
+            text += f", next attempt {datetime.fromtimestamp(self.next_attempt).strftime('%Y-%m-%d %H:%M:%S')}"
+        if self.last_error:
+            text += f" (last error: {self.last_error.splitlines()[0]})"
+        return text
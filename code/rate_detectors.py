@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Rate Detectors and Sketches
+Time-windowed per-key rate detection plus fixed-memory approximate counters
+(Count-Min sketch, HyperLogLog) used by the honeypot monitor
+"""
+
+import math
+import heapq
+import base64
+import hashlib
+from array import array
+from collections import OrderedDict, defaultdict
+
+def _hash64(value, salt=b''):
+    """Stable 64-bit hash of a string (Python's hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8, salt=salt).digest(), 'little')
+
+class SlidingWindowCounter:
+    """Per-key hit counts over a sliding time window using ring buffers of buckets
+
+    Each key keeps ``window_seconds / bucket_seconds`` buckets. Keys that have
+    not been seen for ``idle_seconds`` are evicted, so memory is bounded by the
+    number of keys active recently rather than by every key ever seen.
+    """
+
+    def __init__(self, window_seconds, bucket_seconds, idle_seconds=None):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = max(1, int(math.ceil(window_seconds / bucket_seconds)))
+        self.idle_seconds = idle_seconds if idle_seconds is not None else window_seconds
+        # key -> [last bucket index, total, buckets]; ordered by last update for cheap eviction
+        self.keys = OrderedDict()
+
+    def add(self, key, timestamp):
+        """Record a hit for key at an epoch timestamp and return the count in the window"""
+        bucket = int(timestamp // self.bucket_seconds)
+        state = self.keys.get(key)
+
+        if state is None:
+            buckets = array('l', [0]) * self.bucket_count
+            buckets[bucket % self.bucket_count] = 1
+            self.keys[key] = [bucket, 1, buckets]
+            self.evict_idle(timestamp)
+            return 1
+
+        last_bucket, total, buckets = state
+        if bucket > last_bucket:
+            # Clear the buckets that slid out of the window since the last hit
+            if bucket - last_bucket >= self.bucket_count:
+                for i in range(self.bucket_count):
+                    buckets[i] = 0
+                total = 0
+            else:
+                for i in range(last_bucket + 1, bucket + 1):
+                    total -= buckets[i % self.bucket_count]
+                    buckets[i % self.bucket_count] = 0
+            state[0] = bucket
+        elif last_bucket - bucket >= self.bucket_count:
+            # Out-of-order hit that is already outside the window
+            return total
+
+        buckets[bucket % self.bucket_count] += 1
+        state[1] = total + 1
+        self.keys.move_to_end(key)
+        self.evict_idle(timestamp)
+        return state[1]
+
+    def evict_idle(self, timestamp):
+        """Drop keys whose last hit is older than the idle timeout"""
+        oldest_bucket = int((timestamp - self.idle_seconds) // self.bucket_seconds)
+        while self.keys:
+            key, state = next(iter(self.keys.items()))
+            if state[0] >= oldest_bucket:
+                break
+            del self.keys[key]
+
+    def to_dict(self):
+        return {
+            'window_seconds': self.window_seconds,
+            'bucket_seconds': self.bucket_seconds,
+            'idle_seconds': self.idle_seconds,
+            'keys': [[key, last_bucket, total, list(buckets)] for key, (last_bucket, total, buckets) in self.keys.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        counter = cls(data['window_seconds'], data['bucket_seconds'], data['idle_seconds'])
+        for key, last_bucket, total, buckets in data['keys']:
+            counter.keys[key] = [last_bucket, total, array('l', buckets)]
+        return counter
+
+class CountMinSketch:
+    """Count-Min sketch: fixed-size frequency estimates that never undercount"""
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.tables = [array('q', [0]) * width for _ in range(depth)]
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8', 'surrogatepass'), digest_size=8 * self.depth).digest()
+        for row in range(self.depth):
+            yield row, int.from_bytes(digest[row * 8:row * 8 + 8], 'little') % self.width
+
+    def add(self, key, count=1):
+        """Add count for key and return the new estimate"""
+        estimate = None
+        for row, index in self._indexes(key):
+            table = self.tables[row]
+            table[index] += count
+            if estimate is None or table[index] < estimate:
+                estimate = table[index]
+        return estimate
+
+    def estimate(self, key):
+        return min(self.tables[row][index] for row, index in self._indexes(key))
+
+    def merge(self, other):
+        for table, other_table in zip(self.tables, other.tables):
+            for i in range(self.width):
+                table[i] += other_table[i]
+
+    def to_dict(self):
+        return {
+            'width': self.width,
+            'depth': self.depth,
+            'tables': [base64.b64encode(table.tobytes()).decode('ascii') for table in self.tables]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['width'], data['depth'])
+        for table, encoded in zip(sketch.tables, data['tables']):
+            table[:] = array('q', base64.b64decode(encoded))
+        return sketch
+
+class HyperLogLog:
+    """HyperLogLog distinct-count estimator (about 1.04 / sqrt(2**precision) error)"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.registers = bytearray(self.register_count)
+
+    def add(self, key):
+        hashed = _hash64(key)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = self.register_count
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def to_dict(self):
+        return {'precision': self.precision, 'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        hll = cls(data['precision'])
+        hll.registers = bytearray(base64.b64decode(data['registers']))
+        return hll
+
+class ExactCounter:
+    """Exact per-key counts; memory grows with the number of distinct keys"""
+
+    approximate = False
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+
+    def add(self, key, count=1):
+        self.counts[key] += count
+
+    def cardinality(self):
+        return len(self.counts)
+
+    def items(self):
+        return dict(self.counts)
+
+    def top(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] += count
+
+    def to_dict(self):
+        return {'counts': self.counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        counter = cls()
+        counter.counts.update(data['counts'])
+        return counter
+
+class ApproximateCounter:
+    """Fixed-memory counter: Count-Min for frequencies, HyperLogLog for cardinality
+
+    Only the ``heavy_hitters`` keys with the largest estimates are kept by name,
+    so ``items`` and ``top`` report those heavy hitters rather than every key.
+    """
+
+    approximate = True
+
+    def __init__(self, heavy_hitters=100, width=2048, depth=4, precision=14):
+        self.heavy_hitters = heavy_hitters
+        self.sketch = CountMinSketch(width, depth)
+        self.distinct = HyperLogLog(precision)
+        self.candidates = {}
+        # Lower bound on the smallest candidate estimate, so most keys skip the min() scan
+        self.floor = 0
+
+    def add(self, key, count=1):
+        estimate = self.sketch.add(key, count)
+        self.distinct.add(key)
+        self._offer(key, estimate)
+
+    def _offer(self, key, estimate):
+        """Keep key as a heavy-hitter candidate if its estimate is large enough"""
+        if key in self.candidates or len(self.candidates) < self.heavy_hitters:
+            self.candidates[key] = estimate
+            return
+        if estimate <= self.floor:
+            return
+        smallest = min(self.candidates, key=self.candidates.get)
+        if estimate > self.candidates[smallest]:
+            del self.candidates[smallest]
+            self.candidates[key] = estimate
+        self.floor = min(self.candidates.values())
+
+    def cardinality(self):
+        return self.distinct.count()
+
+    def items(self):
+        return dict(self.candidates)
+
+    def top(self, n):
+        return heapq.nlargest(n, self.candidates.items(), key=lambda item: item[1])
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        self.distinct.merge(other.distinct)
+        for key in list(self.candidates) + list(other.candidates):
+            self._offer(key, self.sketch.estimate(key))
+
+    def to_dict(self):
+        return {
+            'heavy_hitters': self.heavy_hitters,
+            'sketch': self.sketch.to_dict(),
+            'distinct': self.distinct.to_dict(),
+            'candidates': self.candidates
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        counter = cls(data['heavy_hitters'])
+        counter.sketch = CountMinSketch.from_dict(data['sketch'])
+        counter.distinct = HyperLogLog.from_dict(data['distinct'])
+        counter.candidates = dict(data['candidates'])
+        if len(counter.candidates) >= counter.heavy_hitters:
+            counter.floor = min(counter.candidates.values())
+        return counter
+
+def counter_from_dict(data):
+    """Restore an ExactCounter or ApproximateCounter saved with to_dict"""
+    if 'sketch' in data:
+        return ApproximateCounter.from_dict(data)
+    return ExactCounter.from_dict(data)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Rotation Index
+Interval index over logs/honeypot_rotations.log that attributes each honeypot
+hit to the generation of the URL it used: how long that URL had been live and
+how long it had been retired when the crawler requested it
+"""
+
+import os
+import sys
+import json
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime
+
+# Histogram bucket upper bounds (seconds) and labels for live/retired ages
+AGE_BUCKETS = [
+    (60, '<1m'),
+    (300, '1-5m'),
+    (900, '5-15m'),
+    (3600, '15m-1h'),
+    (6 * 3600, '1-6h'),
+    (24 * 3600, '6-24h'),
+    (7 * 24 * 3600, '1-7d'),
+    (30 * 24 * 3600, '7-30d'),
+    (float('inf'), '>30d')
+]
+AGE_EDGES = [edge for edge, _ in AGE_BUCKETS]
+
+# Bucket upper bounds and labels for how many rotations behind a hit was
+GENERATION_BUCKETS = [(0, '0'), (1, '1'), (2, '2'), (5, '3-5'), (20, '6-20'), (float('inf'), '>20')]
+GENERATION_EDGES = [edge for edge, _ in GENERATION_BUCKETS]
+
+def _bucket(buckets, edges, value):
+    """Label of the first bucket whose upper bound is >= value"""
+    return buckets[bisect_left(edges, value)][1]
+
+def _epoch(timestamp):
+    return datetime.fromisoformat(timestamp).timestamp()
+
+def _name(url):
+    return url.split('?', 1)[0].rsplit('/', 1)[-1]
+
+class RotationIndex:
+    """Sorted interval index of every URL generation produced by rotations
+
+    Each URL name maps to its live intervals ``[live_from, retired_at)`` sorted
+    by start, and each honeypot family (original page name) maps to its sorted
+    rotation times. A lookup is a dict hit plus two bisects, so it stays
+    O(log n) however long the rotation history grows.
+    """
+
+    def __init__(self, rotations=()):
+        # name -> ([live_from, ...], [(live_from, retired_at, family, generation), ...])
+        self.intervals = {}
+        # family -> sorted rotation times; the generation live at t is bisect_right(times, t)
+        self.family_times = defaultdict(list)
+        self.rotation_count = 0
+        self._build(sorted(rotations))
+
+    @classmethod
+    def from_log(cls, path):
+        """Build the index from a JSON-lines rotation log"""
+        rotations = []
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        rotation = json.loads(line)
+                        rotations.append((_epoch(rotation['timestamp']), rotation['old_url'], rotation['new_url']))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        return cls(rotations)
+
+    def _build(self, rotations):
+        family_of = {}
+        live_since = {}
+        open_intervals = defaultdict(list)
+
+        for timestamp, old_url, new_url in rotations:
+            old_name, new_name = _name(old_url), _name(new_url)
+            # The first name seen in a chain is the original page and names the family
+            family = family_of.get(old_name, old_name)
+            times = self.family_times[family]
+            if old_name not in live_since:
+                live_since[old_name] = (float('-inf'), family, len(times))
+            times.append(timestamp)
+            self.rotation_count += 1
+
+            live_from, old_family, generation = live_since.pop(old_name)
+            open_intervals[old_name].append((live_from, timestamp, old_family, generation))
+            family_of[new_name] = family
+            live_since[new_name] = (timestamp, family, len(times))
+
+        for name, (live_from, family, generation) in live_since.items():
+            open_intervals[name].append((live_from, float('inf'), family, generation))
+
+        for name, intervals in open_intervals.items():
+            intervals.sort()
+            self.intervals[name] = ([interval[0] for interval in intervals], intervals)
+
+    def lookup(self, url, timestamp):
+        """Attribute a hit on url at an epoch timestamp, or None if the URL was never rotated"""
+        entry = self.intervals.get(_name(url))
+        if entry is None:
+            return None
+        starts, intervals = entry
+        position = bisect_right(starts, timestamp) - 1
+        if position < 0:
+            # Requested before the name was ever published
+            _, _, family, generation = intervals[0]
+            return {'family': family, 'generation': generation, 'state': 'unpublished',
+                    'generations_behind': None, 'live_seconds': None, 'retired_seconds': None}
+
+        live_from, retired_at, family, generation = intervals[position]
+        current_generation = bisect_right(self.family_times[family], timestamp)
+        retired = timestamp >= retired_at
+        return {
+            'family': family,
+            'generation': generation,
+            'state': 'retired' if retired else 'live',
+            'generations_behind': current_generation - generation,
+            # How long the name was live: up to the hit, or up to its retirement
+            'live_seconds': min(timestamp, retired_at) - live_from if live_from != float('-inf') else None,
+            'retired_seconds': timestamp - retired_at if retired else None
+        }
+
+_index_cache = {}
+
+def load_rotation_index(path='logs/honeypot_rotations.log'):
+    """Return a shared index for the rotation log, rebuilt when the log changes"""
+    try:
+        stat = os.stat(path)
+        identity = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        identity = None
+    cached = _index_cache.get(path)
+    if cached is None or cached[0] != identity:
+        cached = _index_cache[path] = (identity, RotationIndex.from_log(path))
+    return cached[1]
+
+def attribute_rotations(accesses, index, signer=None):
+    """Tag each access record with its rotation attribution (None for unrotated URLs)
+
+    URLs the index doesn't know are checked as signed URLs when a signer is
+    given, so signed hits get the same live/retired attribution.
+    """
+    for access in accesses:
+        try:
+            timestamp = _epoch(access['timestamp'])
+            # A request for an original name is attributed to the page it was served
+            attribution = index.lookup(access.get('served') or access['url'], timestamp) if index else None
+            if attribution is None and signer is not None:
+                attribution = signer.attribute(access['url'], timestamp, access.get('ip_address'))
+            access['rotation'] = attribution
+        except (ValueError, TypeError):
+            access['rotation'] = None
+        yield access
+
+class StalenessHistograms:
+    """Mergeable histograms of rotation attributions for the analysis report"""
+
+    def __init__(self):
+        self.states = defaultdict(int)
+        self.live_age = defaultdict(int)
+        self.retired_age = defaultdict(int)
+        self.generations_behind = defaultdict(int)
+        # Signed URLs also tell which channel they were issued through and whether
+        # they were requested by the visitor they were issued to
+        self.channels = defaultdict(int)
+        self.handoffs = 0
+        # Plain dict of defaultdicts so partial aggregates pickle across processes
+        self.by_crawler = {}
+
+    def add(self, attribution, crawler=None):
+        self.states[attribution['state']] += 1
+        if attribution['live_seconds'] is not None:
+            self.live_age[_bucket(AGE_BUCKETS, AGE_EDGES, attribution['live_seconds'])] += 1
+        if attribution['retired_seconds'] is not None:
+            self.retired_age[_bucket(AGE_BUCKETS, AGE_EDGES, attribution['retired_seconds'])] += 1
+        if attribution['generations_behind'] is not None:
+            self.generations_behind[_bucket(GENERATION_BUCKETS, GENERATION_EDGES, attribution['generations_behind'])] += 1
+        if attribution.get('channel') is not None:
+            self.channels[attribution['channel']] += 1
+        if attribution.get('visitor_match') is False:
+            self.handoffs += 1
+        crawler = crawler or 'unclassified'
+        states = self.by_crawler.get(crawler)
+        if states is None:
+            states = self.by_crawler[crawler] = defaultdict(int)
+        states[attribution['state']] += 1
+
+    def merge(self, other):
+        for mine, theirs in ((self.states, other.states), (self.live_age, other.live_age),
+                             (self.retired_age, other.retired_age),
+                             (self.generations_behind, other.generations_behind),
+                             (self.channels, other.channels)):
+            for key, count in theirs.items():
+                mine[key] += count
+        self.handoffs += other.handoffs
+        for crawler, states in other.by_crawler.items():
+            mine = self.by_crawler.setdefault(crawler, defaultdict(int))
+            for state, count in states.items():
+                mine[state] += count
+        return self
+
+    def report(self):
+        """Histograms in bucket order, ready for the analysis report"""
+        return {
+            'attributed': sum(self.states.values()),
+            'states': dict(self.states),
+            'live_age': {label: self.live_age.get(label, 0) for _, label in AGE_BUCKETS},
+            'retired_age': {label: self.retired_age.get(label, 0) for _, label in AGE_BUCKETS},
+            'generations_behind': {label: self.generations_behind.get(label, 0) for _, label in GENERATION_BUCKETS},
+            'signed_channels': dict(self.channels),
+            'signed_handoffs': self.handoffs,
+            'by_crawler': {crawler: dict(states) for crawler, states in self.by_crawler.items()}
+        }
+
+    def to_dict(self):
+        return {
+            'states': self.states,
+            'live_age': self.live_age,
+            'retired_age': self.retired_age,
+            'generations_behind': self.generations_behind,
+            'channels': self.channels,
+            'handoffs': self.handoffs,
+            'by_crawler': self.by_crawler
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histograms = cls()
+        histograms.states.update(data['states'])
+        histograms.live_age.update(data['live_age'])
+        histograms.retired_age.update(data['retired_age'])
+        histograms.generations_behind.update(data['generations_behind'])
+        histograms.channels.update(data['channels'])
+        histograms.handoffs = data['handoffs']
+        for crawler, states in data['by_crawler'].items():
+            histograms.by_crawler[crawler] = defaultdict(int, states)
+        return histograms
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python rotation_index.py URL ISO_TIME [ROTATIONS_LOG]")
+        print("  Show which generation URL belonged to at ISO_TIME and how stale it was")
+        return
+    index = load_rotation_index(sys.argv[3] if len(sys.argv) > 3 else 'logs/honeypot_rotations.log')
+    print(json.dumps(index.lookup(sys.argv[1], _epoch(sys.argv[2])), indent=2))
+
+if __name__ == "__main__":
+    main()
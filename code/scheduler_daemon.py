@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Honeypot Scheduler Daemon
+One long-running asyncio process that owns the periodic jobs (rotation,
+pushes, analysis, log compaction) in a warm interpreter. Jobs run on a fixed
+wall-clock grid with optional jitter, missed runs are caught up with a single
+run, a job never overlaps itself (or another job in its group), and the
+daemon is controlled through a Unix socket
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import asyncio
+import traceback
+from datetime import datetime
+
+from timing_metrics import run_main
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scheduler_config.json')
+DEFAULT_SOCKET = 'logs/scheduler.sock'
+DEFAULT_STATE_FILE = 'logs/scheduler_state.json'
+
+# Upper bound on a single sleep, so wall-clock jumps and suspends are noticed
+MAX_SLEEP_SECONDS = 60
+
+# Jobs that touch the git repository must not run at the same time
+JOB_GROUPS = {'rotation': 'git', 'push': 'git'}
+
+def log(message):
+    print(f"[{datetime.now().isoformat()}] {message}", flush=True)
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds') if timestamp else None
+
+class Job:
+    """A periodic job and its schedule
+
+    ``scheduled`` is the job's slot on the interval grid; ``due`` adds jitter.
+    Advancing past slots that were missed (daemon down, or a run that took
+    longer than the interval) schedules one immediate catch-up run and keeps
+    the grid, so the schedule never drifts.
+    """
+
+    def __init__(self, name, action, interval_seconds, jitter_seconds=0, enabled=True, group=None):
+        self.name = name
+        self.action = action
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.group = group
+        self.paused = not enabled
+        self.scheduled = None
+        self.due = None
+        self.running = False
+        self.trigger = False
+        self.wakeup = asyncio.Event()
+        self.last_run = None
+        self.last_duration = None
+        self.last_status = None
+        self.last_error = None
+        self.runs = 0
+        self.missed = 0
+
+    def advance(self, now):
+        """Move to the next grid slot after a run"""
+        self.scheduled += self.interval_seconds
+        self.resume(now)
+
+    def resume(self, now):
+        """Treat ``scheduled`` as the pending slot: wait for it, or run now if it has passed
+
+        Only slots before the last one that has passed count as missed.
+        """
+        if self.scheduled > now:
+            self.due = self.scheduled + random.uniform(0, self.jitter_seconds)
+            return
+        skipped = int((now - self.scheduled) // self.interval_seconds)
+        self.missed += skipped
+        self.scheduled += skipped * self.interval_seconds
+        self.due = now
+
+    def describe(self):
+        return {
+            'job': self.name,
+            'state': 'running' if self.running else 'paused' if self.paused else 'scheduled',
+            'interval_seconds': self.interval_seconds,
+            'jitter_seconds': self.jitter_seconds,
+            'next_run': None if self.paused else _iso(self.due),
+            'last_run': _iso(self.last_run),
+            'last_status': self.last_status,
+            'last_duration_seconds': None if self.last_duration is None else round(self.last_duration, 3),
+            'last_error': self.last_error,
+            'runs': self.runs,
+            'missed': self.missed
+        }
+
+class SchedulerDaemon:
+    """Own the periodic jobs and serve the control socket"""
+
+    def __init__(self, config_file=CONFIG_FILE):
+        with open(config_file, 'r') as f:
+            self.config = json.load(f)
+        self.socket_path = self.config.get('socket', DEFAULT_SOCKET)
+        self.state_file = self.config.get('state_file', DEFAULT_STATE_FILE)
+        self.jobs = {}
+        self.group_locks = {}
+        self.started = None
+        self.stopping = False
+        self.stop_event = None
+        self.rotator = None
+        self.monitor = None
+
+    def build_jobs(self):
+        actions = {
+            'rotation': self.run_rotation,
+            'push': self.run_push,
+            'analysis': self.run_analysis,
+            'compaction': self.run_compaction
+        }
+        for name, settings in self.config.get('jobs', {}).items():
+            if name not in actions:
+                log(f"Ignoring unknown job {name}")
+                continue
+            group = JOB_GROUPS.get(name)
+            self.jobs[name] = Job(name, actions[name], settings['interval_seconds'],
+                                  settings.get('jitter_seconds', 0), settings.get('enabled', True), group)
+            if group is not None:
+                self.group_locks.setdefault(group, asyncio.Lock())
+
+    # Job actions; they run in a worker thread and reuse the warm objects
+
+    def get_rotator(self):
+        if self.rotator is None:
+            from auto_honeypot_rotator import AutoHoneypotRotator
+            settings = self.config.get('rotator', {})
+            self.rotator = AutoHoneypotRotator(remote=settings.get('remote', 'origin'),
+                                               branch=settings.get('branch', 'main'),
+                                               squash_after=settings.get('squash_after', 0))
+        return self.rotator
+
+    def run_rotation(self):
+        rotator = self.get_rotator()
+        # Other tools may have rotated or pushed since the last run
+        rotator.rotator.load_current_urls()
+        rotator.push_queue.load()
+        return rotator.perform_rotation_cycle()
+
+    def run_push(self):
+        rotator = self.get_rotator()
+        rotator.push_queue.load()
+        try:
+            return rotator.push_step()
+        finally:
+            rotator.metrics.write()
+
+    def run_analysis(self):
+        if self.monitor is None:
+            from honeypot_monitor import HoneypotMonitor
+            self.monitor = HoneypotMonitor()
+        self.monitor.analyze_access_patterns(incremental=True)
+
+    def run_compaction(self):
+        settings = self.config['jobs']['compaction']
+        for path in settings.get('files', []):
+            if compact_log(path, settings.get('max_bytes', 5 * 1024 * 1024)):
+                log(f"Compacted {path}")
+
+    # Scheduling
+
+    def load_state(self):
+        now = time.time()
+        state = {}
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+        for name, job in self.jobs.items():
+            saved = state.get(name, {})
+            job.last_run = saved.get('last_run')
+            job.last_status = saved.get('last_status')
+            job.last_duration = saved.get('last_duration')
+            job.runs = saved.get('runs', 0)
+            job.missed = saved.get('missed', 0)
+            # The saved slot is the pending one: without history the job is due now,
+            # otherwise it waits for that slot or catches up if the slot has passed
+            job.scheduled = saved.get('scheduled', now)
+            job.resume(now)
+
+    def save_state(self):
+        state = {
+            name: {
+                'scheduled': job.scheduled,
+                'last_run': job.last_run,
+                'last_status': job.last_status,
+                'last_duration': job.last_duration,
+                'runs': job.runs,
+                'missed': job.missed
+            }
+            for name, job in self.jobs.items()
+        }
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_file, self.state_file)
+
+    async def job_loop(self, job):
+        while not self.stopping:
+            job.wakeup.clear()
+            if not job.trigger:
+                delay = MAX_SLEEP_SECONDS if job.paused else min(MAX_SLEEP_SECONDS, job.due - time.time())
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(job.wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+            manual = job.trigger
+            job.trigger = False
+            await self.run_job(job, manual)
+            if not manual:
+                job.advance(time.time())
+            self.save_state()
+
+    async def run_job(self, job, manual=False):
+        lock = self.group_locks.get(job.group)
+        job.running = True
+        started = time.time()
+        try:
+            if lock is not None:
+                async with lock:
+                    result = await asyncio.to_thread(job.action)
+            else:
+                result = await asyncio.to_thread(job.action)
+            job.last_status = 'failed' if result is False else 'ok'
+            job.last_error = None
+        except Exception as e:
+            job.last_status = 'error'
+            job.last_error = str(e)
+            log(f"Job {job.name} raised:\n{traceback.format_exc()}")
+        finally:
+            job.running = False
+            job.last_run = started
+            job.last_duration = time.time() - started
+            job.runs += 1
+        log(f"Job {job.name}{' (manual)' if manual else ''} {job.last_status} in {job.last_duration:.2f}s")
+
+    # Control socket
+
+    def handle_command(self, request):
+        command = request.get('command')
+        if command == 'status':
+            return {'ok': True, 'pid': os.getpid(), 'started': _iso(self.started),
+                    'jobs': [job.describe() for job in self.jobs.values()]}
+        if command == 'stop':
+            self.stop_event.set()
+            return {'ok': True, 'message': 'stopping'}
+        if command in ('run', 'pause', 'resume'):
+            job = self.jobs.get(request.get('job'))
+            if job is None:
+                return {'ok': False, 'error': f"unknown job {request.get('job')!r}; jobs: {', '.join(self.jobs)}"}
+            if command == 'run':
+                if job.running or job.trigger:
+                    return {'ok': False, 'error': f"{job.name} is already running"}
+                job.trigger = True
+            else:
+                job.paused = command == 'pause'
+            job.wakeup.set()
+            return {'ok': True, 'job': job.describe()}
+        return {'ok': False, 'error': f"unknown command {command!r}"}
+
+    async def handle_control(self, reader, writer):
+        try:
+            line = await asyncio.wait_for(reader.readline(), 5)
+            try:
+                response = self.handle_command(json.loads(line))
+            except ValueError:
+                response = {'ok': False, 'error': 'invalid request'}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if daemon_running(self.socket_path):
+            log(f"Scheduler already running on {self.socket_path}")
+            return False
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+
+        self.stop_event = asyncio.Event()
+        self.build_jobs()
+        self.load_state()
+        self.started = time.time()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop_event.set)
+
+        server = await asyncio.start_unix_server(self.handle_control, path=self.socket_path)
+        log(f"Scheduler started (pid {os.getpid()}), control socket {self.socket_path}")
+        for job in self.jobs.values():
+            log(f"  {job.name}: every {job.interval_seconds}s (+{job.jitter_seconds}s jitter), next {_iso(job.due)}"
+                f"{' [paused]' if job.paused else ''}")
+        tasks = {job.name: asyncio.create_task(self.job_loop(job)) for job in self.jobs.values()}
+
+        await self.stop_event.wait()
+        log("Scheduler stopping; waiting for running jobs to finish")
+        self.stopping = True
+        server.close()
+        for name, task in tasks.items():
+            # Never interrupt a job halfway through (e.g. between commit and push)
+            if not self.jobs[name].running:
+                task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        self.save_state()
+        await server.wait_closed()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        log("Scheduler stopped")
+        return True
+
+def compact_log(path, max_bytes):
+    """Trim an append-only log to its newest half once it exceeds max_bytes"""
+    if not os.path.exists(path) or os.path.getsize(path) <= max_bytes:
+        return False
+    with open(path, 'rb') as f:
+        f.seek(-(max_bytes // 2), os.SEEK_END)
+        f.readline()
+        tail = f.read()
+    temp_file = path + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(tail)
+    os.replace(temp_file, path)
+    return True
+
+def send_command(command, socket_path=DEFAULT_SOCKET, timeout=10, **fields):
+    """Send one request to the daemon's control socket and return its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps({'command': command, **fields}).encode() + b'\n')
+        reply = b''
+        while not reply.endswith(b'\n'):
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+    return json.loads(reply)
+
+def daemon_running(socket_path=DEFAULT_SOCKET):
+    try:
+        return send_command('status', socket_path, timeout=2).get('ok', False)
+    except (OSError, ValueError):
+        return False
+
+def main():
+    args = sys.argv[1:]
+    config_file = CONFIG_FILE
+    if '--config' in args:
+        position = args.index('--config')
+        config_file = args[position + 1]
+        del args[position:position + 2]
+
+    if not args or args[0] not in ('serve', 'status', 'run', 'pause', 'resume', 'stop'):
+        print("Usage: python scheduler_daemon.py [serve|status|run JOB|pause JOB|resume JOB|stop] [--config PATH]")
+        print("  serve: Run the scheduler in the foreground (jobs and intervals from code/scheduler_config.json)")
+        print("  status: Show every job's state, last run and next run")
+        print("  run/pause/resume JOB: Run a job now, or pause/resume its schedule")
+        print("  stop: Stop the daemon after running jobs finish")
+        return
+
+    if args[0] == 'serve':
+        sys.exit(0 if asyncio.run(SchedulerDaemon(config_file).serve()) else 1)
+
+    with open(config_file, 'r') as f:
+        socket_path = json.load(f).get('socket', DEFAULT_SOCKET)
+    try:
+        reply = send_command(args[0], socket_path, **({'job': args[1]} if len(args) > 1 else {}))
+    except OSError:
+        print(f"Scheduler is not running (no daemon on {socket_path})")
+        sys.exit(1)
+    print(json.dumps(reply, indent=2))
+    sys.exit(0 if reply.get('ok') else 1)
+
+if __name__ == "__main__":
+    run_main(main)
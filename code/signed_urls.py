@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Signed Honeypot URLs
+Stateless alternative to renaming files: a honeypot URL carries its channel,
+the start of the time window it was issued in, optionally a tag for the
+visitor it was issued to, and an HMAC over all of them. Anyone holding the
+secret can check a URL and recover when and through which channel it was
+handed out, without file I/O or a rotation log
+
+    a-6hp-htmn2a0-4fj2mdq7xa.html       hub link issued in the window starting at tmn2a0 (base 36)
+    a-7sm-stmn2a0p2va-rc6oe5wz4d.html   sitemap link, bound to visitor tag p2va
+
+The secret comes from $HONEYPOT_URL_SECRET or .honeypot_url_secret in the
+site root (gitignored, created on first use, never served or logged)
+"""
+
+import os
+import re
+import sys
+import hmac
+import time
+import base64
+import hashlib
+from datetime import datetime
+
+from site_builder import load_manifest
+from timing_metrics import run_main
+
+SECRET_ENV = 'HONEYPOT_URL_SECRET'
+SECRET_FILE = '.honeypot_url_secret'
+DEFAULT_WINDOW_SECONDS = 60
+
+CHANNEL_CODES = {'hub': 'h', 'sitemap': 's', 'robots': 'r', 'js': 'j'}
+CODE_CHANNELS = {code: channel for channel, code in CHANNEL_CODES.items()}
+
+MAC_CHARS = 10
+VISITOR_CHARS = 4
+SIGNED_NAME = re.compile(r'(?P<stem>.+)-(?P<code>[hsrj])(?P<issued>[0-9a-z]{6,7})(?P<visitor>[a-z2-7]{4})?'
+                         r'-(?P<mac>[a-z2-7]{10})\.html')
+
+def _base36(number):
+    digits = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'[remainder] + digits
+        if not number:
+            return digits
+
+def load_secret(create=False):
+    """The signing secret as bytes, or None if there is none (and create is False)"""
+    secret = os.environ.get(SECRET_ENV)
+    if secret:
+        return secret.encode()
+    if os.path.exists(SECRET_FILE):
+        with open(SECRET_FILE, 'r') as f:
+            return f.read().strip().encode()
+    if not create:
+        return None
+    secret = os.urandom(32).hex()
+    # Owner-only from the start; O_EXCL so two processes can't race to different secrets
+    try:
+        fd = os.open(SECRET_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return load_secret()
+    with os.fdopen(fd, 'w') as f:
+        f.write(secret + '\n')
+    return secret.encode()
+
+class URLSigner:
+    """Issue and verify signed honeypot names
+
+    Names are issued for the window containing ``now``; a name is live
+    until its window ends and retired afterwards, so windows play the role
+    of rotation generations.
+    """
+
+    def __init__(self, secret, window_seconds=DEFAULT_WINDOW_SECONDS):
+        self.secret = secret
+        self.window_seconds = window_seconds
+
+    def _digest(self, message, length):
+        digest = hmac.new(self.secret, message.encode(), hashlib.sha256).digest()
+        return base64.b32encode(digest).decode('ascii')[:length].lower()
+
+    def visitor_tag(self, visitor):
+        """Short keyed tag for a visitor (IP address), so the address itself isn't in the URL"""
+        return self._digest(f'visitor|{visitor}', VISITOR_CHARS)
+
+    def sign(self, page, channel, now=None, visitor=None):
+        """Signed name for page handed out through channel in the current window"""
+        now = int(now or time.time())
+        issued = _base36(now - now % self.window_seconds)
+        tag = self.visitor_tag(visitor) if visitor else ''
+        stem = page[:-len('.html')]
+        payload = f'{CHANNEL_CODES[channel]}{issued}{tag}'
+        return f'{stem}-{payload}-{self._digest(f"{stem}|{payload}", MAC_CHARS)}.html'
+
+    def current_urls(self, honeypots, now=None, visitor=None):
+        """Original name -> signed name for every honeypot, like the rotation mapping"""
+        return {page: self.sign(page, settings['channel'], now, visitor) for page, settings in honeypots.items()}
+
+    def verify(self, url, visitor=None):
+        """Decode a signed name; returns None unless the MAC checks out
+
+        ``visitor_match`` is None for unbound names, otherwise whether the
+        requesting visitor is the one the name was issued to (False means the
+        URL was passed on, e.g. from a discovery crawler to a fetcher).
+        """
+        name = url.split('?', 1)[0].rsplit('/', 1)[-1]
+        match = SIGNED_NAME.fullmatch(name)
+        if match is None:
+            return None
+        stem, code, issued, tag = match.group('stem', 'code', 'issued', 'visitor')
+        payload = f'{code}{issued}{tag or ""}'
+        if not hmac.compare_digest(match.group('mac'), self._digest(f'{stem}|{payload}', MAC_CHARS)):
+            return None
+        return {
+            'page': stem + '.html',
+            'channel': CODE_CHANNELS[code],
+            'issued': int(issued, 36),
+            'visitor_match': None if tag is None or visitor is None else hmac.compare_digest(tag, self.visitor_tag(visitor))
+        }
+
+    def attribute(self, url, timestamp, visitor=None):
+        """Attribution in the shape of RotationIndex.lookup, or None for unsigned URLs"""
+        token = self.verify(url, visitor)
+        if token is None:
+            return None
+        issued, window = token['issued'], self.window_seconds
+        expires = issued + window
+        if timestamp < issued:
+            state = 'unpublished'
+        else:
+            state = 'live' if timestamp < expires else 'retired'
+        return {
+            'family': token['page'],
+            'generation': issued // window,
+            'state': state,
+            'generations_behind': None if state == 'unpublished' else int(timestamp // window - issued // window),
+            'live_seconds': None if state == 'unpublished' else min(timestamp, expires) - issued,
+            'retired_seconds': timestamp - expires if state == 'retired' else None,
+            'channel': token['channel'],
+            'visitor_match': token['visitor_match']
+        }
+
+_default_signer = {}
+
+def get_default_signer(create=False):
+    """Signer configured by the site manifest, or None when there is no secret yet"""
+    if 'signer' not in _default_signer:
+        secret = load_secret(create)
+        if secret is None:
+            return None
+        settings = load_manifest().get('signed_urls', {})
+        _default_signer['signer'] = URLSigner(secret, settings.get('window_seconds', DEFAULT_WINDOW_SECONDS))
+    return _default_signer['signer']
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ('sign', 'verify'):
+        print("Usage: python signed_urls.py [sign PAGE [VISITOR]|verify URL [VISITOR]] [--profile]")
+        print("  sign: Print the signed name for PAGE (e.g. a-6hp.html) in the current window")
+        print("  verify: Check a signed URL and print its page, channel and issue time")
+        return
+
+    if args[0] == 'sign':
+        honeypots = load_manifest()['honeypots']
+        if args[1] not in honeypots:
+            print(f"{args[1]} is not a honeypot page in the site manifest")
+            sys.exit(1)
+        signer = get_default_signer(create=True)
+        print(signer.sign(args[1], honeypots[args[1]]['channel'], visitor=args[2] if len(args) > 2 else None))
+        return
+
+    signer = get_default_signer()
+    token = signer.verify(args[1], args[2] if len(args) > 2 else None) if signer else None
+    if token is None:
+        print("Not a valid signed honeypot URL")
+        sys.exit(1)
+    issued = datetime.fromtimestamp(token['issued']).isoformat()
+    print(f"page {token['page']}, channel {token['channel']}, issued {issued} "
+          f"(window {signer.window_seconds}s), visitor match {token['visitor_match']}")
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Site Builder
+Renders the rotation-dependent parts of the site from code/site_manifest.json:
+the sitemap is streamed from the manifest's page inventory (pages, sitemap
+honeypots and whole directories) with lastmod dates from git, and every
+honeypot link slot in a page is filled with the honeypot's current name by
+the page pipeline (code/page_pipeline.py). robots.txt gets a Disallow rule
+for each robots-channel honeypot, and js-channel honeypots are linked from a
+script block that builds the URL at run time. Pages rendered per request are
+compiled into templates once, and only files whose content actually differs
+are written
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+from datetime import datetime
+
+from sitemap_writer import URLSET_HEADER, URLSET_FOOTER, SitemapWriter, LastmodResolver, format_entry
+from timing_metrics import run_main
+
+MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site_manifest.json')
+URL_HISTORY_FILE = 'logs/honeypot_url_history.json'
+ROBOTS_FILE = 'robots.txt'
+
+# Reuse git lastmod dates for this long in long-running processes
+LASTMOD_TTL = 60
+
+# How crawlers can discover a honeypot: linked from hub pages, listed in the
+# sitemap, only named in a robots.txt Disallow rule, or only linked from script
+CHANNELS = ('hub', 'sitemap', 'robots', 'js')
+
+# The script block that links js-channel honeypots; the names are split into
+# parts so that no href or file name appears in the page source
+SCRIPT_LINKS = re.compile(r'[ \t]*<script data-honeypot-links>.*?</script>\n?', re.DOTALL)
+SCRIPT_LINKS_TEMPLATE = '''    <script data-honeypot-links>
+      (function (script) {{
+        {links}.forEach(function (link) {{
+          var a = document.createElement('a');
+          a.href = link[0].join('-') + '.html';
+          a.textContent = link[1];
+          script.parentNode.insertBefore(a, script);
+        }});
+      }})(document.currentScript);
+    </script>
+'''
+
+# Compiled page templates, keyed by path and checked against (mtime, size)
+_templates = {}
+
+def content_digest(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def write_atomic(path, content):
+    """Replace path with content (text, or bytes written as is); returns the new file's stat"""
+    temp_file = path + '.tmp'
+    if isinstance(content, bytes):
+        with open(temp_file, 'wb') as f:
+            f.write(content)
+    else:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+    os.replace(temp_file, path)
+    return os.stat(path)
+
+def iter_directory_pages(root, directory, suffix='.html'):
+    """Yield site paths of the pages under a directory in sorted order
+
+    Walks one directory listing at a time, so memory is bounded by the
+    largest directory rather than the whole inventory.
+    """
+    try:
+        entries = sorted(os.scandir(os.path.join(root, directory)), key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        path = f'{directory}/{entry.name}'
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_directory_pages(root, path, suffix)
+        elif entry.name.endswith(suffix):
+            yield path
+
+def sync_robots_rules(content, rules, owned):
+    """robots.txt content with the lines owned(line) matches replaced by rules
+
+    The rules go where the owned lines were in each group, or before the
+    group's "Allow: /" if it had none, so tools sharing robots.txt don't
+    keep reordering each other's lines.
+    """
+    output = []
+    placed = False
+    for line in content.split('\n'):
+        stripped = line.strip()
+        if stripped.lower().startswith('user-agent:'):
+            placed = False
+        if owned(stripped) or (stripped == 'Allow: /' and not placed):
+            if not placed:
+                output.extend(rules)
+                placed = True
+            if owned(stripped):
+                continue
+        output.append(line)
+    return '\n'.join(output)
+
+def script_links_edit(content, links):
+    """(start, end, text) that puts the script link block for links, a list of
+    (current name, link text), in place of the page's existing block or before
+    </body>; None if the page already has it or has no </body>
+    """
+    data = json.dumps([[name[:-len('.html')].split('-'), text] for name, text in links], ensure_ascii=False)
+    block = SCRIPT_LINKS_TEMPLATE.format(links=data.replace('</', '<\\/'))
+    match = SCRIPT_LINKS.search(content)
+    if match is not None:
+        return None if match.group(0) == block else (match.start(), match.end(), block)
+    body_end = content.rfind('</body>')
+    return None if body_end == -1 else (body_end, body_end, block)
+
+def js_links(honeypots, links, current_urls):
+    """(current name, link text) for each js-channel honeypot among links"""
+    return [(current_urls.get(name, name), honeypots[name].get('link_text', honeypots[name]['description']))
+            for name in sorted(links) if honeypots[name]['channel'] == 'js']
+
+def slot_pattern(honeypots):
+    """Regex for href values naming any generation of the given honeypots
+
+    Matches both the original name (a-6hp.html) and rotated names
+    (a-6hp-x7k9m2.html), so filling slots is idempotent across rotations.
+    """
+    stems = '|'.join(re.escape(name[:-len('.html')]) for name in sorted(honeypots))
+    return re.compile(r'(?<=href=["\'])(?P<stem>' + stems + r')(?:-[A-Za-z0-9]+)?\.html(?=["\'#?])')
+
+class PageTemplate:
+    """A page split into literal text and honeypot slots"""
+
+    def __init__(self, content, pattern):
+        self.parts = []
+        self.slots = []
+        position = 0
+        for match in pattern.finditer(content):
+            self.parts.append(content[position:match.start()])
+            self.slots.append(match.group('stem') + '.html')
+            position = match.end()
+        self.parts.append(content[position:])
+        self.digest = content_digest(content)
+
+    def render(self, current_urls):
+        pieces = [self.parts[0]]
+        for slot, literal in zip(self.slots, self.parts[1:]):
+            pieces.append(current_urls.get(slot, slot))
+            pieces.append(literal)
+        return ''.join(pieces)
+
+def load_template(path, honeypots):
+    """Compile a page into a template, reusing the cached one while the file is unchanged"""
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size, tuple(sorted(honeypots)))
+    cached = _templates.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        template = PageTemplate(f.read(), slot_pattern(honeypots))
+    _templates[path] = (key, template)
+    return template
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    """Read and validate the site manifest"""
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    honeypots = manifest['honeypots']
+    for name, settings in honeypots.items():
+        if not name.endswith('.html') or '/' in name:
+            raise ValueError(f"Honeypot {name!r} must be a top-level .html page")
+        if settings.get('channel') not in CHANNELS:
+            raise ValueError(f"Honeypot {name!r} has channel {settings.get('channel')!r}; expected one of {', '.join(CHANNELS)}")
+    for page in manifest['pages']:
+        for name in page.get('honeypot_links', []):
+            if name not in honeypots:
+                raise ValueError(f"{page['path']} links unknown honeypot {name!r}")
+            if honeypots[name]['channel'] not in ('hub', 'js'):
+                raise ValueError(f"{page['path']} links {honeypots[name]['channel']} honeypot {name!r}")
+    return manifest
+
+def load_url_history(history_file=URL_HISTORY_FILE):
+    """Current honeypot names and the date of the last rotation"""
+    if not os.path.exists(history_file):
+        return {}, None
+    with open(history_file, 'r') as f:
+        history = json.load(f)
+    last_updated = history.get('last_updated')
+    return history.get('current_urls', {}), last_updated[:10] if last_updated else None
+
+class SiteBuilder:
+    """Render the sitemap and honeypot link slots described by the site manifest"""
+
+    def __init__(self, manifest_file=MANIFEST_FILE, root='.'):
+        self.manifest = load_manifest(manifest_file)
+        self.root = root
+        self.base_url = self.manifest['base_url']
+        self.honeypots = self.manifest['honeypots']
+        self.pages = self.manifest['pages']
+        self.resolver = (0, None)
+
+    def lastmods(self):
+        """Lastmod resolver (git or mtime, per the manifest), refreshed every LASTMOD_TTL seconds"""
+        created, resolver = self.resolver
+        if resolver is None or time.monotonic() - created > LASTMOD_TTL:
+            resolver = LastmodResolver(self.root, self.manifest.get('sitemap_lastmod', 'git'))
+            self.resolver = (time.monotonic(), resolver)
+        return resolver
+
+    @property
+    def signed(self):
+        return self.manifest.get('signed_urls', {}).get('enabled', False)
+
+    def link_targets(self, history_file=URL_HISTORY_FILE):
+        """Names to link each honeypot as in static output, and the honeypots' sitemap lastmod
+
+        This is the rotation mapping from the history file. Signed names are
+        only ever rendered per request by honeypot_server.py, since static
+        files would publish links that stop verifying after one window.
+        """
+        return load_url_history(history_file)
+
+    def sitemap_entries(self, current_urls, honeypot_lastmod):
+        """Yield (loc, lastmod, changefreq, priority) for the whole page inventory"""
+        lastmods = self.lastmods()
+        for page in self.pages:
+            # The site root is served from index.html
+            lastmod = page.get('lastmod') or lastmods.lastmod(page['path'] or 'index.html') or honeypot_lastmod
+            yield self.base_url + page['path'], lastmod, page['changefreq'], page['priority']
+        for name, settings in self.honeypots.items():
+            if settings['channel'] == 'sitemap':
+                yield self.base_url + current_urls.get(name, name), honeypot_lastmod, settings['changefreq'], settings['priority']
+        for inventory in self.manifest.get('sitemap_directories', []):
+            for path in iter_directory_pages(self.root, inventory['directory']):
+                yield (self.base_url + path, lastmods.lastmod(path) or honeypot_lastmod,
+                       inventory['changefreq'], inventory['priority'])
+
+    def render_sitemap(self, current_urls, honeypot_lastmod):
+        """The sitemap as one string, for serving per request (no index splitting)"""
+        entries = ''.join(format_entry(*entry) for entry in self.sitemap_entries(current_urls, honeypot_lastmod))
+        return URLSET_HEADER.decode() + entries + URLSET_FOOTER.decode()
+
+    def sitemap_writer(self):
+        return SitemapWriter(self.root, self.base_url, self.manifest['sitemap'],
+                             compress=self.manifest.get('sitemap_gzip', True))
+
+    def channel_honeypots(self, channel):
+        return sorted(name for name, settings in self.honeypots.items() if settings['channel'] == channel)
+
+    def render_robots(self, current_urls):
+        """robots.txt with a Disallow rule for each robots-channel honeypot's current name, or None if missing"""
+        try:
+            with open(os.path.join(self.root, ROBOTS_FILE), 'r', encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        stems = '|'.join(re.escape(name[:-len('.html')]) for name in sorted(self.honeypots))
+        # Rules for every honeypot are owned, so one that moves to another channel loses its rule
+        owned = re.compile(r'Disallow: /(?:' + stems + r')(?:-[A-Za-z0-9]+)*\.html')
+        rules = [f'Disallow: /{current_urls.get(name, name)}' for name in self.channel_honeypots('robots')]
+        return sync_robots_rules(content, rules, owned.fullmatch)
+
+    def render_path(self, path, current_urls, honeypot_lastmod):
+        """Render one output by site path, or None if the manifest doesn't render it"""
+        if path == self.manifest['sitemap']:
+            return self.render_sitemap(current_urls, honeypot_lastmod)
+        if path == ROBOTS_FILE:
+            return self.render_robots(current_urls)
+        links = self.linking_pages().get(path)
+        if links is None:
+            return None
+        content = load_template(os.path.join(self.root, path), links).render(current_urls)
+        script_links = js_links(self.honeypots, links, current_urls)
+        edit = script_links_edit(content, script_links) if script_links else None
+        if edit is not None:
+            content = content[:edit[0]] + edit[2] + content[edit[1]:]
+        return content
+
+    def linking_pages(self):
+        """Site path -> honeypots it links to, for pages with link slots"""
+        return {page['path']: page['honeypot_links'] for page in self.pages if page.get('honeypot_links')}
+
+    def build(self, current_urls, honeypot_lastmod=None, dry_run=False):
+        """Write every output whose content changed; returns the changed paths"""
+        honeypot_lastmod = honeypot_lastmod or datetime.now().strftime('%Y-%m-%d')
+        # The sitemap is streamed to disk and split into an index when it outgrows one file
+        changed = self.sitemap_writer().write(self.sitemap_entries(current_urls, honeypot_lastmod), dry_run)
+        robots = self.render_robots(current_urls)
+        if robots is not None:
+            with open(os.path.join(self.root, ROBOTS_FILE), 'r', encoding='utf-8') as f:
+                if f.read() != robots:
+                    changed.append(ROBOTS_FILE)
+                    if not dry_run:
+                        write_atomic(os.path.join(self.root, ROBOTS_FILE), robots)
+        # Link slots are filled by the page pipeline, together with its other transforms; all
+        # top-level pages go through it so freshly rotated honeypots get precompressed too
+        from page_pipeline import PagePipeline
+        pipeline = PagePipeline(current_urls, self.root, self.manifest)
+        return changed + pipeline.run(sorted(set(pipeline.top_level_pages()) | set(self.linking_pages())), dry_run)
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ('build', 'check'):
+        print("Usage: python site_builder.py [build|check] [--profile]")
+        print("  build: Render sitemap.xml, robots.txt rules and honeypot links from code/site_manifest.json")
+        print("  check: List the files a build would change (exit status 1 if any)")
+        return
+
+    builder = SiteBuilder()
+    current_urls, lastmod = builder.link_targets()
+    changed = builder.build(current_urls, lastmod, dry_run=args[0] == 'check')
+    for path in changed:
+        print(f"{'Updated' if args[0] == 'build' else 'Would update'} {path}")
+    if not changed:
+        print("Site is up to date")
+    if args[0] == 'check' and changed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    run_main(main)
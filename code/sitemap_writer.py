@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Sitemap Writer
+Streams <url> entries straight to disk, splitting into numbered sitemap files
+plus a sitemap index at the protocol limits (50,000 URLs or 50 MB per file),
+with deterministic .xml.gz copies. Each file is hashed while it is written
+and only replaces the existing one if its content differs, so memory stays
+flat and unchanged sitemaps are never rewritten
+"""
+
+import os
+import sys
+import gzip
+import time
+import hashlib
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from timing_metrics import run_main
+
+MAX_URLS = 50000
+MAX_BYTES = 50 * 1024 * 1024
+
+URLSET_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n').encode()
+URLSET_FOOTER = b'</urlset>\n'
+INDEX_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n').encode()
+INDEX_FOOTER = b'</sitemapindex>\n'
+URL_ENTRY = ('  <url>\n'
+             '    <loc>{loc}</loc>\n'
+             '    <lastmod>{lastmod}</lastmod>\n'
+             '    <changefreq>{changefreq}</changefreq>\n'
+             '    <priority>{priority}</priority>\n'
+             '  </url>\n')
+INDEX_ENTRY = ('  <sitemap>\n'
+               '    <loc>{loc}</loc>\n'
+               '    <lastmod>{lastmod}</lastmod>\n'
+               '  </sitemap>\n')
+
+# Written at most this many bytes at a time
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+def format_entry(loc, lastmod, changefreq, priority):
+    return URL_ENTRY.format(loc=escape(loc), lastmod=lastmod, changefreq=changefreq, priority=priority)
+
+def file_sha1(path):
+    """Digest of a file's bytes, or None if it doesn't exist"""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(WRITE_BUFFER_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class _PendingFile:
+    """A temp file that is hashed as it is written and only replaces its target if different"""
+
+    def __init__(self, directory, compress):
+        self.raw = tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False)
+        self.digest = hashlib.sha1()
+        self.buffer = []
+        self.buffered = 0
+        self.size = 0
+        self.gzip_raw = None
+        if compress:
+            self.gzip_raw = tempfile.NamedTemporaryFile(dir=directory, suffix='.gz.tmp', delete=False)
+            # mtime=0 and no file name in the header, so equal content gives equal bytes
+            self.gzip_file = gzip.GzipFile(filename='', mode='wb', fileobj=self.gzip_raw, compresslevel=6, mtime=0)
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        self.size += len(data)
+        if self.buffered >= WRITE_BUFFER_BYTES:
+            self.flush()
+
+    def flush(self):
+        block = b''.join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        self.digest.update(block)
+        self.raw.write(block)
+        if self.gzip_raw is not None:
+            self.gzip_file.write(block)
+
+    def commit(self, path, dry_run=False):
+        """Close and move into place as path if the content differs; returns the changed paths"""
+        self.flush()
+        self.raw.close()
+        outputs = [(self.raw.name, path)]
+        if self.gzip_raw is not None:
+            self.gzip_file.close()
+            self.gzip_raw.close()
+            outputs.append((self.gzip_raw.name, path + '.gz'))
+        unchanged = file_sha1(path) == self.digest.hexdigest()
+        changed = []
+        for temp_file, target in outputs:
+            # The .gz copy is deterministic, so it only needs replacing when missing or the .xml changed
+            if unchanged and os.path.exists(target):
+                os.remove(temp_file)
+                continue
+            changed.append(target)
+            if dry_run:
+                os.remove(temp_file)
+            else:
+                os.chmod(temp_file, 0o644)
+                os.replace(temp_file, target)
+        return changed
+
+class SitemapWriter:
+    """Write a sitemap, or a sitemap index over numbered parts when it exceeds the limits
+
+    A site that fits in one file gets a plain ``sitemap.xml`` (and
+    ``sitemap.xml.gz``); a bigger one gets ``sitemap-1.xml`` ... and
+    ``sitemap.xml`` becomes the index pointing at them.
+    """
+
+    def __init__(self, root, base_url, name='sitemap.xml', compress=True, max_urls=MAX_URLS, max_bytes=MAX_BYTES):
+        self.root = root
+        self.base_url = base_url
+        self.name = name
+        self.compress = compress
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.stem = name[:-len('.xml')]
+
+    def part_name(self, number):
+        return f'{self.stem}-{number}.xml'
+
+    def write(self, entries, dry_run=False):
+        """Stream (loc, lastmod, changefreq, priority) entries; returns changed paths relative to root
+
+        Each full part is committed as soon as the next one starts, so only
+        one part is open at a time however many URLs there are.
+        """
+        changed = []
+        lastmods = []
+        limit = self.max_bytes - len(URLSET_FOOTER)
+        current = None
+        count = 0
+        for loc, lastmod, changefreq, priority in entries:
+            entry = format_entry(loc, lastmod, changefreq, priority).encode()
+            if current is None or count == self.max_urls or current.size + len(entry) > limit:
+                if current is not None:
+                    current.write(URLSET_FOOTER)
+                    changed += current.commit(os.path.join(self.root, self.part_name(len(lastmods))), dry_run)
+                current = _PendingFile(self.root, self.compress)
+                current.write(URLSET_HEADER)
+                lastmods.append(lastmod)
+                count = 0
+            current.write(entry)
+            count += 1
+            if lastmod > lastmods[-1]:
+                lastmods[-1] = lastmod
+        if current is None:
+            current = _PendingFile(self.root, self.compress)
+            current.write(URLSET_HEADER)
+        current.write(URLSET_FOOTER)
+
+        if len(lastmods) <= 1:
+            # Small enough for a single file: it is the sitemap itself
+            changed += current.commit(os.path.join(self.root, self.name), dry_run)
+            changed += self._remove_stale_parts(0, dry_run)
+        else:
+            changed += current.commit(os.path.join(self.root, self.part_name(len(lastmods))), dry_run)
+            index = _PendingFile(self.root, self.compress)
+            index.write(INDEX_HEADER)
+            suffix = '.gz' if self.compress else ''
+            for number, lastmod in enumerate(lastmods, 1):
+                index.write(INDEX_ENTRY.format(loc=escape(self.base_url + self.part_name(number) + suffix),
+                                               lastmod=lastmod).encode())
+            index.write(INDEX_FOOTER)
+            changed += index.commit(os.path.join(self.root, self.name), dry_run)
+            changed += self._remove_stale_parts(len(lastmods), dry_run)
+        return [os.path.relpath(path, self.root) for path in changed]
+
+    def _remove_stale_parts(self, keep, dry_run):
+        """Delete numbered parts left over from a bigger sitemap; returns the deleted paths"""
+        removed = []
+        number = keep + 1
+        while True:
+            stale = [path for path in (os.path.join(self.root, self.part_name(number)),
+                                       os.path.join(self.root, self.part_name(number) + '.gz'))
+                     if os.path.exists(path)]
+            if not stale:
+                return removed
+            for path in stale:
+                removed.append(path)
+                if not dry_run:
+                    os.remove(path)
+            number += 1
+
+class LastmodResolver:
+    """Per-page lastmod dates from git history, falling back to file mtimes
+
+    Git is asked once for the last commit date of every tracked path, and
+    once for the paths changed in the working tree (those use their mtime),
+    so resolving a million pages costs two git processes and a dict lookup
+    each. Files outside a git checkout use their mtime.
+    """
+
+    def __init__(self, root='.', source='git'):
+        self.root = root
+        self.commit_dates = {}
+        self.modified = set()
+        if source == 'git':
+            self._load_git()
+
+    def _git(self, *args):
+        result = subprocess.run(['git', *args], cwd=self.root, capture_output=True, text=True)
+        return result.stdout if result.returncode == 0 else None
+
+    def _load_git(self):
+        log = self._git('log', '--format=%x00%cs', '--name-only', '--no-renames', 'HEAD')
+        if log is None:
+            return
+        date = None
+        for line in log.splitlines():
+            if line.startswith('\0'):
+                date = line[1:]
+            elif line and line not in self.commit_dates:
+                # Newest commit first, so the first date seen for a path is its latest
+                self.commit_dates[line] = date
+        status = self._git('status', '--porcelain', '-z', '--untracked-files=all')
+        for record in (status or '').split('\0'):
+            if len(record) > 3:
+                self.modified.add(record[3:])
+
+    def lastmod(self, path):
+        """YYYY-MM-DD for a path relative to the root, or None if it doesn't exist"""
+        if path not in self.modified:
+            date = self.commit_dates.get(path)
+            if date is not None:
+                return date
+        try:
+            return datetime.fromtimestamp(os.stat(os.path.join(self.root, path)).st_mtime).strftime('%Y-%m-%d')
+        except FileNotFoundError:
+            return None
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] != 'bench':
+        print("Usage: python sitemap_writer.py bench URLS [DIR] [--profile]")
+        print("  bench: Write a sitemap of URLS synthetic entries into DIR (default /tmp/sitemap_bench)")
+        return
+    count = int(args[1])
+    directory = args[2] if len(args) > 2 else '/tmp/sitemap_bench'
+    os.makedirs(directory, exist_ok=True)
+    entries = ((f'https://example.org/decoy/page-{i}.html', '2025-07-31', 'monthly', '0.5') for i in range(count))
+    start = time.perf_counter()
+    changed = SitemapWriter(directory, 'https://example.org/').write(entries)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print(f"Wrote {count} URLs in {time.perf_counter() - start:.2f}s ({len(changed)} files changed, peak RSS {peak} MB)")
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Timing Metrics and Profiling
+Timing spans around rotation steps and git commands, exported as a Prometheus
+text file (for node_exporter's textfile collector) or as JSON lines, plus the
+--profile flag shared by the command-line tools
+"""
+
+import os
+import sys
+import json
+import time
+import cProfile
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_METRICS_FILE = 'logs/rotation_metrics.prom'
+PROFILE_DIRECTORY = 'logs/profiles'
+
+class Span:
+    """One timed operation; set ``ok = False`` to record it as failed"""
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.started = datetime.now().isoformat()
+        self.duration = 0.0
+        self.ok = True
+
+class MetricsRecorder:
+    """Collect timing spans for a run and write them to a metrics file
+
+    The format follows the file extension: ``.prom`` is rewritten each run in
+    Prometheus text exposition format, anything else gets one JSON line
+    appended per span.
+    """
+
+    def __init__(self, path=DEFAULT_METRICS_FILE, prefix='honeypot'):
+        self.path = path
+        self.prefix = prefix
+        self.spans = []
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block; exceptions mark the span as failed and propagate"""
+        span = Span(name, labels)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            span.ok = False
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            self.spans.append(span)
+
+    def write(self):
+        """Write the collected spans and start a new run"""
+        if not self.spans:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.path.endswith('.prom'):
+            self._write_prometheus()
+        else:
+            self._write_jsonl()
+        self.spans = []
+
+    def _write_jsonl(self):
+        with open(self.path, 'a') as f:
+            for span in self.spans:
+                f.write(json.dumps({
+                    'timestamp': span.started,
+                    'span': span.name,
+                    **span.labels,
+                    'duration_seconds': round(span.duration, 6),
+                    'ok': span.ok
+                }) + '\n')
+
+    def _write_prometheus(self):
+        # Spans with the same name and labels are summed; a single failure marks the series failed
+        series = {}
+        for span in self.spans:
+            key = (span.name, tuple(sorted(span.labels.items())))
+            duration, ok = series.get(key, (0.0, True))
+            series[key] = (duration + span.duration, ok and span.ok)
+
+        lines = []
+        for suffix, help_text, value_of in (
+                ('duration_seconds', 'Wall-clock duration of the last run', lambda value: f'{value[0]:.6f}'),
+                ('success', '1 if the last run succeeded, 0 if it failed', lambda value: '1' if value[1] else '0')):
+            for name in sorted({name for name, _ in series}):
+                metric = f'{self.prefix}_{name}_{suffix}'
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} gauge')
+                for (series_name, labels), value in series.items():
+                    if series_name == name:
+                        lines.append(f'{metric}{_format_labels(labels)} {value_of(value)}')
+        lines.append(f'# HELP {self.prefix}_metrics_timestamp_seconds When these metrics were written')
+        lines.append(f'# TYPE {self.prefix}_metrics_timestamp_seconds gauge')
+        lines.append(f'{self.prefix}_metrics_timestamp_seconds {time.time():.3f}')
+
+        # Replace atomically so a scraper never reads a half-written file
+        temp_file = self.path + '.tmp'
+        with open(temp_file, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_file, self.path)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+def run_main(main):
+    """Run a CLI entry point, under cProfile when --profile is on the command line
+
+    The flag is removed from sys.argv before main() parses it; the profile is
+    dumped to logs/profiles/<script>-<timestamp>.prof even if main() exits or
+    is interrupted.
+    """
+    if '--profile' not in sys.argv[1:]:
+        return main()
+    sys.argv.remove('--profile')
+
+    os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+    script = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    path = os.path.join(PROFILE_DIRECTORY, f"{script}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.prof")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return main()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path} (view with: python3 -m pstats {path})", file=sys.stderr)